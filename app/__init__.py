@@ -1,5 +1,5 @@
 from flask import Flask, render_template, redirect, url_for
-from .extensions import db, login_manager, migrate, session, init_redis, mark_user_active
+from .extensions import db, login_manager, migrate, session, init_redis
 from .auth import auth_bp
 from .dashboard import dashboard_bp
 from .messaging import messaging_bp
@@ -13,16 +13,24 @@ from .coaching import coaching_bp
 from flask_login import current_user
 import logging
 from .tests import tests_bp
+from .utils.jobs import jobs_cli
+from .utils import presence
+from .utils.blobstore import blobs_cli
+from .utils.thumbnails import thumbnails_cli
+from .utils.convert import convert_cli
+from .notifications.retention import notifications_cli
+from .library.search import include_object as search_include_object
 
 
 
 def create_app(config_class="config.DevConfig"):
     app = Flask(__name__)
     app.config.from_object(config_class)
+    app.config_class = config_class  # job workers rebuild the app from this
 
     # Init extensions
     db.init_app(app)
-    migrate.init_app(app, db)
+    migrate.init_app(app, db, include_object=search_include_object)  # keep the FTS index out of autogenerate
     login_manager.init_app(app)
     session.init_app(app)
     init_redis(app)
@@ -42,11 +50,18 @@ def create_app(config_class="config.DevConfig"):
     app.register_blueprint(coaching_bp)
     app.register_blueprint(tests_bp)
 
-    # Track presence before each request
+    # Background jobs: `flask jobs worker`; upload store: `flask blobs gc`
+    app.cli.add_command(jobs_cli)
+    app.cli.add_command(blobs_cli)
+    app.cli.add_command(thumbnails_cli)
+    app.cli.add_command(convert_cli)
+    app.cli.add_command(notifications_cli)
+
+    # Track presence before each request (throttled per user, see utils/presence.py)
     @app.before_request
     def track_presence():
         if current_user.is_authenticated:
-            mark_user_active(current_user.id)
+            presence.touch(current_user.id)
 
     # Root route
     @app.route("/")
@@ -4,11 +4,10 @@ from . import dashboard_bp    # use the blueprint from __init__.py
 from ..models import User
 from ..extensions import db
 from werkzeug.security import generate_password_hash
-from sqlalchemy import func
 from ..security.models import AccessLog
 from ..utils.settings import get_setting, set_setting
 from ..teams.models import Team
-from ..library.models import LibraryItem, LibraryView, LibraryRating, QuizAttempt
+from ..library.models import LibraryItem, LibraryItemStats
 import secrets
 from ..messaging.models import ChatRoom, ChatParticipant
 from ..messaging.routes import ensure_manager_group, ensure_manager_admin_group, ensure_admin_group, add_user_to_room_if_not
@@ -222,12 +221,14 @@ def set_storage(team_id):
 @login_required
 def library_analytics():
     if current_user.role not in ("SUPER_ADMIN","ADMIN","MANAGER"): return redirect(url_for("dashboard.index"))
-    views=db.session.query(LibraryItem.title,func.count(LibraryView.id)).join(LibraryView)\
-        .group_by(LibraryItem.id).order_by(func.count(LibraryView.id).desc()).limit(10).all()
-    ratings=db.session.query(LibraryItem.title,func.avg(LibraryRating.easy),func.avg(LibraryRating.complete),func.avg(LibraryRating.overall))\
-        .join(LibraryRating).group_by(LibraryItem.id).all()
-    quizzes=db.session.query(LibraryItem.title,func.avg(QuizAttempt.score))\
-        .join(QuizAttempt).group_by(LibraryItem.id).all()
+    # precomputed totals (see library.stats) instead of aggregating raw event rows
+    s=LibraryItemStats
+    views=db.session.query(LibraryItem.title,s.view_count).join(s)\
+        .filter(s.view_count>0).order_by(s.view_count.desc()).limit(10).all()
+    ratings=db.session.query(LibraryItem.title,s.easy_sum*1.0/s.rating_count,s.complete_sum*1.0/s.rating_count,s.rating_sum*1.0/s.rating_count)\
+        .join(s).filter(s.rating_count>0).all()
+    quizzes=db.session.query(LibraryItem.title,s.quiz_sum*1.0/s.quiz_count)\
+        .join(s).filter(s.quiz_count>0).all()
     return render_template("dashboard/library_analytics.html", views=views, ratings=ratings, quizzes=quizzes)
 
 
@@ -7,4 +7,4 @@ library_bp = Blueprint(
     template_folder="../templates/library"
 )
 
-from . import routes
+from . import routes, commands, tasks
@@ -0,0 +1,131 @@
+"""
+Who can see which library items — one place for listing, viewing, downloads and recommendations.
+
+Rules (same as view_item always had):
+  * ADMIN / SUPER_ADMIN see everything.
+  * AGENTs never see manager_only items.
+  * Items with LibraryAccess rows are only visible to the listed users / members of the listed teams.
+
+Per user we resolve the set of item ids they may NOT see (usually small: manager-only and
+restricted items) once, and cache it in Redis under a global version number. Any change to
+LibraryAccess, TeamMember or LibraryItem.manager_only bumps the version, so stale sets are
+simply never read again and expire on their own.
+"""
+import json
+import redis
+from flask import current_app, g, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from ..extensions import db
+from .models import LibraryItem, LibraryAccess
+
+VERSION_KEY = "library:access:version"
+CACHE_TTL = 3600
+BYPASS_ROLES = ("ADMIN", "SUPER_ADMIN")
+
+
+def _redis():
+    return getattr(current_app, "redis", None) if has_app_context() else None
+
+
+def _compute_denied(user):
+    from ..teams.models import TeamMember
+    team_ids = db.session.query(TeamMember.team_id).filter(TeamMember.user_id == user.id)
+
+    restricted = db.session.query(LibraryAccess.item_id).filter(LibraryAccess.item_id.isnot(None))
+    granted = db.session.query(LibraryAccess.item_id).filter(
+        (LibraryAccess.user_id == user.id) | (LibraryAccess.team_id.in_(team_ids))
+    )
+    denied = restricted.except_(granted)
+    if user.role == "AGENT":
+        denied = denied.union(db.session.query(LibraryItem.id).filter(LibraryItem.manager_only == True))
+    return frozenset(i for (i,) in denied.all())
+
+
+def denied_item_ids(user):
+    """Item ids `user` may not list/open/download. Memoised per request, cached in Redis across requests."""
+    if user.role in BYPASS_ROLES:
+        return frozenset()
+
+    memo = g.setdefault("_library_denied", {}) if has_app_context() else {}
+    if user.id in memo:
+        return memo[user.id]
+
+    r = _redis()
+    key = None
+    if r:
+        try:
+            version = int(r.get(VERSION_KEY) or 0)
+            key = f"library:denied:{user.id}:{user.role}:v{version}"
+            cached = r.get(key)
+            if cached is not None:
+                memo[user.id] = frozenset(json.loads(cached))
+                return memo[user.id]
+        except redis.RedisError:
+            r = None
+
+    denied = _compute_denied(user)
+    if r and key:
+        try:
+            r.set(key, json.dumps(sorted(denied)), ex=CACHE_TTL)
+        except redis.RedisError:
+            pass
+    memo[user.id] = denied
+    return denied
+
+
+def can_view(user, item):
+    return item.id not in denied_item_ids(user)
+
+
+def visible(query, user):
+    """Filter a LibraryItem query down to what `user` may see."""
+    denied = denied_item_ids(user)
+    if denied:
+        query = query.filter(~LibraryItem.id.in_(denied))
+    return query
+
+
+def invalidate():
+    """Bump the access version so every cached visibility set is recomputed on next use."""
+    if has_app_context():
+        g.pop("_library_denied", None)
+    r = _redis()
+    if r:
+        try:
+            r.incr(VERSION_KEY)
+        except redis.RedisError:
+            pass
+
+
+# ---------------- Automatic invalidation ----------------
+def _touches_access(obj, is_new=False, is_deleted=False):
+    from ..teams.models import TeamMember
+    if isinstance(obj, (LibraryAccess, TeamMember)):
+        return True
+    if isinstance(obj, LibraryItem):
+        if is_new:
+            return bool(obj.manager_only)
+        if is_deleted:
+            return False
+        return inspect(obj).attrs.manager_only.history.has_changes()
+    return False
+
+
+@event.listens_for(Session, "after_flush")
+def _track_access_changes(session, flush_context):
+    if (any(_touches_access(o, is_new=True) for o in session.new)
+            or any(_touches_access(o) for o in session.dirty)
+            or any(_touches_access(o, is_deleted=True) for o in session.deleted)):
+        session.info["library_access_dirty"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    if session.info.pop("library_access_dirty", False):
+        invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_on_rollback(session):
+    session.info.pop("library_access_dirty", None)
@@ -0,0 +1,18 @@
+import click
+from . import library_bp
+
+
+@library_bp.cli.command("rebuild-stats")
+def rebuild_stats_command():
+    """Backfill/rebuild LibraryItemStats from views, ratings and quiz attempts."""
+    from .stats import rebuild_stats
+    n = rebuild_stats()
+    click.echo(f"✅ Rebuilt stats for {n} library items")
+
+
+@library_bp.cli.command("rebuild-search")
+def rebuild_search_command():
+    """Create the full-text index (FTS5 / GIN) if needed and reindex all non-archived items."""
+    from .search import rebuild_search_index
+    n = rebuild_search_index()
+    click.echo(f"✅ Search index holds {n} library items")
@@ -1,13 +1,15 @@
 from datetime import datetime
 from ..extensions import db
 from ..models import User
+from ..utils import blobstore
 
 class LibraryItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
     keywords = db.Column(db.String(255))
-    filename = db.Column(db.String(255))
+    filename = db.Column(db.String(255))  # original (display) name
+    blob = db.Column(db.String(80), nullable=True)  # blobstore key; None for pre-blob uploads
     mime = db.Column(db.String(100))
     size = db.Column(db.Integer)
     text_content = db.Column(db.Text)
@@ -24,10 +26,23 @@ class LibraryItem(db.Model):
     thumbnail = db.Column(db.String(255), nullable=True)
     archived = db.Column(db.Boolean, default=False)  # soft delete/archive flag
 
+    # thumbnail + text extraction run in the background (see tasks.py)
+    processing_status = db.Column(db.String(20), default="ready")  # processing / ready / failed
+    processing_job = db.Column(db.String(32), nullable=True)
+
     # 🔥 NEW
     manager_only = db.Column(db.Boolean, default=False)
     restricted_access = db.relationship("LibraryAccess", backref="item", cascade="all, delete-orphan")
 
+    # ?v= for download URLs: pins the current bytes so the browser may cache them for good
+    @property
+    def file_version(self):
+        return self.blob[:12] if self.blob else None
+
+    @property
+    def thumb_version(self):
+        return self.thumbnail[:12] if blobstore.is_key(self.thumbnail) else None
+
 
 class LibraryView(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -54,11 +69,16 @@ class LibraryAttachment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     item_id = db.Column(db.Integer, db.ForeignKey("library_item.id"))
     filename = db.Column(db.String(255))
+    blob = db.Column(db.String(80), nullable=True)
     mime = db.Column(db.String(100))
     size = db.Column(db.Integer)
 
     item = db.relationship(LibraryItem, backref="attachments")
 
+    @property
+    def file_version(self):
+        return self.blob[:12] if self.blob else None
+
 
 class FAQ(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -139,3 +159,24 @@ class LibraryAccess(db.Model):
 
 
 
+
+class LibraryItemStats(db.Model):
+    """Running totals per item, bumped by view/feedback/quiz so nothing has to re-aggregate raw events."""
+    item_id = db.Column(db.Integer, db.ForeignKey("library_item.id"), primary_key=True)
+    view_count = db.Column(db.Integer, default=0, nullable=False)
+    rating_count = db.Column(db.Integer, default=0, nullable=False)
+    rating_sum = db.Column(db.Integer, default=0, nullable=False)      # LibraryRating.overall
+    easy_sum = db.Column(db.Integer, default=0, nullable=False)
+    complete_sum = db.Column(db.Integer, default=0, nullable=False)
+    quiz_count = db.Column(db.Integer, default=0, nullable=False)
+    quiz_sum = db.Column(db.Integer, default=0, nullable=False)
+
+    item = db.relationship(LibraryItem, backref=db.backref("stats", uselist=False, cascade="all, delete-orphan"))
+
+    @property
+    def avg_rating(self):
+        return self.rating_sum / self.rating_count if self.rating_count else 0
+
+    @property
+    def avg_quiz(self):
+        return self.quiz_sum / self.quiz_count if self.quiz_count else 0
@@ -1,25 +1,75 @@
+import heapq
 from sqlalchemy import func
-from .models import LibraryItem, LibraryView, LibraryRating, QuizAttempt, LibraryBias
+from .models import LibraryItem, LibraryItemStats, LibraryBias
 from ..extensions import db
 
+VIEW_WEIGHT = 0.2
+RATING_WEIGHT = 2
+QUIZ_WEIGHT = 1.0
+
+
+def score_from_stats(views, avg_rating, avg_quiz):
+    return (float(views or 0)*VIEW_WEIGHT)+(float(avg_rating or 0)*RATING_WEIGHT)+(float(avg_quiz or 0)*QUIZ_WEIGHT)
+
 def compute_score(item_id):
-    views=db.session.query(func.count(LibraryView.id)).filter(LibraryView.item_id==item_id).scalar() or 0
-    avg_rating=db.session.query(func.avg(LibraryRating.overall)).filter(LibraryRating.item_id==item_id).scalar() or 0
-    quiz=db.session.query(func.avg(QuizAttempt.score)).filter(QuizAttempt.item_id==item_id).scalar() or 0
-    score=(views*0.2)+((avg_rating or 0)*2)+(quiz*1.0)
-    return score
-
-def get_recommendations(user):
-    items=LibraryItem.query.all()
-    ranked=[]
+    stats=LibraryItemStats.query.get(item_id)
+    if not stats:
+        return 0
+    return score_from_stats(stats.view_count, stats.avg_rating, stats.avg_quiz)
+
+
+def _grouped(model, agg, *filters):
+    """item_id -> aggregate, as a subquery we can outer join against LibraryItem."""
+    q = db.session.query(model.item_id.label("item_id"), agg.label("value"))
+    if filters:
+        q = q.filter(*filters)
+    return q.group_by(model.item_id).subquery()
+
+
+def score_rows(user, query=None):
+    """
+    (item_id, score) for every item in `query` (defaults to the non-archived items `user` may see),
+    computed in a single query: engagement comes from LibraryItemStats, bias is grouped.
+    """
     from ..teams.models import TeamMember
-    team_ids=[tm.team_id for tm in TeamMember.query.filter_by(user_id=user.id).all()]
-    for i in items:
-        auto_score=compute_score(i.id)
-        bias=i.bias_weight or 0
-        tbias=db.session.query(func.sum(LibraryBias.weight)).filter(LibraryBias.item_id==i.id,LibraryBias.team_id.in_(team_ids)).scalar() or 0
-        ubias=db.session.query(func.sum(LibraryBias.weight)).filter(LibraryBias.item_id==i.id,LibraryBias.user_id==user.id).scalar() or 0
-        final_score=auto_score+bias+tbias+ubias
-        ranked.append((i,final_score))
-    ranked.sort(key=lambda x:x[1],reverse=True)
-    return ranked
+    team_ids = db.session.query(TeamMember.team_id).filter(TeamMember.user_id == user.id)
+
+    s = LibraryItemStats
+    tbias = _grouped(LibraryBias, func.sum(LibraryBias.weight), LibraryBias.team_id.in_(team_ids))
+    ubias = _grouped(LibraryBias, func.sum(LibraryBias.weight), LibraryBias.user_id == user.id)
+
+    if query is None:
+        from .access import visible
+        query = visible(LibraryItem.query.filter_by(archived=False), user)
+    ids = query.with_entities(LibraryItem.id).subquery()
+
+    rows = (
+        db.session.query(
+            LibraryItem.id, LibraryItem.bias_weight,
+            s.view_count, s.rating_sum, s.rating_count, s.quiz_sum, s.quiz_count, tbias.c.value, ubias.c.value,
+        )
+        .join(ids, ids.c.id == LibraryItem.id)
+        .outerjoin(s, s.item_id == LibraryItem.id)
+        .outerjoin(tbias, tbias.c.item_id == LibraryItem.id)
+        .outerjoin(ubias, ubias.c.item_id == LibraryItem.id)
+        .order_by(LibraryItem.id)
+        .all()
+    )
+    for item_id, bias, views, r_sum, r_n, q_sum, q_n, tb, ub in rows:
+        avg_rating = r_sum / r_n if r_n else 0
+        avg_quiz = q_sum / q_n if q_n else 0
+        yield item_id, score_from_stats(views, avg_rating, avg_quiz) + float(bias or 0) + float(tb or 0) + float(ub or 0)
+
+
+def get_recommendations(user, limit=None, query=None):
+    """Ranked [(item, score)]; with `limit` only the top-K are kept (heap, not a full sort)."""
+    rows = score_rows(user, query)
+    if limit is None:
+        ranked = sorted(rows, key=lambda x: x[1], reverse=True)
+    else:
+        ranked = heapq.nlargest(limit, rows, key=lambda x: x[1])
+    if not ranked:
+        return []
+
+    items = {i.id: i for i in LibraryItem.query.filter(LibraryItem.id.in_([r[0] for r in ranked])).all()}
+    return [(items[item_id], score) for item_id, score in ranked if item_id in items]
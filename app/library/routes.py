@@ -2,7 +2,7 @@ import os
 from ..activity.models import LibrarySession
 from flask import (
     render_template, request, redirect,
-    url_for, flash, send_from_directory, current_app
+    url_for, flash, current_app, abort, jsonify
 )
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
@@ -10,12 +10,16 @@ from . import library_bp
 from .models import (
     LibraryItem, LibraryAttachment, FAQ, QuizQuestion, QuizOption,
     QuizAttempt, LibraryView, LibraryRating, LibraryBias,
-    BiasLog, LibraryCategory, TrendingItem
+    BiasLog, LibraryCategory, TrendingItem, LibraryItemStats, LibraryAccess
 )
 from ..extensions import db
-from .utils import extract_text
+from .tasks import queue_processing
+from .stats import record_view, record_rating, record_quiz
+from . import search, access
 from .recommend import get_recommendations
 from ..utils.rbac import role_required
+from ..utils import jobs, blobstore, thumbnails
+from ..utils.media import send_media, version_matches
 from sqlalchemy import func
 
 # folders & allowed extensions
@@ -44,38 +48,13 @@ def index():
     # Base query: exclude archived
     query = LibraryItem.query.filter_by(archived=False)
 
-    # 🔒 Hide restricted items from AGENTS
-    if current_user.role == "AGENT":
-        query = query.filter(LibraryItem.manager_only == False)
-
-        allowed_ids = []
-        from .models import LibraryAccess
-        # by direct assignment
-        for acc in LibraryAccess.query.filter_by(user_id=current_user.id).all():
-            allowed_ids.append(acc.item_id)
-        # by team assignment
-        team_ids = [tm.team_id for tm in current_user.team_memberships]
-        for acc in LibraryAccess.query.filter(LibraryAccess.team_id.in_(team_ids)).all():
-            allowed_ids.append(acc.item_id)
-
-        if allowed_ids:
-            query = query.filter(
-                (~LibraryItem.restricted_access.any()) |
-                (LibraryItem.id.in_(allowed_ids))
-            )
-        else:
-            query = query.filter(~LibraryItem.restricted_access.any())
+    # 🔒 Hide manager-only / restricted items (cached per user, see access.py)
+    query = access.visible(query, current_user)
 
-    # --- Handle search ---
+    # --- Handle search (full-text index, ranked; ILIKE only as a fallback) ---
+    ranked = False
     if q:
-        like = f"%{q}%"
-        query = query.filter(
-            (LibraryItem.title.ilike(like)) |
-            (LibraryItem.description.ilike(like)) |
-            (LibraryItem.keywords.ilike(like)) |
-            (LibraryItem.filename.ilike(like)) |
-            (LibraryItem.text_content.ilike(like))
-        )
+        query, ranked = search.search(query, q)
 
     # --- Handle category filter ---
     # category filter
@@ -87,7 +66,7 @@ def index():
         else:
             try:
                 category_id = int(category_param)
-                query = query.filter_by(category_id=category_id)
+                query = query.filter(LibraryItem.category_id == category_id)
                 current_cat = category_id
             except ValueError:
                 pass
@@ -100,24 +79,26 @@ def index():
         page=page, per_page=per_page, error_out=False
     )
     items = pagination.items
+    snippets = search.snippets([i.id for i in items], q) if q and ranked else {}
 
     categories = LibraryCategory.query.order_by(LibraryCategory.name.asc()).all()
-    suggested = get_recommendations(current_user)[:5]
-
-    system_trending = (
-        db.session.query(LibraryItem, func.count(LibraryView.id).label("view_count"))
-        .join(LibraryView, LibraryView.item_id == LibraryItem.id)
-        .group_by(LibraryItem.id)
-        .order_by(func.count(LibraryView.id).desc())
-        .limit(5).all()
-    )
+    suggested = get_recommendations(current_user, limit=5)
+
+    system_trending = access.visible(
+        db.session.query(LibraryItem, LibraryItemStats.view_count)
+        .join(LibraryItemStats, LibraryItemStats.item_id == LibraryItem.id)
+        .filter(LibraryItemStats.view_count > 0),
+        current_user,
+    ).order_by(LibraryItemStats.view_count.desc()).limit(5).all()
 
     team_ids = [tm.team_id for tm in current_user.team_memberships]
+    denied = access.denied_item_ids(current_user)
     manual_trending_items = [
         t.item
         for t in TrendingItem.query.filter(
             (TrendingItem.team_id == None) | (TrendingItem.team_id.in_(team_ids))
         ).all()
+        if t.item_id not in denied
     ]
 
     return render_template(
@@ -125,6 +106,7 @@ def index():
         items=items,
         pagination=pagination,
         q=q,
+        snippets=snippets,
         categories=categories,
         current_cat=current_cat,   # <- can be int or "none" or None
         per_page=per_page,
@@ -178,8 +160,6 @@ def delete_category(cat_id):
 
 
 # ---------------- Upload ----------------
-from ..utils.thumbnails import auto_generate_thumbnail, generate_video_thumbnail, generate_image_thumbnail, generate_pdf_thumbnail
-
 @library_bp.route("/upload", methods=["GET","POST"])
 @login_required
 @role_required("MANAGER","ADMIN","SUPER_ADMIN")
@@ -190,49 +170,27 @@ def upload():
         keywords = request.form.get("keywords")
         category_id = request.form.get("category_id") or None
 
-
-        upload_dir = os.path.join(current_app.root_path, "..", "uploads", "library")
-        os.makedirs(upload_dir, exist_ok=True)
-
         main_file = request.files.get("file")
         if not main_file or not allowed_file(main_file.filename):
             flash("Invalid or missing file","danger")
             return redirect(url_for("library.upload"))
 
-        # Save main file
+        # Save main file (content-addressed: duplicates share one copy on disk)
         filename = secure_filename(main_file.filename)
-        filepath = os.path.join(upload_dir, filename)
-        main_file.save(filepath)
+        blob = blobstore.save(main_file, filename)
 
         # ✅ Auto-title if empty
         if not title:
             base, _ = os.path.splitext(filename)
             title = base
 
+        # Thumbnail + text extraction happen in the background (tasks.process_item)
         thumbnail_name = None
-        thumb_base = os.path.splitext(filename)[0] + "_thumb.jpg"
-        thumb_path = os.path.join(upload_dir, thumb_base)
-
-        # ✅ Auto-generate thumbnails depending on mime
-        if "video" in main_file.mimetype:
-            if generate_video_thumbnail(filepath, thumb_path):
-                thumbnail_name = thumb_base
-
-        elif "image" in main_file.mimetype:
-            if generate_image_thumbnail(filepath, thumb_path):
-                thumbnail_name = thumb_base
-
-        elif "pdf" in main_file.mimetype:
-            if generate_pdf_thumbnail(filepath, thumb_path):
-                thumbnail_name = thumb_base
 
         # ✅ If user provided custom thumbnail → override
         thumb_file = request.files.get("thumbnail")
         if thumb_file and allowed_file(thumb_file.filename):
-            t_name = secure_filename(thumb_file.filename)
-            t_path = os.path.join(upload_dir, t_name)
-            thumb_file.save(t_path)
-            thumbnail_name = t_name
+            thumbnail_name = blobstore.save(thumb_file, thumb_file.filename)
 
         # Create library item
         item = LibraryItem(
@@ -240,8 +198,9 @@ def upload():
             description=desc,
             keywords=keywords,
             filename=filename,
+            blob=blob,
             mime=main_file.mimetype,
-            size=os.path.getsize(filepath),
+            size=os.path.getsize(blobstore.path(blob)),
             creator_id=current_user.id,
             category_id=int(category_id) if category_id else None,
             thumbnail=thumbnail_name
@@ -249,26 +208,21 @@ def upload():
         # ✅ Now add restricted flags
         item.manager_only = bool(request.form.get("manager_only"))
 
-        # Extract searchable text (for docs)
-        if main_file.mimetype.startswith("text") or \
-           "pdf" in main_file.mimetype or \
-           "word" in main_file.mimetype:
-            item.text_content = extract_text(filepath, main_file.mimetype)
-
         db.session.add(item)
         db.session.flush()
+        search.sync_item(item)
 
         # Handle attachments
         for attach in request.files.getlist("attachments"):
             if attach and allowed_file(attach.filename):
                 a_name = secure_filename(attach.filename)
-                a_path = os.path.join(upload_dir, a_name)
-                attach.save(a_path)
+                a_blob = blobstore.save(attach, a_name)
                 db.session.add(LibraryAttachment(
                     item_id=item.id,
                     filename=a_name,
+                    blob=a_blob,
                     mime=attach.mimetype,
-                    size=os.path.getsize(a_path)
+                    size=os.path.getsize(blobstore.path(a_blob))
                 ))
 
         # 🔥 Restrict access
@@ -282,13 +236,14 @@ def upload():
                 db.session.add(LibraryAccess(item_id=item.id, user_id=int(uid.strip())))
 
         db.session.commit()
+        queue_processing(item)
 
         # Notify all Agents (or everyone allowed)
         from ..notifications.utils import notify_role
         notify_role("AGENT", f"📘 New library item added: {title}")
 
 
-        flash("Item uploaded successfully","success")
+        flash("Item uploaded — preview and search text will appear once processing finishes","success")
         return redirect(url_for("library.index"))
 
     return render_template("library/upload.html", categories=LibraryCategory.query.all())
@@ -300,28 +255,17 @@ def upload():
 def view_item(item_id):
     item = LibraryItem.query.get_or_404(item_id)
 
-    # 🚫 Manager-only restriction
-    if item.manager_only and current_user.role == "AGENT":
-        flash("Manager-only content", "danger")
-        return redirect(url_for("library.index"))
-
-    # 🚫 Access restrictions (teams / agents only)
-    if item.restricted_access:
-        allowed = False
-        # Direct assignment
-        if any(acc.user_id == current_user.id for acc in item.restricted_access):
-            allowed = True
-        # Team assignment
-        team_ids = [tm.team_id for tm in current_user.team_memberships]
-        if any(acc.team_id in team_ids for acc in item.restricted_access if acc.team_id):
-            allowed = True
-        # Admins bypass restrictions
-        if not allowed and current_user.role not in ("ADMIN", "SUPER_ADMIN"):
+    # 🚫 Manager-only / team & user restrictions (admins bypass)
+    if not access.can_view(current_user, item):
+        if item.manager_only and current_user.role == "AGENT":
+            flash("Manager-only content", "danger")
+        else:
             flash("Access restricted to certain users/teams", "danger")
-            return redirect(url_for("library.index"))
+        return redirect(url_for("library.index"))
 
     # ✅ Record view event
     db.session.add(LibraryView(item_id=item.id, user_id=current_user.id))
+    record_view(item.id)
     db.session.commit()
 
     from ..teams.models import Team
@@ -346,20 +290,55 @@ def view_item(item_id):
 @login_required
 def download_item(item_id):
     item = LibraryItem.query.get_or_404(item_id)
+    if not access.can_view(current_user, item):
+        abort(403)
     upload_dir = os.path.join(current_app.root_path, "..", "uploads", "library")
 
-    # ✅ Serve thumbnail if requested
+    # ✅ Serve thumbnail if requested (?size= picks the nearest cached size, WebP when the browser takes it)
     if request.args.get("thumb") and item.thumbnail:
-        return send_from_directory(upload_dir, item.thumbnail)
-
-    return send_from_directory(upload_dir, item.filename, as_attachment=False)
+        name = item.thumbnail
+        size = request.args.get("size", type=int)
+        webp = "webp" in thumbnails.formats() and request.accept_mimetypes["image/webp"]
+        if size or webp:
+            size = min(thumbnails.SIZES, key=lambda s: abs(s - (size or thumbnails.DEFAULT_SIZE)))
+            name = (webp and blobstore.thumbnail_variant(name, size, "webp")) \
+                or blobstore.thumbnail_variant(name, size, "jpg") or name
+        rv = send_media(name, upload_dir, immutable=version_matches(item.thumbnail))
+        rv.vary.add("Accept")
+        return rv
+
+    if item.blob:
+        return send_media(item.blob, upload_dir, mimetype=item.mime, download_name=item.filename,
+                          immutable=version_matches(item.blob))
+    return send_media(item.filename, upload_dir, mimetype=item.mime)
 
 @library_bp.route("/attachment/<int:attach_id>/view")
 @login_required
 def download_attachment(attach_id):
     attach = LibraryAttachment.query.get_or_404(attach_id)
+    if attach.item_id in access.denied_item_ids(current_user):
+        abort(403)
     upload_dir = os.path.join(current_app.root_path, "..", "uploads", "library")
-    return send_from_directory(upload_dir, attach.filename, as_attachment=False)
+    if attach.blob:
+        return send_media(attach.blob, upload_dir, mimetype=attach.mime, download_name=attach.filename,
+                          immutable=version_matches(attach.blob))
+    return send_media(attach.filename, upload_dir, mimetype=attach.mime)
+
+
+# ---------------- Processing status ----------------
+@library_bp.route("/item/<int:item_id>/status")
+@login_required
+def item_status(item_id):
+    item = LibraryItem.query.get_or_404(item_id)
+    if not access.can_view(current_user, item):
+        abort(403)
+    job = jobs.status(item.processing_job) if item.processing_status != "ready" else None
+    return jsonify({
+        "status": item.processing_status or "ready",
+        "thumbnail": url_for("library.download_item", item_id=item.id, thumb=1) if item.thumbnail else None,
+        "has_text": bool(item.text_content),
+        "job": {k: job.get(k) for k in ("status", "attempts", "error")} if job else None,
+    })
 
 
 # ---------------- Feedback ----------------
@@ -373,7 +352,7 @@ def feedback(item_id):
         overall=int(request.form["overall"]),
         comment=request.form.get("comment")
     )
-    db.session.add(r); db.session.commit()
+    db.session.add(r); record_rating(r); db.session.commit()
     flash("Feedback submitted","success")
     return redirect(url_for("library.view_item", item_id=item_id))
 
@@ -401,6 +380,7 @@ def quiz_submit(item_id):
         if selected and QuizOption.query.get(int(selected)).is_correct:
             score += 1
     db.session.add(QuizAttempt(user_id=current_user.id,item_id=item_id,score=score))
+    record_quiz(item_id, score)
     db.session.commit()
     flash(f"Score {score}/{len(questions)}","info")
     return redirect(url_for("library.view_item", item_id=item_id))
@@ -493,8 +473,6 @@ def mark_trending(item_id):
 @role_required("MANAGER","ADMIN","SUPER_ADMIN")
 def edit_item(item_id):
     item = LibraryItem.query.get_or_404(item_id)
-    upload_dir = os.path.join(current_app.root_path, "..", "uploads", "library")
-    os.makedirs(upload_dir, exist_ok=True)
 
     if request.method == "POST":
         item.title = request.form["title"]
@@ -505,31 +483,35 @@ def edit_item(item_id):
 
         # replace main file if new one uploaded
         new_file = request.files.get("file")
-        if new_file and allowed_file(new_file.filename):
+        file_replaced = bool(new_file and allowed_file(new_file.filename))
+        if file_replaced:
             filename = secure_filename(new_file.filename)
-            new_path = os.path.join(upload_dir, filename)
-            new_file.save(new_path)
+            new_blob = blobstore.save(new_file, filename)
+            # drop what was derived from the old file; the worker rebuilds it
+            if blobstore.is_thumbnail(item.thumbnail) or (
+                    item.thumbnail and item.filename and item.thumbnail == os.path.splitext(item.filename)[0] + "_thumb.jpg"):
+                item.thumbnail = None
+            blobstore.release(item.blob)
+            item.text_content = None
             item.filename = filename
+            item.blob = new_blob
             item.mime = new_file.mimetype
-            item.size = os.path.getsize(new_path)
+            item.size = os.path.getsize(blobstore.path(new_blob))
 
         # replace thumbnail if new uploaded
         thumb_file = request.files.get("thumbnail")
         if thumb_file and allowed_file(thumb_file.filename):
-            t_name = secure_filename(thumb_file.filename)
-            t_path = os.path.join(upload_dir, t_name)
-            thumb_file.save(t_path)
-            item.thumbnail = t_name
+            blobstore.release(item.thumbnail)
+            item.thumbnail = blobstore.save(thumb_file, thumb_file.filename)
 
         # add new attachments
         for attach in request.files.getlist("attachments"):
             if attach and allowed_file(attach.filename):
                 a_name = secure_filename(attach.filename)
-                a_path = os.path.join(upload_dir, a_name)
-                attach.save(a_path)
+                a_blob = blobstore.save(attach, a_name)
                 db.session.add(LibraryAttachment(
-                    item_id=item.id, filename=a_name,
-                    mime=attach.mimetype, size=os.path.getsize(a_path)
+                    item_id=item.id, filename=a_name, blob=a_blob,
+                    mime=attach.mimetype, size=os.path.getsize(blobstore.path(a_blob))
                 ))
 
         # 🔥 Restrict access
@@ -542,7 +524,10 @@ def edit_item(item_id):
             if uid.strip().isdigit():
                 db.session.add(LibraryAccess(item_id=item.id, user_id=int(uid.strip())))
 
+        search.sync_item(item)
         db.session.commit()
+        if file_replaced:
+            queue_processing(item)
         flash("Item updated", "success")
         return redirect(url_for("library.view_item", item_id=item.id))
 
@@ -557,6 +542,7 @@ def edit_item(item_id):
 def archive_item(item_id):
     item = LibraryItem.query.get_or_404(item_id)
     item.archived = True
+    search.sync_item(item)
     db.session.commit()
     flash("Item archived", "warning")
     return redirect(url_for("library.index"))
@@ -566,6 +552,11 @@ def archive_item(item_id):
 @role_required("ADMIN","SUPER_ADMIN")
 def delete_item(item_id):
     item = LibraryItem.query.get_or_404(item_id)
+    search.remove_item(item.id)
+    for key in [item.blob, item.thumbnail] + [a.blob for a in item.attachments]:
+        blobstore.release(key)
+    for a in item.attachments:
+        db.session.delete(a)
     db.session.delete(item)
     db.session.commit()
     flash("Item permanently deleted", "danger")
@@ -585,6 +576,7 @@ def archived_items():
 def restore_item(item_id):
     item = LibraryItem.query.get_or_404(item_id)
     item.archived = False
+    search.sync_item(item)
     db.session.commit()
     flash("Item restored", "success")
     return redirect(url_for("library.archived_items"))
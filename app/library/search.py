@@ -0,0 +1,197 @@
+"""
+Full-text search over library items.
+
+SQLite:   an FTS5 table (library_item_fts, rowid = library_item.id) that we keep
+          in sync from the upload/edit/archive/restore/delete routes.
+Postgres: a GIN index on a weighted to_tsvector() expression over library_item,
+          which Postgres maintains by itself.
+
+Anything else (or SQLite without the FTS table yet) falls back to the old ILIKE scan.
+"""
+import re
+import time
+from markupsafe import Markup, escape
+from sqlalchemy import event, text, inspect, func, literal_column, Integer, Float
+from ..extensions import db
+from .models import LibraryItem
+
+FTS_TABLE = "library_item_fts"
+PG_INDEX = "ix_library_item_search"
+PG_CONFIG = "english"
+
+# snippet()/ts_headline() wrap hits in these; we escape the text and swap them for <mark>
+_HL_START, _HL_END = "\x02", "\x03"
+
+_PG_DOCUMENT = (
+    "setweight(to_tsvector('{cfg}', coalesce({t}title, '')), 'A') || "
+    "setweight(to_tsvector('{cfg}', coalesce({t}keywords, '')), 'B') || "
+    "setweight(to_tsvector('{cfg}', coalesce({t}description, '') || ' ' || coalesce({t}filename, '')), 'C') || "
+    "setweight(to_tsvector('{cfg}', coalesce({t}text_content, '')), 'D')"
+)
+
+def _pg_document(qualified=True):
+    return _PG_DOCUMENT.format(cfg=PG_CONFIG, t="library_item." if qualified else "")
+
+
+def _dialect():
+    return db.engine.dialect.name
+
+_fts_ready = {}  # engine url -> (has the FTS table, when we last looked)
+FTS_RECHECK_SECONDS = 60  # how soon a worker notices `flask library rebuild-search` ran elsewhere
+
+def fts_available():
+    """True when the backend has a usable full-text index (cached per engine; "no" is re-checked)."""
+    dialect = _dialect()
+    if dialect == "postgresql":
+        return True
+    if dialect != "sqlite":
+        return False
+    key = str(db.engine.url)
+    cached = _fts_ready.get(key)
+    if cached is None or (not cached[0] and time.monotonic() - cached[1] > FTS_RECHECK_SECONDS):
+        cached = _fts_ready[key] = (inspect(db.engine).has_table(FTS_TABLE), time.monotonic())
+    return cached[0]
+
+
+def terms(q):
+    return re.findall(r"\w+", q or "", flags=re.UNICODE)
+
+def _fts5_query(q):
+    # every word must match, last one as a prefix so search-as-you-type works
+    words = terms(q)
+    return " ".join(f'"{w}"' for w in words[:-1]) + (f' "{words[-1]}"*' if words else "")
+
+def _pg_tsquery(q):
+    words = terms(q)
+    return " & ".join(words[:-1] + [f"{words[-1]}:*"]) if words else ""
+
+
+# ---------------- Index maintenance ----------------
+def _index_ddl(dialect):
+    if dialect == "sqlite":
+        return (f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                "title, keywords, description, filename, text_content, tokenize='porter unicode61')")
+    if dialect == "postgresql":
+        return f"CREATE INDEX IF NOT EXISTS {PG_INDEX} ON library_item USING GIN (({_pg_document(False)}))"
+    return None
+
+
+def create_search_index():
+    ddl = _index_ddl(_dialect())
+    if ddl:
+        db.session.execute(text(ddl))
+        db.session.commit()
+    _fts_ready.clear()
+
+
+def rebuild_search_index():
+    """(Re)create the index and reload every non-archived item. Returns the number indexed."""
+    create_search_index()
+    if _dialect() != "sqlite":
+        return LibraryItem.query.filter_by(archived=False).count()
+
+    db.session.execute(text(f"DELETE FROM {FTS_TABLE}"))
+    db.session.execute(text(
+        f"INSERT INTO {FTS_TABLE} (rowid, title, keywords, description, filename, text_content) "
+        "SELECT id, title, keywords, description, filename, text_content FROM library_item "
+        "WHERE archived IS NULL OR archived = 0"
+    ))
+    db.session.commit()
+    return db.session.execute(text(f"SELECT count(*) FROM {FTS_TABLE}")).scalar()
+
+
+def sync_item(item):
+    """Refresh one item in the FTS table (drops it when archived). Call before the commit."""
+    if _dialect() != "sqlite" or not fts_available():
+        return
+    db.session.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {"id": item.id})
+    if not item.archived:
+        db.session.execute(text(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, keywords, description, filename, text_content) "
+            "VALUES (:id, :title, :keywords, :description, :filename, :text_content)"
+        ), {
+            "id": item.id, "title": item.title, "keywords": item.keywords, "description": item.description,
+            "filename": item.filename, "text_content": item.text_content,
+        })
+
+def remove_item(item_id):
+    if _dialect() == "sqlite" and fts_available():
+        db.session.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {"id": item_id})
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    """
+    Alembic autogenerate filter (wired into Migrate in create_app). The FTS table,
+    its shadow tables and the GIN index are created here, not declared in
+    db.metadata, so without this `flask db migrate` would emit drops for them.
+    """
+    if type_ == "table" and (name == FTS_TABLE or name.startswith(FTS_TABLE + "_")):
+        return False
+    if type_ == "index" and name == PG_INDEX:
+        return False
+    return True
+
+
+@event.listens_for(LibraryItem.__table__, "after_create")
+def _create_with_tables(target, connection, **kw):
+    # db.create_all() builds the FTS table / GIN index together with library_item
+    ddl = _index_ddl(connection.dialect.name)
+    if ddl:
+        connection.execute(text(ddl))
+    _fts_ready.clear()
+
+
+# ---------------- Querying ----------------
+def ilike_filter(query, q):
+    like = f"%{q}%"
+    return query.filter(
+        (LibraryItem.title.ilike(like)) |
+        (LibraryItem.description.ilike(like)) |
+        (LibraryItem.keywords.ilike(like)) |
+        (LibraryItem.filename.ilike(like)) |
+        (LibraryItem.text_content.ilike(like))
+    )
+
+
+def search(query, q):
+    """
+    Restrict a LibraryItem query to matches for `q`, best match first.
+    Returns (query, ranked) — ranked is False when we had to fall back to ILIKE,
+    in which case the caller keeps its own ordering.
+    """
+    if not terms(q) or not fts_available():
+        return ilike_filter(query, q), False
+
+    if _dialect() == "sqlite":
+        hits = text(
+            f"SELECT rowid AS item_id, bm25({FTS_TABLE}, 10.0, 6.0, 3.0, 3.0, 1.0) AS rank "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :fts_q"
+        ).columns(item_id=Integer, rank=Float).bindparams(fts_q=_fts5_query(q)).subquery("fts_hits")
+        return query.join(hits, hits.c.item_id == LibraryItem.id).order_by(hits.c.rank.asc()), True
+
+    doc = literal_column(f"({_pg_document()})")
+    tsq = func.to_tsquery(literal_column(f"'{PG_CONFIG}'"), _pg_tsquery(q))
+    return query.filter(doc.op("@@")(tsq)).order_by(func.ts_rank(doc, tsq).desc()), True
+
+
+def _highlight(raw):
+    return Markup(str(escape(raw)).replace(_HL_START, "<mark>").replace(_HL_END, "</mark>"))
+
+
+def snippets(item_ids, q, tokens=24):
+    """{item_id: Markup} highlighted excerpts for the given (already paginated) items."""
+    if not item_ids or not terms(q) or not fts_available():
+        return {}
+
+    if _dialect() == "sqlite":
+        rows = db.session.execute(text(
+            f"SELECT rowid, snippet({FTS_TABLE}, -1, :s, :e, '…', :n) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH :fts_q AND rowid IN ({','.join(str(int(i)) for i in item_ids)})"
+        ), {"s": _HL_START, "e": _HL_END, "n": tokens, "fts_q": _fts5_query(q)})
+    else:
+        rows = db.session.execute(text(
+            f"SELECT id, ts_headline('{PG_CONFIG}', coalesce(description, '') || ' ' || coalesce(text_content, ''), "
+            f"to_tsquery('{PG_CONFIG}', :ts_q), :opts) FROM library_item WHERE id IN ({','.join(str(int(i)) for i in item_ids)})"
+        ), {"ts_q": _pg_tsquery(q), "opts": f"StartSel={_HL_START}, StopSel={_HL_END}, MaxWords={tokens}, MinWords=8, MaxFragments=2"})
+
+    return {item_id: _highlight(raw) for item_id, raw in rows if raw and _HL_START in raw}
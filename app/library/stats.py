@@ -0,0 +1,66 @@
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from ..extensions import db
+from .models import LibraryItem, LibraryItemStats, LibraryView, LibraryRating, QuizAttempt
+
+STAT_FIELDS = ("view_count", "rating_count", "rating_sum", "easy_sum", "complete_sum", "quiz_count", "quiz_sum")
+
+
+def bump_stats(item_id, **deltas):
+    """
+    Add deltas to an item's running totals with a single UPDATE col = col + n.
+    Runs inside the caller's transaction, so the event row and the counters commit together.
+    """
+    values = {getattr(LibraryItemStats, k): getattr(LibraryItemStats, k) + v for k, v in deltas.items()}
+    updated = LibraryItemStats.query.filter_by(item_id=item_id).update(values, synchronize_session=False)
+    if updated:
+        return
+
+    # first event for this item -> create the row (another request may beat us to it)
+    try:
+        with db.session.begin_nested():
+            db.session.add(LibraryItemStats(item_id=item_id, **{k: deltas.get(k, 0) for k in STAT_FIELDS}))
+    except IntegrityError:
+        LibraryItemStats.query.filter_by(item_id=item_id).update(values, synchronize_session=False)
+
+
+def record_view(item_id):
+    bump_stats(item_id, view_count=1)
+
+def record_rating(rating):
+    bump_stats(rating.item_id, rating_count=1, rating_sum=rating.overall or 0,
+               easy_sum=rating.easy or 0, complete_sum=rating.complete or 0)
+
+def record_quiz(item_id, score):
+    bump_stats(item_id, quiz_count=1, quiz_sum=score or 0)
+
+
+def rebuild_stats():
+    """Recompute every item's totals from the raw event tables. Returns the number of rows written."""
+    totals = {item_id: dict.fromkeys(STAT_FIELDS, 0) for (item_id,) in db.session.query(LibraryItem.id)}
+
+    for item_id, n in db.session.query(LibraryView.item_id, func.count(LibraryView.id)).group_by(LibraryView.item_id):
+        if item_id in totals:
+            totals[item_id]["view_count"] = n
+
+    ratings = db.session.query(
+        LibraryRating.item_id, func.count(LibraryRating.id),
+        func.coalesce(func.sum(LibraryRating.overall), 0),
+        func.coalesce(func.sum(LibraryRating.easy), 0),
+        func.coalesce(func.sum(LibraryRating.complete), 0),
+    ).group_by(LibraryRating.item_id)
+    for item_id, n, overall, easy, complete in ratings:
+        if item_id in totals:
+            totals[item_id].update(rating_count=n, rating_sum=overall, easy_sum=easy, complete_sum=complete)
+
+    quizzes = db.session.query(
+        QuizAttempt.item_id, func.count(QuizAttempt.id), func.coalesce(func.sum(QuizAttempt.score), 0)
+    ).group_by(QuizAttempt.item_id)
+    for item_id, n, total in quizzes:
+        if item_id in totals:
+            totals[item_id].update(quiz_count=n, quiz_sum=total)
+
+    LibraryItemStats.query.delete(synchronize_session=False)
+    db.session.bulk_insert_mappings(LibraryItemStats, [dict(item_id=i, **t) for i, t in totals.items()])
+    db.session.commit()
+    return len(totals)
@@ -0,0 +1,80 @@
+"""
+Background processing for uploaded library files: thumbnail + searchable text.
+
+Both steps are idempotent — a retry only redoes what's still missing — and the
+item stays in processing_status="processing" until they have both run.
+"""
+import os
+from flask import current_app
+from ..extensions import db
+from ..utils.jobs import job, enqueue, progress
+from ..utils.thumbnails import auto_generate_thumbnail
+from ..utils import blobstore
+from .models import LibraryItem
+from .utils import extract_text_with_metrics, has_extractable_text
+from . import search
+
+
+def _mark_failed(error, item_id, **kwargs):
+    item = LibraryItem.query.get(item_id)
+    if item:
+        item.processing_status = "failed"
+
+
+@job("library.process_item", retries=3, on_failure=_mark_failed)
+def process_item(item_id, thumbnail=True, text=True):
+    item = LibraryItem.query.get(item_id)
+    if not item:
+        return  # deleted while queued
+
+    upload_dir = os.path.join(current_app.root_path, "..", "uploads", "library")
+    filepath = blobstore.resolve(item.blob or item.filename, upload_dir)
+    if not os.path.exists(filepath):
+        raise FileNotFoundError(filepath)
+
+    if thumbnail and not item.thumbnail:
+        if item.blob:  # shared with every duplicate of this file
+            item.thumbnail = blobstore.thumbnail(item.blob, item.mime)
+        else:
+            item.thumbnail = auto_generate_thumbnail(filepath, item.mime or "", upload_dir)
+
+    if text and has_extractable_text(item.mime, item.filename) and not item.text_content:
+        # same bytes already extracted for another item? reuse it
+        twin = None
+        if item.blob:
+            twin = db.session.query(LibraryItem.text_content).filter(
+                LibraryItem.blob == item.blob, LibraryItem.id != item.id, LibraryItem.text_content.isnot(None)
+            ).first()
+        if twin:
+            item.text_content = twin[0]
+        else:
+            item.text_content, metrics = extract_text_with_metrics(filepath, item.mime, filename=item.filename)
+            progress(metrics["pages"], metrics.get("total_pages"), **{f"extract_{k}": v for k, v in metrics.items()})
+            if metrics.get("error") and not item.text_content:
+                # unreadable file: keep the thumbnail, show the item as failed (retrying won't help)
+                item.processing_status = "failed"
+                return
+        search.sync_item(item)
+
+    item.processing_status = "ready"
+
+
+def queue_processing(item, thumbnail=True, text=True):
+    """
+    Hand an item's file to the workers. Commits first so the worker can see the row.
+    Returns the job id, or None when there is nothing to do.
+    """
+    thumbnail = thumbnail and not item.thumbnail
+    text = text and has_extractable_text(item.mime, item.filename)
+    if not thumbnail and not text:
+        item.processing_status = "ready"
+        db.session.commit()
+        return None
+
+    item.processing_status = "processing"
+    db.session.commit()
+    item_id = item.id
+    job_id = enqueue("library.process_item", item_id=item_id, thumbnail=thumbnail, text=text)
+    LibraryItem.query.filter_by(id=item_id).update({LibraryItem.processing_job: job_id})
+    db.session.commit()
+    return job_id
@@ -1,18 +1,298 @@
+"""
+Text extraction for library search.
+
+Files are read as a stream of pages (PDF pages, slides, sheets, blocks of
+paragraphs/lines) and we stop as soon as the configured caps are hit, so a
+500-page manual never has to sit in memory as one string. Large PDFs are split
+into page ranges that a process pool extracts in parallel, results still
+yielded in page order.
+
+Config (all optional):
+  LIBRARY_TEXT_MAX_BYTES       cap on the indexed text (UTF-8 bytes), default 2 MB
+  LIBRARY_TEXT_MAX_PAGES       cap on pages/slides/sheets read, default 1000
+  LIBRARY_TEXT_PROCESSES       PDF pool size, default min(4, cpu count); 1 disables the pool
+  LIBRARY_TEXT_PARALLEL_PAGES  only use the pool for PDFs with at least this many pages, default 24
+"""
+import os
+import time
+import zipfile
+import atexit
+import multiprocessing
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
 import docx
 from PyPDF2 import PdfReader
+from flask import current_app, has_app_context
 
-def extract_text(filepath, mime):
+DEFAULTS = {
+    "LIBRARY_TEXT_MAX_BYTES": 2 * 1024 * 1024,
+    "LIBRARY_TEXT_MAX_PAGES": 1000,
+    "LIBRARY_TEXT_PROCESSES": min(4, os.cpu_count() or 1),
+    "LIBRARY_TEXT_PARALLEL_PAGES": 24,
+}
+PAGES_PER_TASK = 8
+TEXT_CHUNK = 64 * 1024
+
+MIME_KINDS = {
+    "text/plain": "text",
+    "application/pdf": "pdf",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": "docx",
+    "application/msword": "docx",
+    "application/vnd.openxmlformats-officedocument.presentationml.presentation": "pptx",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": "xlsx",
+}
+EXT_KINDS = {".txt": "text", ".pdf": "pdf", ".docx": "docx", ".pptx": "pptx", ".xlsx": "xlsx"}
+
+
+def _setting(name):
+    if has_app_context():
+        return current_app.config.get(name, DEFAULTS[name])
+    return DEFAULTS[name]
+
+
+def text_kind(mime, filename=None):
+    """Which extractor handles this file, or None. Falls back to the extension for generic mimes."""
+    kind = MIME_KINDS.get(mime or "")
+    if not kind and (mime or "").startswith("text"):
+        kind = "text"
+    if not kind and filename:
+        kind = EXT_KINDS.get(os.path.splitext(filename)[1].lower())
+    return kind
+
+def has_extractable_text(mime, filename=None):
+    return text_kind(mime, filename) is not None
+
+
+# ---------------- PDF (page-parallel) ----------------
+_pool = None
+_readers = {}  # per process: path -> (mtime, PdfReader)
+
+def _reader(path):
+    mtime = os.path.getmtime(path)
+    cached = _readers.get(path)
+    if not cached or cached[0] != mtime:
+        _readers.clear()
+        cached = _readers[path] = (mtime, PdfReader(path))
+    return cached[1]
+
+def _pdf_page_range(path, start, stop):
+    """Runs in a pool process: text of pages [start, stop)."""
+    reader = _reader(path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def _get_pool(processes):
+    global _pool
+    if _pool is None:
+        # spawn: safe under threaded servers and the same on Windows
+        _pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"))
+        atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+    return _pool
+
+
+def _drop_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _iter_pdf(path, max_pages, metrics):
+    reader = PdfReader(path)
+    total = len(reader.pages)
+    n = min(total, max_pages)
+    metrics["total_pages"] = total
+    processes = int(_setting("LIBRARY_TEXT_PROCESSES") or 1)
+
+    if processes <= 1 or n < _setting("LIBRARY_TEXT_PARALLEL_PAGES"):
+        for i in range(n):
+            yield reader.pages[i].extract_text() or ""
+        return
+
+    metrics["parallel"] = processes
+    ranges = iter([(s, min(s + PAGES_PER_TASK, n)) for s in range(0, n, PAGES_PER_TASK)])
+    window = []  # bounded number of ranges in flight, consumed in order
+    done = 0
     try:
-        if mime == "text/plain":
-            with open(filepath,"r",encoding="utf-8",errors="ignore") as f:
-                return f.read()
-        elif mime == "application/pdf":
-            pdf=PdfReader(filepath)
-            return "\n".join([page.extract_text() or "" for page in pdf.pages])
-        elif mime in ["application/vnd.openxmlformats-officedocument.wordprocessingml.document","application/msword"]:
-            doc=docx.Document(filepath)
-            return "\n".join([p.text for p in doc.paragraphs])
-        else:
-            return ""
+        pool = _get_pool(processes)
+        for s, e in ranges:
+            window.append(pool.submit(_pdf_page_range, path, s, e))
+            if len(window) >= processes * 2:
+                break
+        while window:
+            pages = window.pop(0).result()
+            nxt = next(ranges, None)
+            if nxt:
+                window.append(pool.submit(_pdf_page_range, path, *nxt))
+            yield from pages
+            done += len(pages)
     except Exception as e:
-        return ""
+        # the pool couldn't start or a child died: finish here rather than lose the text
+        metrics["parallel_error"] = f"{type(e).__name__}: {e}"
+        if has_app_context():
+            current_app.logger.warning(f"PDF pool failed for {os.path.basename(path)}, extracting serially: {e}")
+        _drop_pool()
+        for i in range(done, n):
+            yield reader.pages[i].extract_text() or ""
+    finally:
+        for f in window:  # caller stopped early (byte cap)
+            f.cancel()
+
+
+# ---------------- Other formats ----------------
+def _iter_text(path, max_pages, metrics):
+    # chunks are joined with "\n", so cut each one at a line break (or at least
+    # whitespace) and drop that character, keeping words whole for the search index
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        carry = ""
+        while True:
+            chunk = f.read(TEXT_CHUNK)
+            if len(chunk) < TEXT_CHUNK:  # end of file: nothing to carry over
+                if carry + chunk:
+                    yield carry + chunk
+                return
+            chunk = carry + chunk
+            cut = chunk.rfind("\n")
+            if cut < 0:
+                cut = max(chunk.rfind(" "), chunk.rfind("\t"))
+            if cut < 0:
+                carry = ""
+                yield chunk  # one enormous word: nothing better to do
+                continue
+            carry = chunk[cut + 1:]
+            yield chunk[:cut]
+
+
+def _iter_docx(path, max_pages, metrics):
+    doc = docx.Document(path)
+    block = []
+    for p in doc.paragraphs:
+        block.append(p.text)
+        if len(block) >= 50:
+            yield "\n".join(block)
+            block = []
+    for table in doc.tables:
+        for row in table.rows:
+            block.append("\t".join(c.text for c in row.cells))
+    if block:
+        yield "\n".join(block)
+
+
+def _iter_pptx(path, max_pages, metrics):
+    from pptx import Presentation
+    prs = Presentation(path)
+    metrics["total_pages"] = len(prs.slides)
+    for i, slide in enumerate(prs.slides):
+        if i >= max_pages:
+            return
+        parts = []
+        for shape in slide.shapes:
+            if shape.has_text_frame:
+                parts.append(shape.text_frame.text)
+            elif getattr(shape, "has_table", False) and shape.has_table:
+                for row in shape.table.rows:
+                    parts.append("\t".join(c.text for c in row.cells))
+        if slide.has_notes_slide:
+            parts.append(slide.notes_slide.notes_text_frame.text)
+        yield "\n".join(p for p in parts if p)
+
+
+_XLSX_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+
+def _iter_xlsx(path, max_pages, metrics):
+    """Sheets straight from the OOXML parts with iterparse — no full workbook in memory."""
+    with zipfile.ZipFile(path) as z:
+        names = z.namelist()
+        shared = []
+        if "xl/sharedStrings.xml" in names:
+            with z.open("xl/sharedStrings.xml") as f:
+                for _, el in ET.iterparse(f):
+                    if el.tag == _XLSX_NS + "si":
+                        shared.append("".join(t.text or "" for t in el.iter(_XLSX_NS + "t")))
+                        el.clear()
+
+        sheets = sorted((n for n in names if n.startswith("xl/worksheets/sheet") and n.endswith(".xml")),
+                        key=lambda n: int("".join(ch for ch in n if ch.isdigit()) or 0))
+        metrics["total_pages"] = len(sheets)
+        for sheet in sheets[:max_pages]:
+            rows = []
+            with z.open(sheet) as f:
+                for _, el in ET.iterparse(f):
+                    if el.tag != _XLSX_NS + "row":
+                        continue
+                    cells = []
+                    for c in el.iter(_XLSX_NS + "c"):
+                        kind = c.get("t")
+                        if kind == "inlineStr":
+                            cells.append("".join(t.text or "" for t in c.iter(_XLSX_NS + "t")))
+                            continue
+                        v = c.find(_XLSX_NS + "v")
+                        if v is None or v.text is None:
+                            continue
+                        if kind == "s":
+                            idx = int(v.text)
+                            cells.append(shared[idx] if idx < len(shared) else "")
+                        else:
+                            cells.append(v.text)
+                    if cells:
+                        rows.append("\t".join(cells))
+                    el.clear()
+            yield "\n".join(rows)
+
+
+_EXTRACTORS = {"text": _iter_text, "pdf": _iter_pdf, "docx": _iter_docx, "pptx": _iter_pptx, "xlsx": _iter_xlsx}
+
+
+def iter_text(filepath, mime, max_pages=None, metrics=None, filename=None):
+    """Yield the file's text page by page (or chunk by chunk for plain text).
+    `filename` is the original name, for picking the format when the stored path has no extension."""
+    kind = text_kind(mime, filename or filepath)
+    if not kind:
+        return
+    metrics = metrics if metrics is not None else {}
+    metrics["kind"] = kind
+    yield from _EXTRACTORS[kind](filepath, max_pages or _setting("LIBRARY_TEXT_MAX_PAGES"), metrics)
+
+
+def extract_text_with_metrics(filepath, mime, max_bytes=None, max_pages=None, filename=None):
+    """
+    (text, metrics). Text is capped at max_bytes UTF-8 bytes; metrics has
+    kind, pages, bytes, truncated, seconds (and parallel/total_pages where known).
+    """
+    max_bytes = max_bytes or _setting("LIBRARY_TEXT_MAX_BYTES")
+    metrics = {"pages": 0, "bytes": 0, "truncated": False}
+    parts, size = [], 0
+    start = time.perf_counter()
+    pages = iter_text(filepath, mime, max_pages=max_pages, metrics=metrics, filename=filename)
+    try:
+        for page in pages:
+            metrics["pages"] += 1
+            data = page.encode("utf-8")
+            sep = 1 if parts else 0  # the "\n" the page is joined with
+            if size + sep + len(data) > max_bytes:
+                room = max(0, max_bytes - size - sep)
+                if room:
+                    parts.append(data[:room].decode("utf-8", errors="ignore"))
+                    size += sep + room
+                metrics["truncated"] = True
+                break
+            parts.append(page)
+            size += sep + len(data)
+    except Exception as e:
+        metrics["error"] = f"{type(e).__name__}: {e}"
+        if has_app_context():
+            current_app.logger.warning(f"Text extraction from {filename or os.path.basename(filepath)} "
+                                       f"stopped after {metrics['pages']} pages: {metrics['error']}")
+    finally:
+        pages.close()
+    if metrics.get("total_pages", 0) > metrics["pages"]:
+        metrics["truncated"] = True
+    metrics["bytes"] = min(size, max_bytes)
+    metrics["seconds"] = round(time.perf_counter() - start, 3)
+    if has_app_context():
+        current_app.logger.info(f"Extracted text from {filename or os.path.basename(filepath)}: {metrics}")
+    return "\n".join(parts), metrics
+
+
+def extract_text(filepath, mime):
+    return extract_text_with_metrics(filepath, mime)[0]
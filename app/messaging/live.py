@@ -0,0 +1,80 @@
+"""
+Real-time chat delivery.
+
+send_message publishes each new message, already serialised, on the room's
+pub/sub channel:
+
+  chat:room:<id>   {"id", "sender", "content", "time"} as a "message" event
+
+An open room page holds one EventSource on /messaging/room/<id>/events. The
+stream first replays whatever the client missed (messages with id > after_id,
+or > the Last-Event-ID the browser sends on reconnect) and then only forwards
+what is published, so nothing is read from the database per message per tab.
+Without Redis the stream replays and closes, and the browser's reconnect turns
+it into a cheap "anything after my last id?" poll. A client more than
+REPLAY_PAGES pages behind gets a "reload" event instead of a partial replay.
+"""
+from ..extensions import db
+from ..models import User
+from ..utils import events
+from .models import Message
+
+PAGE_SIZE = 200
+REPLAY_PAGES = 5  # up to 1000 missed messages are replayed; beyond that the page reloads
+HISTORY_PAGE_SIZE = 50
+
+
+def channel(room_id):
+    return f"chat:room:{room_id}"
+
+
+def serialize(message, sender_name):
+    return {
+        "id": message.id,
+        "sender": sender_name,
+        "content": message.content,
+        "time": message.created_at.strftime("%H:%M"),
+    }
+
+
+def _with_sender(room_id):
+    return (db.session.query(Message, User.username)
+            .outerjoin(User, User.id == Message.sender_id)
+            .filter(Message.room_id == room_id))
+
+
+def messages_after(room_id, after_id=0, limit=PAGE_SIZE):
+    """Up to `limit` messages with id > after_id, oldest first, senders joined in the same query."""
+    rows = _with_sender(room_id).filter(Message.id > after_id).order_by(Message.id.asc()).limit(limit)
+    return [serialize(m, name) for m, name in rows]
+
+
+def history(room_id, before_id=None, limit=HISTORY_PAGE_SIZE):
+    """
+    One page of history: the newest `limit` messages older than before_id (or
+    the newest overall), oldest first. Keyset on the (room_id, id) index, so
+    every page costs the same however long the room is.
+    """
+    query = _with_sender(room_id)
+    if before_id:
+        query = query.filter(Message.id < before_id)
+    rows = query.order_by(Message.id.desc()).limit(limit).all()
+    return [serialize(m, name) for m, name in reversed(rows)]
+
+
+def publish_message(message, sender_name):
+    events.publish(channel(message.room_id), serialize(message, sender_name), event="message", id=message.id)
+
+
+def stream(room_id, after_id=0):
+    def initial():
+        # catch up a page at a time; a client too far behind starts over from the latest history page
+        replay, after = [], after_id
+        for _ in range(REPLAY_PAGES):
+            page = messages_after(room_id, after)
+            replay += [("message", m, m["id"]) for m in page]
+            if len(page) < PAGE_SIZE:
+                return replay
+            after = page[-1]["id"]
+        return [("reload", {}, None)]
+    return events.stream(channel(room_id), initial=initial)
@@ -11,13 +11,30 @@ class ChatRoom(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 
+def _room_cursor(context):
+    """New members start at the room's newest message: only what arrives after they join is unread."""
+    room_id = context.get_current_parameters().get("room_id")
+    if room_id is None:
+        return 0
+    newest = db.select(db.func.coalesce(db.func.max(Message.id), 0)).where(Message.room_id == room_id)
+    return context.connection.execute(newest).scalar()
+
+
 class ChatParticipant(db.Model):
+    # one row per (user, room); unread = messages in the room with id > last_read_id (messaging/receipts.py)
+    __table_args__ = (db.Index("ix_chat_participant_user_id_room_id", "user_id", "room_id"),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"))
     room_id = db.Column(db.Integer, db.ForeignKey("chat_room.id"))
+    # NULL = rows from before read tracking; receipts.backfill() starts them at the room's newest message
+    last_read_id = db.Column(db.Integer, nullable=True, default=_room_cursor)
 
 
 class Message(db.Model):
+    # history is paged by id within a room (messaging/live.py)
+    __table_args__ = (db.Index("ix_message_room_id_id", "room_id", "id"),)
+
     id = db.Column(db.Integer, primary_key=True)
     room_id = db.Column(db.Integer, db.ForeignKey("chat_room.id"))
     sender_id = db.Column(db.Integer, db.ForeignKey("user.id"))
@@ -30,6 +47,9 @@ class Message(db.Model):
 
 # NEW table for read receipts
 class MessageReceipt(db.Model):
+    # "has this user read this notice" and "how many read it" are both lookups on this index
+    __table_args__ = (db.Index("ix_message_receipt_message_id_user_id", "message_id", "user_id"),)
+
     id = db.Column(db.Integer, primary_key=True)
     message_id = db.Column(db.Integer, db.ForeignKey("message.id"))
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"))
@@ -0,0 +1,164 @@
+"""
+Read state for chat rooms.
+
+Every ChatParticipant row carries last_read_id, the newest message the user has
+read in that room, so unread is COUNT(*) of the room's messages with a higher
+id: a range on the (room_id, id) index, however long the room. The rooms list
+gets every room's count from one grouped query (rooms_with_unread). New
+members start at the room's newest message (the column default); rows from
+before read tracking have no cursor yet and get one there the first time it
+matters (backfill).
+
+The room page reports what it has shown as a range of ids (mark_read): the
+cursor moves forward with one UPDATE and the receipts for any notices
+(requires_read_receipt) in that range go in with one INSERT … SELECT, in a
+single commit, instead of an existence check and a commit per message.
+
+Managers get, per notice, how many of the room's other participants have read
+it (notice_summary), cached in Redis until new receipts or a new notice arrive:
+
+  chat:room:<id>:notices   JSON list, NOTICE_SUMMARY_TTL seconds at most
+"""
+import json
+from datetime import datetime
+
+import redis
+from flask import current_app, has_app_context
+from sqlalchemy import DateTime, Integer, and_, exists, func, insert, literal, select
+
+from ..extensions import db
+from ..models import User
+from .models import ChatParticipant, ChatRoom, Message, MessageReceipt
+
+NOTICE_SUMMARY_TTL = 300  # also bounds how stale the audience is after people join or leave
+NOTICE_LIMIT = 50
+
+
+def _redis():
+    return getattr(current_app, "redis", None) if has_app_context() else None
+
+
+def notices_key(room_id):
+    return f"chat:room:{room_id}:notices"
+
+
+def backfill(user_id):
+    """
+    Give user_id's pre-existing memberships (last_read_id NULL, added by the
+    migration) a cursor at the room's newest message, so old history doesn't
+    all show up as unread. One UPDATE, and a no-op once done.
+    """
+    newest = (select(func.coalesce(func.max(Message.id), 0))
+              .where(Message.room_id == ChatParticipant.room_id).scalar_subquery())
+    done = (ChatParticipant.query
+            .filter(ChatParticipant.user_id == user_id, ChatParticipant.last_read_id.is_(None))
+            .update({ChatParticipant.last_read_id: newest}, synchronize_session=False))
+    if done:
+        db.session.commit()
+    return done
+
+
+def rooms_with_unread(user_id):
+    """[(ChatRoom, unread), …] for every room user_id is in, from one query (after backfill())."""
+    backfill(user_id)
+    cursors = (db.session.query(ChatParticipant.room_id, func.max(ChatParticipant.last_read_id).label("last_read_id"))
+               .filter(ChatParticipant.user_id == user_id)
+               .group_by(ChatParticipant.room_id).subquery())
+    return (db.session.query(ChatRoom, func.count(Message.id))
+            .join(cursors, cursors.c.room_id == ChatRoom.id)
+            .outerjoin(Message, and_(Message.room_id == ChatRoom.id, Message.id > cursors.c.last_read_id))
+            .group_by(ChatRoom.id)
+            .order_by(ChatRoom.id)
+            .all())
+
+
+def mark_read(user_id, room_id, from_id, to_id):
+    """
+    Record that user_id has read messages from_id..to_id of the room: the
+    cursor moves up to to_id (never back) and unread notices in the range get
+    receipts. Returns {"last_read_id", "receipts"}, or None if the user isn't
+    in the room.
+    """
+    from_id, to_id = sorted((from_id, to_id))
+    backfill(user_id)
+    cursor = (db.session.query(func.max(ChatParticipant.last_read_id))
+              .filter(ChatParticipant.user_id == user_id, ChatParticipant.room_id == room_id).scalar())
+    if cursor is None:
+        return None
+    # clamp to what exists, so a bad to_id can't mark future messages read
+    newest = (db.session.query(func.max(Message.id))
+              .filter(Message.room_id == room_id, Message.id <= to_id).scalar())
+    if newest is None or newest < from_id:
+        return {"last_read_id": cursor, "receipts": 0}
+
+    if newest > cursor:
+        (ChatParticipant.query
+         .filter(ChatParticipant.user_id == user_id, ChatParticipant.room_id == room_id,
+                 ChatParticipant.last_read_id < newest)
+         .update({ChatParticipant.last_read_id: newest}, synchronize_session=False))
+        cursor = newest
+
+    notices = select(Message.id, literal(user_id, Integer), literal(datetime.utcnow(), DateTime)).where(
+        Message.room_id == room_id,
+        Message.id.between(from_id, newest),
+        Message.requires_read_receipt.is_(True),
+        Message.sender_id != user_id,
+        ~exists().where(MessageReceipt.message_id == Message.id, MessageReceipt.user_id == user_id),
+    )
+    added = db.session.execute(
+        insert(MessageReceipt).from_select(["message_id", "user_id", "read_at"], notices)
+    ).rowcount
+    db.session.commit()
+    if added:
+        invalidate_notices(room_id)
+    return {"last_read_id": cursor, "receipts": added}
+
+
+def _notice_rows(room_id, limit):
+    audience = select(ChatParticipant.user_id).where(ChatParticipant.room_id == room_id).distinct()
+    participants = {uid for (uid,) in db.session.execute(audience)}
+    reads = (select(func.count(func.distinct(MessageReceipt.user_id)))
+             .where(MessageReceipt.message_id == Message.id,
+                    MessageReceipt.user_id != Message.sender_id,
+                    MessageReceipt.user_id.in_(audience))
+             .correlate(Message).scalar_subquery())
+    rows = (db.session.query(Message.id, Message.sender_id, Message.content, Message.created_at, User.username, reads)
+            .outerjoin(User, User.id == Message.sender_id)
+            .filter(Message.room_id == room_id, Message.requires_read_receipt.is_(True))
+            .order_by(Message.id.desc()).limit(limit))
+    summary = []
+    for mid, sender_id, content, created_at, sender, read in rows:
+        total = len(participants - {sender_id})
+        summary.append({
+            "id": mid, "sender": sender, "content": content, "time": created_at.isoformat(),
+            "read": read, "audience": total, "ratio": round(read / total, 3) if total else None,
+        })
+    return summary
+
+
+def notice_summary(room_id):
+    """The newest NOTICE_LIMIT notices: [{"id", "sender", "content", "time", "read", "audience", "ratio"}, …]."""
+    r = _redis()
+    if r:
+        try:
+            cached = r.get(notices_key(room_id))
+            if cached is not None:
+                return json.loads(cached)
+        except redis.RedisError:
+            r = None
+    summary = _notice_rows(room_id, NOTICE_LIMIT)
+    if r:
+        try:
+            r.set(notices_key(room_id), json.dumps(summary), ex=NOTICE_SUMMARY_TTL)
+        except redis.RedisError:
+            pass
+    return summary
+
+
+def invalidate_notices(room_id):
+    r = _redis()
+    if r:
+        try:
+            r.delete(notices_key(room_id))
+        except redis.RedisError:
+            pass
@@ -1,34 +1,31 @@
-from flask import render_template, request, jsonify, redirect, url_for
+from flask import render_template, request, jsonify, redirect, url_for, abort
 from flask_login import login_required, current_user
 from . import messaging_bp
 from ..extensions import db
 from .models import Message, ChatRoom, ChatParticipant
-from ..notifications.utils import create_notification
-from flask import current_app
-import time 
+from ..notifications.utils import fan_out
+from . import live, receipts
+from ..utils import events
+from ..teams import presence as team_presence
 
 @messaging_bp.route("/")
 @login_required
 def index():
     return redirect(url_for("messaging.rooms"))
 
-from ..teams.models import TeamMember
 from ..models import User
 
 @messaging_bp.route("/rooms")
 @login_required
 def rooms():
-    # Rooms for this user
-    parts = ChatParticipant.query.filter_by(user_id=current_user.id).all()
-    room_ids = [p.room_id for p in parts]
-    my_rooms = ChatRoom.query.filter(ChatRoom.id.in_(room_ids)).all()
+    # Rooms for this user, with unread counts (one query, see receipts.py)
+    my_rooms = receipts.rooms_with_unread(current_user.id)
 
-    # teammates = all users in same teams as me
+    # teammates = all users in same teams as me (cached rosters, see teams/presence.py)
     if current_user.role in ("ADMIN", "SUPER_ADMIN"):
         teammates = User.query.all()
     else:
-        team_ids = [tm.team_id for tm in TeamMember.query.filter_by(user_id=current_user.id).all()]
-        teammates = User.query.join(TeamMember, TeamMember.user_id==User.id).filter(TeamMember.team_id.in_(team_ids)).all()
+        teammates = team_presence.teammates(current_user.id)
 
     return render_template("messaging/rooms.html", rooms=my_rooms, teammates=teammates)
 
@@ -36,8 +33,9 @@ def rooms():
 @messaging_bp.route("/room/<int:room_id>")
 @login_required
 def room(room_id):
-    messages = Message.query.filter_by(room_id=room_id).order_by(Message.created_at.asc()).all()
-    return render_template("messaging/room.html", messages=messages, room_id=room_id)
+    # history is fetched a page at a time by the page itself (room_messages)
+    return render_template("messaging/room.html", room_id=room_id, page_size=live.HISTORY_PAGE_SIZE,
+                           teammates=team_presence.teammates(current_user.id))
 
 @messaging_bp.route("/room/<int:room_id>/send", methods=["POST"])
 @login_required
@@ -52,14 +50,14 @@ def send_message(room_id):
     msg = Message(room_id=room.id, sender_id=current_user.id, content=content)
     db.session.add(msg)
     db.session.commit()
+    live.publish_message(msg, current_user.username)
 
-    # Notify participants except sender
-    participants = ChatParticipant.query.filter_by(room_id=room.id).all()
-    for p in participants:
-        if p.user_id != current_user.id:
-            create_notification(p.user_id, f"New message in room {room.name}")
+    # Notify participants except sender: one bulk insert + one event (queued for big rooms)
+    recipients = [uid for (uid,) in db.session.query(ChatParticipant.user_id)
+                  .filter(ChatParticipant.room_id == room.id, ChatParticipant.user_id != current_user.id)]
+    fan_out(recipients, f"New message in room {room.name}")
 
-    return jsonify({"status": "ok", "message": content})
+    return jsonify({"status": "ok", "message": content, "id": msg.id})
 
 
 @messaging_bp.route("/create_room", methods=["POST"])
@@ -117,17 +115,40 @@ def send_team_notice(team_id):
     )
     db.session.add(msg)
     db.session.commit()
+    live.publish_message(msg, current_user.username)
+    receipts.invalidate_notices(room.id)
 
     return redirect(url_for("messaging.room", room_id=room.id))
 
 @messaging_bp.route("/room/<int:room_id>/read/<int:msg_id>", methods=["POST"])
 @login_required
 def mark_read(room_id, msg_id):
-    existing = MessageReceipt.query.filter_by(message_id=msg_id, user_id=current_user.id).first()
-    if not existing:
-        db.session.add(MessageReceipt(message_id=msg_id, user_id=current_user.id))
-        db.session.commit()
-    return jsonify(ok=True)
+    result = receipts.mark_read(current_user.id, room_id, msg_id, msg_id)
+    return jsonify(ok=result is not None)
+
+
+@messaging_bp.route("/room/<int:room_id>/read", methods=["POST"])
+@login_required
+def mark_read_range(room_id):
+    """Mark messages from_id..to_id read (form or JSON); moves the unread cursor and records notice receipts."""
+    data = request.get_json(silent=True) or request.form
+    try:
+        from_id, to_id = int(data["from_id"]), int(data["to_id"])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"status": "error", "message": "from_id and to_id are required."}), 400
+    result = receipts.mark_read(current_user.id, room_id, from_id, to_id)
+    if result is None:
+        return jsonify({"status": "error", "message": "Not a member of this room."}), 403
+    return jsonify(status="ok", **result)
+
+
+@messaging_bp.route("/room/<int:room_id>/notices")
+@login_required
+def notice_receipts(room_id):
+    """Read ratio of the room's recent notices, for managers."""
+    if current_user.role not in ("MANAGER", "ADMIN", "SUPER_ADMIN"):
+        abort(403)
+    return jsonify(receipts.notice_summary(room_id))
 
 def ensure_team_room(team):
     room = ChatRoom.query.filter_by(team_id=team.id, type="team").first()
@@ -172,50 +193,56 @@ from datetime import datetime
 @messaging_bp.route("/presence")
 @login_required
 def presence():
-    from ..teams.models import TeamMember
-    from ..models import User
-
-    team_ids = [tm.team_id for tm in TeamMember.query.filter_by(user_id=current_user.id).all()]
-    users = User.query.join(TeamMember, TeamMember.user_id == User.id)\
-                      .filter(TeamMember.team_id.in_(team_ids)).all()
-
-    result = []
-    r = current_app.redis
-    now = int(time.time())
-
-    for u in users:
-        status = "offline"
-        last_seen = None
-        if r and r.exists(f"user:{u.id}:online"):
-            status = "online"
-        else:
-            ts = r.get(f"user:{u.id}:last_seen")
-            if ts:
-                delta = now - int(ts)
-                if delta < 3600:
-                    last_seen = f"{delta//60} min ago"
-                else:
-                    last_seen = f"{delta//3600} hr ago"
-
-        result.append({
-            "id": u.id,
-            "username": u.username,
-            "status": status,
-            "last_seen": last_seen
-        })
-
-    return jsonify(result)
+    """Flat list of my teammates' status, read from the shared per-team snapshots."""
+    result = {}
+    for tid in team_presence.team_ids(current_user.id):
+        members = team_presence.snapshot(tid)["members"]
+        for m in team_presence.roster(tid):
+            state = members.get(str(m["id"]))
+            if state and m["id"] not in result:
+                result[m["id"]] = {"id": m["id"], "username": m["username"],
+                                   "status": state[0], "last_seen": state[1]}
+    return jsonify(list(result.values()))
+
+
+@messaging_bp.route("/presence/snapshot")
+@login_required
+def presence_snapshot():
+    """
+    Per team: {"version", "full", "members": {user_id: [status, last_seen] or null}}.
+    Pass back what you have as ?since=<team_id>:<version>,… to get only what changed.
+    """
+    have = {}
+    for part in request.args.get("since", "").split(","):
+        tid, _, version = part.partition(":")
+        if tid.isdigit() and version.isdigit():
+            have[int(tid)] = int(version)
+    return jsonify({tid: team_presence.since(tid, have.get(tid))
+                    for tid in team_presence.team_ids(current_user.id)})
 
 @messaging_bp.route("/room/<int:room_id>/messages")
 @login_required
 def room_messages(room_id):
-    messages = Message.query.filter_by(room_id=room_id).order_by(Message.created_at.asc()).all()
-    return jsonify([{
-        "id": m.id,
-        "sender": m.sender.username,
-        "content": m.content,
-        "time": m.created_at.strftime("%H:%M")
-    } for m in messages])
+    """
+    Oldest first, at most ?limit= messages:
+      ?after_id=N   the ones after N (catch-up after a reconnect)
+      ?before_id=N  the page before N ("load older")
+      neither       the latest page
+    """
+    after_id = request.args.get("after_id", type=int)
+    if after_id is not None:
+        limit = max(1, min(request.args.get("limit", live.PAGE_SIZE, type=int), live.PAGE_SIZE))
+        return jsonify(live.messages_after(room_id, after_id, limit))
+    limit = max(1, min(request.args.get("limit", live.HISTORY_PAGE_SIZE, type=int), live.PAGE_SIZE))
+    return jsonify(live.history(room_id, request.args.get("before_id", type=int), limit))
+
+
+@messaging_bp.route("/room/<int:room_id>/events")
+@login_required
+def room_events(room_id):
+    """SSE feed of new messages; replays anything after ?after_id= / Last-Event-ID first."""
+    after_id = request.headers.get("Last-Event-ID", type=int) or request.args.get("after_id", 0, type=int)
+    return events.response(live.stream(room_id, after_id))
 
 
 @messaging_bp.route("/add_friend", methods=["POST"])
@@ -49,3 +49,11 @@ class MessageRead(db.Model):
 
 
 
+
+
+class Blob(db.Model):
+    """One stored upload in the content-addressed store (app/utils/blobstore.py)."""
+    sha256 = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.BigInteger, default=0)
+    refcount = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -7,4 +7,4 @@ notifications_bp = Blueprint(
     template_folder="../templates/notifications"
 )
 
-from . import routes
+from . import routes, tasks
@@ -0,0 +1,139 @@
+"""
+Per-user notification inbox cached in Redis; the notification table stays the
+durable store.
+
+  notif:<user_id>:unread   unread counter
+  notif:<user_id>:recent   list of the newest unread items as JSON, newest first
+
+Both are filled from SQL on first use and then kept current by deliver(),
+which every fan-out in utils.py calls with one pipeline for all recipients.
+Only inboxes that are already cached get updated; the others are rebuilt from
+SQL the next time they're read. Pages follow /notifications/stream (one SSE
+connection per tab) instead of polling, and opening the list marks
+everything seen with a single UPDATE.
+"""
+import json
+
+import redis
+from flask import current_app
+
+from ..extensions import db
+from ..utils import events
+from .models import Notification
+
+# one pub/sub event per fan-out, however many recipients; each user's stream picks out its own
+CHANNEL = "notifications"
+RECENT_MAX = 10
+INBOX_TTL = 7 * 24 * 3600
+FALLBACK_RETRY_MS = 10000  # without Redis the stream's reconnects poll at the old 10 s pace
+
+
+def _redis():
+    return getattr(current_app, "redis", None)
+
+
+def unread_key(user_id):
+    return f"notif:{user_id}:unread"
+
+
+def recent_key(user_id):
+    return f"notif:{user_id}:recent"
+
+
+def item(message, created_at):
+    return {"message": message, "time": created_at.isoformat()}
+
+
+def _from_sql(user_id):
+    query = Notification.query.filter_by(user_id=user_id, seen=False)
+    recent = query.order_by(Notification.id.desc()).limit(RECENT_MAX).all()
+    return {"unread": query.count(), "recent": [item(n.message, n.created_at) for n in recent]}
+
+
+def summary(user_id):
+    """{"unread": n, "recent": [{message, time}, …]} — from Redis, or SQL (and cached) on a miss."""
+    r = _redis()
+    if r:
+        try:
+            pipe = r.pipeline()
+            pipe.get(unread_key(user_id))
+            pipe.lrange(recent_key(user_id), 0, RECENT_MAX - 1)
+            unread, recent = pipe.execute()
+            if unread is not None:
+                return {"unread": int(unread), "recent": [json.loads(x) for x in recent]}
+        except redis.RedisError:
+            r = None
+
+    data = _from_sql(user_id)
+    if r:
+        try:
+            pipe = r.pipeline()
+            pipe.delete(recent_key(user_id))
+            if data["recent"]:
+                pipe.rpush(recent_key(user_id), *[json.dumps(x) for x in data["recent"]])
+            pipe.set(unread_key(user_id), data["unread"], ex=INBOX_TTL)
+            pipe.expire(recent_key(user_id), INBOX_TTL)
+            pipe.execute()
+        except redis.RedisError:
+            pass
+    return data
+
+
+def deliver(user_ids, message, created_at):
+    """Count a new notification in every cached inbox of `user_ids` (two round trips in all)."""
+    r = _redis()
+    if not r or not user_ids:
+        return
+    payload = json.dumps(item(message, created_at))
+    try:
+        pipe = r.pipeline()
+        for uid in user_ids:
+            pipe.exists(unread_key(uid))
+        cached = [uid for uid, hit in zip(user_ids, pipe.execute()) if hit]
+        pipe = r.pipeline()
+        for uid in cached:
+            pipe.incr(unread_key(uid))
+            pipe.lpush(recent_key(uid), payload)
+            pipe.ltrim(recent_key(uid), 0, RECENT_MAX - 1)
+        pipe.execute()
+    except redis.RedisError:
+        pass
+
+
+def mark_seen(user_id, ids=None):
+    """
+    Mark a user's notifications seen with one UPDATE: all of them, or only
+    `ids`. Returns how many were unread.
+    """
+    query = Notification.query.filter_by(user_id=user_id, seen=False)
+    if ids is not None:
+        query = query.filter(Notification.id.in_(ids))
+    count = query.update({Notification.seen: True}, synchronize_session=False)
+    db.session.commit()
+    r = _redis()
+    if r:
+        try:
+            pipe = r.pipeline()
+            if ids is None:
+                pipe.set(unread_key(user_id), 0, ex=INBOX_TTL)
+                pipe.delete(recent_key(user_id))
+            else:  # something may have arrived meanwhile: rebuild from SQL on next read
+                pipe.delete(unread_key(user_id), recent_key(user_id))
+            pipe.execute()
+        except redis.RedisError:
+            pass
+    events.publish(CHANNEL, {"users": [user_id]}, event="seen")  # the user's other tabs clear too
+    return count
+
+
+def stream(user_id):
+    """SSE: the current summary, then each fan-out event that includes this user."""
+    def select(event, data):
+        if user_id not in data.get("users", ()):
+            return None
+        if event == "notification":
+            return {"message": data["message"], "time": data["time"]}
+        return {}
+
+    return events.stream(CHANNEL, initial=lambda: [("summary", summary(user_id), None)],
+                         select=select, retry_ms=FALLBACK_RETRY_MS)
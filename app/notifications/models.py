@@ -2,8 +2,23 @@ from datetime import datetime
 from ..extensions import db
 
 class Notification(db.Model):
+    # unread lookups filter on (user_id, seen); retention.py archives old seen rows
+    __table_args__ = (db.Index("ix_notification_user_id_seen", "user_id", "seen"),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"))
     message = db.Column(db.String(255))
     seen = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class NotificationArchive(db.Model):
+    """One compacted batch of old seen notifications: zlib-compressed JSON rows (see retention.py)."""
+    id = db.Column(db.Integer, primary_key=True)
+    first_id = db.Column(db.Integer)
+    last_id = db.Column(db.Integer)
+    rows = db.Column(db.Integer)
+    oldest = db.Column(db.DateTime)
+    newest = db.Column(db.DateTime)
+    payload = db.Column(db.LargeBinary, nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
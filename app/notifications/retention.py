@@ -0,0 +1,155 @@
+"""
+Notification retention.
+
+Seen notifications older than NOTIFICATION_RETENTION_DAYS are moved out of the
+live table in batches: each batch of rows becomes one NotificationArchive row
+(zlib-compressed JSON) and is deleted from `notification` in the same short
+transaction, so the table never holds a long lock and the inbox/unread queries
+(on the (user_id, seen) index) only see recent rows. Unseen rows are never
+archived, however old.
+
+    flask notifications stats
+    flask notifications compact [--days 90] [--batch 1000] [--max-batches N]
+
+or queue it: enqueue("notifications.compact"). The last run's numbers (rows
+moved, seconds, rows/s) are kept in Redis for `stats`.
+
+Config (all optional):
+  NOTIFICATION_RETENTION_DAYS   age (by created_at) after which seen rows go, default 90
+  NOTIFICATION_COMPACT_BATCH    rows per batch/transaction, default 1000
+"""
+import json
+import time
+import zlib
+from datetime import datetime, timedelta
+
+import click
+import redis
+from flask import current_app, has_app_context
+from flask.cli import AppGroup
+from sqlalchemy import func
+
+from ..extensions import db
+from .models import Notification, NotificationArchive
+
+DEFAULTS = {
+    "NOTIFICATION_RETENTION_DAYS": 90,
+    "NOTIFICATION_COMPACT_BATCH": 1000,
+}
+LAST_RUN_KEY = "notifications:compact:last"
+
+
+def _setting(name):
+    if has_app_context():
+        return current_app.config.get(name, DEFAULTS[name])
+    return DEFAULTS[name]
+
+
+def _redis():
+    return getattr(current_app, "redis", None) if has_app_context() else None
+
+
+def cutoff(days=None):
+    return datetime.utcnow() - timedelta(days=days if days is not None else _setting("NOTIFICATION_RETENTION_DAYS"))
+
+
+def expired(before):
+    return db.session.query(Notification.id).filter(Notification.seen.is_(True), Notification.created_at < before)
+
+
+def pack(rows):
+    return zlib.compress(json.dumps(rows, separators=(",", ":")).encode("utf-8"), 9)
+
+
+def unpack(archive):
+    """The archived notifications of one batch as dicts."""
+    return json.loads(zlib.decompress(archive.payload))
+
+
+def compact(days=None, batch=None, max_batches=None):
+    """Archive and delete expired seen notifications. Returns {"rows", "batches", "seconds", "rows_per_s"}."""
+    before = cutoff(days)
+    batch = int(batch or _setting("NOTIFICATION_COMPACT_BATCH"))
+    moved = batches = 0
+    start = time.perf_counter()
+    last_id = 0
+    while max_batches is None or batches < max_batches:
+        # walk by id so each batch is an index range scan, never a re-scan of what's left behind
+        rows = (db.session.query(Notification.id, Notification.user_id, Notification.message, Notification.created_at)
+                .filter(Notification.id > last_id, Notification.seen.is_(True), Notification.created_at < before)
+                .order_by(Notification.id).limit(batch).all())
+        if not rows:
+            break
+        ids = [r.id for r in rows]
+        db.session.add(NotificationArchive(
+            first_id=ids[0], last_id=ids[-1], rows=len(rows),
+            oldest=min(r.created_at for r in rows), newest=max(r.created_at for r in rows),
+            payload=pack([{"id": r.id, "user_id": r.user_id, "message": r.message,
+                           "created_at": r.created_at.isoformat()} for r in rows]),
+        ))
+        Notification.query.filter(Notification.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        moved += len(rows)
+        batches += 1
+        last_id = ids[-1]
+
+    seconds = time.perf_counter() - start
+    result = {"rows": moved, "batches": batches, "seconds": round(seconds, 3),
+              "rows_per_s": round(moved / seconds) if seconds and moved else 0,
+              "at": datetime.utcnow().isoformat(timespec="seconds")}
+    r = _redis()
+    if r:
+        try:
+            r.hset(LAST_RUN_KEY, mapping=result)
+        except redis.RedisError:
+            pass
+    return result
+
+
+def stats(days=None):
+    """Table sizes, what the next compaction would move, and the last run's throughput."""
+    total, unseen = db.session.query(
+        func.count(Notification.id), func.count(Notification.id).filter(Notification.seen.is_(False)),
+    ).one()
+    batches, archived, oldest = db.session.query(
+        func.count(NotificationArchive.id), func.coalesce(func.sum(NotificationArchive.rows), 0),
+        func.min(NotificationArchive.oldest),
+    ).one()
+    archive_bytes = db.session.query(func.coalesce(func.sum(func.length(NotificationArchive.payload)), 0)).scalar()
+    last = {}
+    r = _redis()
+    if r:
+        try:
+            last = {k.decode(): v.decode() for k, v in r.hgetall(LAST_RUN_KEY).items()}
+        except redis.RedisError:
+            pass
+    return {
+        "rows": total, "unseen": unseen, "seen": total - unseen,
+        "expired": expired(cutoff(days)).count(),
+        "archive_batches": batches, "archived_rows": archived, "archive_bytes": archive_bytes,
+        "archive_oldest": oldest.isoformat() if oldest else None,
+        "last_run": last,
+    }
+
+
+# ---------------- CLI: flask notifications ... ----------------
+notifications_cli = AppGroup("notifications", help="Notification retention.")
+
+
+@notifications_cli.command("stats")
+@click.option("--days", type=int, default=None, help="Retention to report against (default: config).")
+def stats_command(days):
+    """Show table size, expired rows and archive size."""
+    for k, v in stats(days).items():
+        click.echo(f"{k}: {v}")
+
+
+@notifications_cli.command("compact")
+@click.option("--days", type=int, default=None, help="Archive seen notifications older than this (default: config).")
+@click.option("--batch", type=int, default=None, help="Rows per transaction (default: config).")
+@click.option("--max-batches", type=int, default=None, help="Stop after this many batches.")
+def compact_command(days, batch, max_batches):
+    """Move expired seen notifications into the archive table."""
+    result = compact(days, batch, max_batches)
+    click.echo(f"✅ Archived {result['rows']} notifications in {result['batches']} batches "
+               f"({result['seconds']}s, {result['rows_per_s']} rows/s)")
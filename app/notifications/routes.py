@@ -1,16 +1,38 @@
 from flask import jsonify
 from flask_login import login_required, current_user
-from . import notifications_bp
+from . import notifications_bp, inbox, retention
 from .models import Notification
-from ..extensions import db
+from ..utils import events
+
 
 @notifications_bp.route("/poll")
 @login_required
 def poll():
-    notes = Notification.query.filter_by(user_id=current_user.id, seen=False).all()
-    data=[{"id":n.id,"message":n.message,"time":n.created_at.isoformat()} for n in notes]
-    for n in notes: n.seen=True
-    db.session.commit()
-    return jsonify(data)
+    """All unread notifications (for API clients; pages use /stream), marking exactly those seen."""
+    notes = (Notification.query.filter_by(user_id=current_user.id, seen=False)
+             .order_by(Notification.id.desc()).all())
+    if notes:
+        inbox.mark_seen(current_user.id, [n.id for n in notes])
+    return jsonify([{"id": n.id, "message": n.message, "time": n.created_at.isoformat()} for n in notes])
+
+
+@notifications_bp.route("/stream")
+@login_required
+def stream():
+    """SSE: a "summary" event ({unread, recent}), then "notification" and "seen" events as they happen."""
+    return events.response(inbox.stream(current_user.id))
 
 
+@notifications_bp.route("/seen", methods=["POST"])
+@login_required
+def seen():
+    return jsonify({"ok": True, "marked": inbox.mark_seen(current_user.id)})
+
+
+@notifications_bp.route("/retention")
+@login_required
+def retention_stats():
+    """Table/archive sizes and the last compaction's throughput (admins)."""
+    if current_user.role not in ("ADMIN", "SUPER_ADMIN"):
+        return jsonify({"error": "forbidden"}), 403
+    return jsonify(retention.stats())
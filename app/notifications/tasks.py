@@ -0,0 +1,20 @@
+"""
+Background jobs for notifications.
+
+Chat rooms with more than NOTIFY_FANOUT_INLINE_MAX recipients hand their
+fan-out to the queue so send_message returns right away. Retention compaction
+can be queued too (it commits batch by batch).
+"""
+from ..utils.jobs import job
+from .utils import notify_users
+from . import retention
+
+
+@job("notifications.fan_out", retries=3)
+def fan_out(user_ids, message):
+    notify_users(user_ids, message)
+
+
+@job("notifications.compact", retries=1)
+def compact(days=None, batch=None):
+    retention.compact(days, batch)
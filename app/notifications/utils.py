@@ -1,27 +1,84 @@
+from datetime import datetime
+
+from flask import current_app, has_app_context
+from sqlalchemy import Boolean, DateTime, String, insert, literal, select
+
 from ..extensions import db
 from ..notifications.models import Notification
 from ..models import User
 from ..teams.models import TeamMember
+from ..utils import events
+from .inbox import CHANNEL, deliver
+
+INSERT_BATCH = 1000
+FANOUT_INLINE_MAX = 500  # bigger audiences go to the job queue (NOTIFY_FANOUT_INLINE_MAX)
+
+
+def publish(user_ids, message, created_at):
+    deliver(user_ids, message, created_at)
+    events.publish(CHANNEL, {"users": list(user_ids), "message": message, "time": created_at.isoformat()},
+                   event="notification")
+
+
+def notify_users(user_ids, message):
+    """Notify many users at once: batched executemany inserts, one commit, one event."""
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return 0
+    now = datetime.utcnow()
+    table = Notification.__table__
+    for i in range(0, len(user_ids), INSERT_BATCH):
+        db.session.execute(table.insert(), [
+            {"user_id": uid, "message": message, "seen": False, "created_at": now}
+            for uid in user_ids[i:i + INSERT_BATCH]
+        ])
+    db.session.commit()
+    publish(user_ids, message, now)
+    return len(user_ids)
+
+
+def fan_out(user_ids, message):
+    """notify_users() inline for small audiences, on the job queue for big ones."""
+    inline_max = current_app.config.get("NOTIFY_FANOUT_INLINE_MAX", FANOUT_INLINE_MAX) if has_app_context() else FANOUT_INLINE_MAX
+    if len(user_ids) <= inline_max:
+        return notify_users(user_ids, message)
+    from ..utils.jobs import enqueue
+    enqueue("notifications.fan_out", user_ids=list(user_ids), message=message)
+    return len(user_ids)
+
 
 def create_notification(user_id, message):
-    n = Notification(user_id=user_id, message=message)
-    db.session.add(n)
+    notify_users([user_id], message)
+
+def notify_select(user_ids, message):
+    """
+    Notify every user id produced by `user_ids` (a one-column select) with a
+    single INSERT ... SELECT: no ORM objects, one statement, one commit, one event.
+    """
+    now = datetime.utcnow()
+    audience = user_ids.subquery()
+    rows = select(
+        audience.c[0], literal(message, String), literal(False, Boolean), literal(now, DateTime),
+    )
+    stmt = insert(Notification).from_select(["user_id", "message", "seen", "created_at"], rows)
+    if db.engine.dialect.insert_returning:
+        notified = db.session.execute(stmt.returning(Notification.user_id)).scalars().all()
+    else:
+        notified = db.session.execute(user_ids).scalars().all()
+        db.session.execute(stmt)
     db.session.commit()
+    if notified:
+        publish(notified, message, now)
+    return len(notified)
 
 def notify_role(role, message):
-    users = User.query.filter_by(role=role).all()
-    for u in users:
-        create_notification(u.id, message)
+    return notify_select(select(User.id).where(User.role == role), message)
 
 def notify_roles(roles, message):
-    users = User.query.filter(User.role.in_(roles)).all()
-    for u in users:
-        create_notification(u.id, message)
+    return notify_select(select(User.id).where(User.role.in_(roles)), message)
 
 def notify_team(team_id, message):
-    members = TeamMember.query.filter_by(team_id=team_id).all()
-    for m in members:
-        create_notification(m.user_id, message)
+    return notify_select(select(TeamMember.user_id).where(TeamMember.team_id == team_id).distinct(), message)
 
 def notify_user(user, message):
-    create_notification(user.id, message)
\ No newline at end of file
+    create_notification(user.id, message)
@@ -7,4 +7,4 @@ presentations_bp = Blueprint(
     template_folder="../templates/presentations"
 )
 
-from . import routes
+from . import routes, tasks
@@ -0,0 +1,375 @@
+"""
+Presentation backups (.zip / .zpb archives), full and incremental.
+
+Layout of a multi-deck backup:
+
+    manifest.json                  see below
+    presentation_<id>/details.json
+    presentation_<id>/client/slide0000.html, agent/notes0000.html, …
+    presentation_<id>/media/<name>
+
+manifest.json:
+
+    {"backup":        {"id", "base", "kind": "full|incremental|partial", "created_at", "deleted": [ids]},
+     "presentations": [entries for the decks *in this archive*, with "hash" and "media" {name: sha256}],
+     "index":         {"<id>": {"title", "hash", "media"}} for *every* deck at export time}
+
+An incremental backup is taken against a base manifest: decks whose hash is
+unchanged are left out, and so is any media whose sha256 the base already
+had. Because "index" always describes the whole library, any backup can be the
+base of the next one, and a chain full → inc → inc … can be applied in order.
+Manifests are also kept in uploads/backups so "since the last backup" needs no
+upload. Archives from before this format (no "backup" key) count as full.
+
+Everything is streamed (utils/zipstream.py); restored media goes into the blob
+store, so restoring the same file from several increments stores it once.
+"""
+import hashlib
+import json
+import os
+import re
+import uuid
+import zipfile
+from datetime import datetime
+from urllib.parse import unquote
+
+from flask_login import current_user
+from werkzeug.security import safe_join
+
+from ..extensions import db
+from ..utils import blobstore
+from ..utils.thumbnails import file_sha256
+from ..utils.zipstream import ZipStream
+from .models import Presentation, Slide, MediaFile, PresentationAccess
+
+UPLOAD_MEDIA_DIR = os.path.join(os.getcwd(), "uploads", "media")
+BACKUP_DIR = os.path.join(os.getcwd(), "uploads", "backups")
+INCOMING_DIR = os.path.join(BACKUP_DIR, "incoming")
+
+# absolute or root-relative links to uploaded media, as written by the editor / importers
+MEDIA_URL_RE = re.compile(r"""[^"'\s>]*/(?:presentations|uploads)/media/([^"'\s>?#]+)(?:[?#][^"'\s>]*)?""")
+# archive-relative links written by the exporter
+ARCHIVE_MEDIA_RE = re.compile(r"""(?<![\w/.])media/([^"'\s>?#]+)""")
+
+
+class BackupError(ValueError):
+    pass
+
+
+# ---------------- Export ----------------
+def _media_sources(names):
+    """Slide media name -> (file on disk, sha256): blob keys, blob-backed MediaFile rows, older flat files."""
+    blobs = dict(db.session.query(MediaFile.filename, MediaFile.blob).filter(
+        MediaFile.filename.in_(names), MediaFile.blob.isnot(None)))
+    sources = {}
+    for name in sorted(names):
+        key = os.path.basename(name)
+        if not blobstore.is_key(key):
+            key = blobs.get(name)
+        path = blobstore.path(key) if key else safe_join(UPLOAD_MEDIA_DIR, name)
+        if path and os.path.isfile(path):
+            sources[name] = (path, blobstore.sha_of(key) if key else file_sha256(path))
+    return sources
+
+
+def details_of(pres):
+    return {
+        "id": pres.id,
+        "title": pres.title,
+        "restricted_to_managers": pres.restricted_to_managers,
+        "teams": [ar.team_id for ar in pres.access_rules if ar.team_id],
+        "users": [ar.user_id for ar in pres.access_rules if ar.user_id],
+        "type": "html",
+    }
+
+
+def snapshot(pres):
+    """Everything needed to compare and write one deck, plus its content hash."""
+    slides = sorted(pres.slides, key=lambda x: x.position)
+    pages = [(s.client_content or "", s.agent_notes or "") for s in slides]
+    sources = _media_sources({unquote(m.group(1)) for c, a in pages for m in MEDIA_URL_RE.finditer(c + a)})
+    details = details_of(pres)
+
+    digest = hashlib.sha256(json.dumps(details, sort_keys=True).encode())
+    for client, notes in pages:
+        for part in (client, notes):
+            digest.update(hashlib.sha256(part.encode("utf-8")).digest())
+    media = {name: sha for name, (_, sha) in sources.items()}
+    digest.update(json.dumps(media, sort_keys=True).encode())
+    return {"pres": pres, "details": details, "pages": pages, "sources": sources,
+            "media": media, "hash": digest.hexdigest()}
+
+
+def write_presentation(z, snap, prefix="", rewrite=True, skip_media=()):
+    """
+    Stream one deck into ZipStream `z` under `prefix` (client/, agent/, media/,
+    details.json). With rewrite, media URLs become archive-relative media/<name>.
+    Media named in skip_media is referenced but not written (it's in the base).
+    """
+    sources = snap["sources"]
+
+    def rewritten(html):
+        if not rewrite:
+            return html
+        return MEDIA_URL_RE.sub(lambda m: f"media/{m.group(1)}" if unquote(m.group(1)) in sources else m.group(0), html)
+
+    # zero-padded so the importers' sorted() keeps slide order past slide 9
+    for idx, (client, notes) in enumerate(snap["pages"]):
+        yield from z.writestr(f"{prefix}client/slide{idx:04d}.html", rewritten(client))
+        yield from z.writestr(f"{prefix}agent/notes{idx:04d}.html", rewritten(notes))
+    for name, (path, _) in sources.items():
+        if name not in skip_media and f"{prefix}media/{name}" not in z.names:
+            yield from z.write_file(path, f"{prefix}media/{name}")
+    yield from z.writestr(f"{prefix}details.json", json.dumps(snap["details"]))
+
+
+def export_single(pres):
+    z = ZipStream()
+    yield from write_presentation(z, snapshot(pres), rewrite=False)
+    yield from z.close()
+
+
+def export_many(pres_ids, base=None, partial=False):
+    """
+    Backup archive for `pres_ids`, one deck in memory at a time. With a base
+    manifest only decks and media that changed since it are written. A partial
+    export (hand-picked decks) is marked as such and its manifest is not kept:
+    its index doesn't cover the library, so it can't be the base of an increment.
+    """
+    z = ZipStream()
+    base_index = (base or {}).get("index") or {}
+    base_media = {sha for entry in base_index.values() for sha in (entry.get("media") or {}).values()}
+    entries, index = [], {}
+
+    for pres_id in pres_ids:
+        pres = db.session.get(Presentation, pres_id)
+        if not pres:
+            continue
+        snap = snapshot(pres)
+        index[str(pres.id)] = {"title": pres.title, "hash": snap["hash"], "media": snap["media"]}
+        if base and base_index.get(str(pres.id), {}).get("hash") == snap["hash"]:
+            continue  # unchanged since the base
+        skip = {name for name, sha in snap["media"].items() if sha in base_media}
+        yield from write_presentation(z, snap, prefix=f"presentation_{pres.id}/", skip_media=skip)
+        entries.append({
+            **{k: snap["details"][k] for k in ("id", "title", "restricted_to_managers", "teams", "users")},
+            "created_at": pres.created_at.strftime("%Y-%m-%d %H:%M"),
+            "slide_count": len(snap["pages"]),
+            "hash": snap["hash"],
+            "media": snap["media"],
+        })
+
+    manifest = {
+        "backup": {
+            "id": uuid.uuid4().hex,
+            "base": (base or {}).get("backup", {}).get("id"),
+            "kind": "incremental" if base else "partial" if partial else "full",
+            "created_at": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+            "deleted": sorted(int(i) for i in base_index if i not in index) if base else [],
+        },
+        "presentations": entries,
+        "index": index,
+    }
+    yield from z.writestr("manifest.json", json.dumps(manifest, indent=2))
+    yield from z.close()
+    if not partial:
+        save_manifest(manifest)  # only reached once the whole archive has been sent
+
+
+# ---------------- Stored manifests ----------------
+def save_manifest(manifest):
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    with open(os.path.join(BACKUP_DIR, f"{manifest['backup']['id']}.json"), "w", encoding="utf-8") as f:
+        json.dump({"backup": manifest["backup"], "index": manifest["index"]}, f)
+
+
+def load_manifest(backup_id):
+    """A stored manifest by id, or the newest one for "latest". None if there isn't one."""
+    if not os.path.isdir(BACKUP_DIR):
+        return None
+    if backup_id == "latest":
+        stored = [os.path.join(BACKUP_DIR, n) for n in os.listdir(BACKUP_DIR) if n.endswith(".json")]
+        path = max(stored, key=os.path.getmtime) if stored else None
+    else:
+        path = safe_join(BACKUP_DIR, f"{backup_id}.json")
+    if not path or not os.path.isfile(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def last_backup():
+    manifest = load_manifest("latest")
+    return manifest["backup"] if manifest else None
+
+
+def read_manifest(fileobj, filename=""):
+    """Base manifest from an upload: a manifest.json, or a backup archive containing one."""
+    if filename.lower().endswith((".zip", ".zpb")):
+        with zipfile.ZipFile(fileobj) as z:
+            return json.loads(z.read("manifest.json").decode())
+    return json.loads(fileobj.read().decode())
+
+
+# ---------------- Import ----------------
+def _archive_manifest(z):
+    if "manifest.json" in z.namelist():
+        manifest = json.loads(z.read("manifest.json").decode())
+    else:
+        manifest = {"presentations": []}
+    if not manifest.get("presentations"):
+        # very old archives: no manifest, or one without entries; read the folders
+        folders = sorted({n.split("/")[0] for n in z.namelist() if n.startswith("presentation_")})
+        manifest["presentations"] = [json.loads(z.read(f"{f}/details.json").decode()) for f in folders
+                                     if f"{f}/details.json" in z.namelist()]
+    manifest.setdefault("backup", {"id": None, "base": None, "kind": "full", "deleted": []})
+    return manifest
+
+
+def order_chain(manifests):
+    """Indexes of `manifests` in apply order: one full backup, then each increment on top of the previous."""
+    fulls = [i for i, m in enumerate(manifests) if m["backup"].get("kind") != "incremental"]
+    if len(fulls) != 1:
+        raise BackupError("Select exactly one full backup plus any incremental backups taken after it.")
+    order = fulls
+    by_base = {m["backup"].get("base"): i for i, m in enumerate(manifests) if m["backup"].get("kind") == "incremental"}
+    while len(order) < len(manifests):
+        nxt = by_base.get(manifests[order[-1]]["backup"].get("id"))
+        if nxt is None:
+            raise BackupError("The incremental backups don't form a chain starting at the full backup.")
+        order.append(nxt)
+    return order
+
+
+class Chain:
+    """A full backup plus increments, opened read-only; state() is the library as of the last one."""
+
+    def __init__(self, paths):
+        self.zips = [zipfile.ZipFile(p) for p in paths]
+        try:
+            manifests = [_archive_manifest(z) for z in self.zips]
+            order = order_chain(manifests)
+        except Exception:
+            self.close()
+            raise
+        self.zips = [self.zips[i] for i in order]
+        self.manifests = [manifests[i] for i in order]
+        self._by_sha = None
+
+    def close(self):
+        for z in self.zips:
+            z.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def state(self):
+        """{pres id: (manifest entry, archive)} for the decks that exist after the last increment."""
+        decks = {}
+        for z, manifest in zip(self.zips, self.manifests):
+            for entry in manifest["presentations"]:
+                decks[int(entry["id"])] = (entry, z)
+            for pres_id in manifest["backup"].get("deleted") or []:
+                decks.pop(int(pres_id), None)
+        index = self.manifests[-1].get("index")
+        if index is not None:
+            decks = {i: d for i, d in decks.items() if str(i) in index}
+        return decks
+
+    def find_media(self, name, sha=None):
+        """(archive, member) for a media file, newest archive first; by sha when known, else by name."""
+        if self._by_sha is None:
+            self._by_sha = {}
+            for z, manifest in reversed(list(zip(self.zips, self.manifests))):
+                names = set(z.namelist())
+                for entry in manifest["presentations"]:
+                    for media_name, media_sha in (entry.get("media") or {}).items():
+                        member = f"presentation_{entry['id']}/media/{media_name}"
+                        if member in names:
+                            self._by_sha.setdefault(media_sha, (z, member))
+        if sha and sha in self._by_sha:
+            return self._by_sha[sha]
+        for z in reversed(self.zips):
+            for member in z.namelist():
+                if member.endswith(f"/media/{name}") and member.startswith("presentation_"):
+                    return z, member
+        return None
+
+
+def _restore_media(z, member, name, user_id):
+    """Put an archived media file in the blob store and return the MediaFile name slides should use."""
+    with z.open(member) as src:
+        key = blobstore.save(src, name)
+    existing = MediaFile.query.filter_by(filename=name).first()
+    if existing:
+        legacy = None if existing.blob else safe_join(UPLOAD_MEDIA_DIR, name)
+        same = existing.blob == key or (
+            legacy and os.path.isfile(legacy) and file_sha256(legacy) == blobstore.sha_of(key))
+        if same:
+            blobstore.release(key)
+            return name
+        base, ext = os.path.splitext(name)
+        name = f"{base}_{blobstore.sha_of(key)[:8]}{ext}"
+        if MediaFile.query.filter_by(filename=name, blob=key).first():
+            blobstore.release(key)
+            return name
+    db.session.add(MediaFile(filename=name, blob=key, user_id=user_id))
+    return name
+
+
+def restore_presentation(chain, entry, z, restored_media=None):
+    """Create a new Presentation from its newest copy in the chain. Returns it."""
+    folder = f"presentation_{entry['id']}"
+    names = z.namelist()
+    details = json.loads(z.read(f"{folder}/details.json").decode())
+    media_shas = entry.get("media") or {}
+    restored_media = {} if restored_media is None else restored_media  # (sha or member) -> final name
+
+    pres = Presentation(
+        title=details["title"],
+        creator_id=current_user.id,
+        restricted_to_managers=details.get("restricted_to_managers", False),
+    )
+    db.session.add(pres)
+    db.session.flush()
+
+    def restore_refs(html):
+        def replace(m):
+            name = m.group(1)
+            found = chain.find_media(name, media_shas.get(name))
+            if not found:
+                return f"/presentations/media/{name}"
+            token = media_shas.get(name) or found[1]
+            if token not in restored_media:
+                restored_media[token] = _restore_media(found[0], found[1], name, current_user.id)
+            return f"/presentations/media/{restored_media[token]}"
+        return ARCHIVE_MEDIA_RE.sub(replace, html or "")
+
+    client_files = sorted(n for n in names if n.startswith(f"{folder}/client/"))
+    agent_files = sorted(n for n in names if n.startswith(f"{folder}/agent/"))
+    rows = []
+    for idx, c in enumerate(client_files):
+        rows.append(dict(
+            presentation_id=pres.id, position=idx,
+            client_content=restore_refs(z.read(c).decode()),
+            agent_notes=restore_refs(z.read(agent_files[idx]).decode()) if idx < len(agent_files) else "",
+        ))
+    db.session.bulk_insert_mappings(Slide, rows)
+
+    for tid in details.get("teams", []):
+        db.session.add(PresentationAccess(presentation_id=pres.id, team_id=tid))
+    for uid in details.get("users", []):
+        db.session.add(PresentationAccess(presentation_id=pres.id, user_id=uid))
+    return pres
+
+
+def incoming_paths(paths):
+    """Only archives saved by import_all_zpb may be opened."""
+    root = os.path.realpath(INCOMING_DIR)
+    safe = [p for p in paths if os.path.commonpath([root, os.path.realpath(p)]) == root and os.path.isfile(p)]
+    if not safe or len(safe) != len(paths):
+        raise BackupError("Backup files not found — please upload them again.")
+    return safe
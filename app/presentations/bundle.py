@@ -0,0 +1,81 @@
+"""
+Compiled playback bundle: every slide's HTML plus a manifest of the media the
+slides reference, in one response the player loads (and prefetches) up front.
+
+  pres:<id>:bundle   hash {client, client:v, agent, agent:v} — the JSON for viewers
+                     without/with agent notes and its version, expires after BUNDLE_TTL
+
+The version is a hash of the per-slide etags (live.slide_etag), so it changes
+whenever any slide does, and it is the bundle's ETag: a player that reloads an
+unchanged deck gets a 304. Anything that rewrites slides calls invalidate().
+"""
+import hashlib
+import json
+import re
+
+import redis
+from flask import current_app
+
+from .models import Slide
+from . import live
+
+BUNDLE_TTL = 24 * 3600
+MEDIA_RE = re.compile(r"""\b(?:src|poster|data-src)\s*=\s*["']([^"']+)["']""", re.IGNORECASE)
+
+
+def key(pres_id):
+    return f"pres:{pres_id}:bundle"
+
+
+def media_urls(html):
+    return [u for u in MEDIA_RE.findall(html or "") if not u.startswith(("data:", "javascript:"))]
+
+
+def build(pres_id, notes=False):
+    slides = Slide.query.filter_by(presentation_id=pres_id).order_by(Slide.position, Slide.id).all()
+    entries, media, seen = [], [], set()
+    for s in slides:
+        entry = {"id": s.id, "position": s.position, "etag": live.slide_etag(s), "client_content": s.client_content}
+        if notes:
+            entry["agent_notes"] = s.agent_notes
+        entries.append(entry)
+        for url in media_urls(s.client_content) + (media_urls(s.agent_notes) if notes else []):
+            if url not in seen:
+                seen.add(url)
+                media.append(url)
+    version = hashlib.sha1(",".join(e["etag"] for e in entries).encode()).hexdigest()[:16]
+    return {"presentation": pres_id, "version": version, "slides": entries, "media": media}
+
+
+def get(pres_id, notes=False):
+    """(json text, version) — from Redis when cached, built and cached otherwise."""
+    field = "agent" if notes else "client"
+    r = getattr(current_app, "redis", None)
+    if r:
+        try:
+            body, version = r.hmget(key(pres_id), field, field + ":v")
+            if body and version:
+                return body.decode(), version.decode()
+        except redis.RedisError:
+            r = None
+
+    payload = build(pres_id, notes)
+    body = json.dumps(payload, separators=(",", ":"))
+    if r:
+        try:
+            pipe = r.pipeline()
+            pipe.hset(key(pres_id), mapping={field: body, field + ":v": payload["version"]})
+            pipe.expire(key(pres_id), BUNDLE_TTL)
+            pipe.execute()
+        except redis.RedisError:
+            pass
+    return body, payload["version"]
+
+
+def invalidate(pres_id):
+    r = getattr(current_app, "redis", None)
+    if r:
+        try:
+            r.delete(key(pres_id))
+        except redis.RedisError:
+            pass
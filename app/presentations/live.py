@@ -0,0 +1,86 @@
+"""
+Live presenter sessions: which slide a running presentation is on.
+
+State lives in Redis so every gunicorn worker agrees on it:
+
+  pres:<id>:live   hash {slide, etag, version, presenter, at}, expires after LIVE_TTL
+                   and doubles as the pub/sub channel the change is announced on
+
+Viewers subscribe through /presentations/<id>/events (see utils/events.py) and
+only receive {slide, etag, version}. They keep the slides they've already shown
+and fetch /presentations/<id>/slides/<slide_id> only for an id/etag they don't
+have, so going back and forth costs nothing after the first pass.
+
+Without Redis a per-process dict is used: fine for `flask run`, wrong with
+several workers.
+"""
+import hashlib
+import time
+
+import redis
+from flask import current_app
+
+from ..utils import events
+
+LIVE_TTL = 12 * 3600
+
+_local_state = {}  # fallback when Redis is unavailable (single process only)
+
+
+def key(pres_id):
+    return f"pres:{pres_id}:live"
+
+
+def slide_etag(slide):
+    digest = hashlib.sha1()
+    for part in (slide.client_content, slide.agent_notes):
+        digest.update((part or "").encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+def set_slide(pres_id, slide, presenter_id=None):
+    """Move the presentation to `slide` and tell every viewer. Returns the new state."""
+    state = {"slide": slide.id, "etag": slide_etag(slide), "presenter": presenter_id or "", "at": int(time.time())}
+    r = getattr(current_app, "redis", None)
+    try:
+        if not r:
+            raise redis.RedisError("no redis")
+        pipe = r.pipeline()
+        pipe.hincrby(key(pres_id), "version", 1)
+        pipe.hset(key(pres_id), mapping=state)
+        pipe.expire(key(pres_id), LIVE_TTL)
+        state["version"] = pipe.execute()[0]
+    except redis.RedisError:
+        state["version"] = _local_state.get(pres_id, {}).get("version", 0) + 1
+        _local_state[pres_id] = state
+        return state
+
+    events.publish(key(pres_id), public(state), event="slide", id=state["version"])
+    return state
+
+
+def get_state(pres_id):
+    """Current {slide, etag, version, …} or None when nobody has started presenting."""
+    r = getattr(current_app, "redis", None)
+    if r:
+        try:
+            raw = r.hgetall(key(pres_id))
+            if raw:
+                state = {k.decode(): v.decode() for k, v in raw.items()}
+                state["slide"] = int(state["slide"])
+                state["version"] = int(state["version"])
+                return state
+            return None
+        except redis.RedisError:
+            pass
+    return _local_state.get(pres_id)
+
+
+def public(state):
+    """What viewers get: enough to decide whether they need to fetch anything."""
+    return {k: state[k] for k in ("slide", "etag", "version")} if state else {"slide": None}
+
+
+def stream(pres_id):
+    return events.stream(key(pres_id), initial=lambda: [("slide", public(get_state(pres_id)), None)])
@@ -13,6 +13,10 @@ class Presentation(db.Model):
     restricted_to_managers = db.Column(db.Boolean, default=False)
     access_rules = db.relationship("PresentationAccess", backref="presentation", cascade="all,delete-orphan")
 
+    # background imports (PDF): "processing" until the job has added every slide
+    import_status = db.Column(db.String(20), default="ready")
+    import_job = db.Column(db.String(40), nullable=True)
+
 class Slide(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     presentation_id = db.Column(db.Integer, db.ForeignKey("presentation.id"))
@@ -25,6 +29,7 @@ class Slide(db.Model):
 class MediaFile(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     filename = db.Column(db.String(255), nullable=False)
+    blob = db.Column(db.String(80), nullable=True, index=True)  # blobstore key; None for older files in uploads/media
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"))
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
     user = db.relationship(User)
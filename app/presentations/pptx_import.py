@@ -0,0 +1,221 @@
+"""
+PPTX -> slides import engine.
+
+Decks are laid out as (client slide, notes slide) pairs. Pairs are turned into
+HTML in a process pool for big decks: each worker opens the .pptx once and
+parses a range of pairs, returning HTML plus the sha1/extension of every
+picture it referenced. The parent then writes each distinct picture once (a
+logo on all 300 slides is one file), registers it as a blob-backed MediaFile,
+and inserts all Slide rows with a single bulk insert.
+
+Config (all optional):
+  PPTX_IMPORT_PROCESSES       pool size, default min(4, cpu count); 1 disables the pool
+  PPTX_IMPORT_PARALLEL_PAIRS  only use the pool for decks with at least this many pairs, default 40
+"""
+import atexit
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app, has_app_context
+from pptx import Presentation as PptxPresentation
+from pptx.enum.shapes import MSO_SHAPE_TYPE
+from pptx.parts.image import ImagePart
+
+from ..extensions import db
+from ..utils import blobstore
+from .models import Slide, MediaFile
+
+UPLOAD_MEDIA_DIR = os.path.join(os.getcwd(), "uploads", "media")
+MEDIA_URL = "/presentations/media/"
+DEFAULTS = {
+    "PPTX_IMPORT_PROCESSES": min(4, os.cpu_count() or 1),
+    "PPTX_IMPORT_PARALLEL_PAIRS": 40,
+}
+PAIRS_PER_TASK = 10
+
+
+def _setting(name):
+    if has_app_context():
+        return current_app.config.get(name, DEFAULTS[name])
+    return DEFAULTS[name]
+
+
+def image_name(user_id, sha1, ext):
+    return f"{user_id}_{sha1}.{ext}"
+
+
+# ---------------- Slide -> HTML ----------------
+def slide_html(slide, user_id, images=None):
+    """
+    Text/media of one pptx slide as semantic HTML. Handles titles, paragraphs,
+    bullet/numbered lists, images, video, audio. Referenced pictures are
+    recorded in `images` as {sha1: ext}; nothing is written here.
+    """
+    images = {} if images is None else images
+    content = []
+
+    for shape in slide.shapes:
+        # --- Titles & subtitles ---
+        if shape.is_placeholder and shape.has_text_frame and shape.text.strip():
+            if shape.placeholder_format.type == 1:  # Title
+                content.append(f"<h1>{shape.text.strip()}</h1>")
+                continue
+            elif shape.placeholder_format.type == 3:  # Subtitle
+                content.append(f"<h2>{shape.text.strip()}</h2>")
+                continue
+
+        # --- Text frames (paragraphs, bullet lists) ---
+        if shape.has_text_frame:
+            for p in shape.text_frame.paragraphs:
+                txt = p.text.strip()
+                if not txt:
+                    continue
+
+                # Indented bullets
+                indent = f" style='margin-left:{p.level*2}em'" if p.level > 0 else ""
+
+                # Numbered lists (starts with "1.", "2.", etc.)
+                if txt[:1].isdigit() and "." in txt[:3]:
+                    parts = txt.split(".", 1)
+                    txt_clean = parts[1].strip() if len(parts) == 2 else txt
+                    content.append(f"<ol{indent}><li>{txt_clean}</li></ol>")
+                # Bullets (• or -)
+                elif txt.startswith("•") or txt.startswith("- "):
+                    txt_clean = txt.lstrip("•- ").strip()
+                    content.append(f"<ul{indent}><li>{txt_clean}</li></ul>")
+                else:
+                    content.append(f"<p{indent}>{txt}</p>")
+
+        # --- Images ---
+        if shape.shape_type == MSO_SHAPE_TYPE.PICTURE or hasattr(shape, "image"):
+            try:
+                image = shape.image
+                images[image.sha1] = image.ext  # usually 'png', 'jpeg'
+                content.append(f'<img src="{MEDIA_URL}{image_name(user_id, image.sha1, image.ext)}" class="slide-img" />')
+            except Exception as e:
+                print(f"Image extract error: {e}")
+
+        # --- Embedded media (audio/video placeholders) ---
+        if hasattr(shape, "media_type"):
+            if shape.media_type == "video":
+                content.append('<video controls class="slide-video"><source src="movie.mp4" type="video/mp4"></video>')
+            elif shape.media_type == "audio":
+                content.append('<audio controls class="slide-audio"><source src="audio.mp3" type="audio/mpeg"></audio>')
+
+    return "\n".join(content) if content else "<p>(empty slide)</p>"
+
+
+# ---------------- Parsing (pool workers) ----------------
+_pool = None
+_decks = {}  # per process: path -> (mtime, Presentation)
+
+
+def _deck(path):
+    mtime = os.path.getmtime(path)
+    cached = _decks.get(path)
+    if not cached or cached[0] != mtime:
+        _decks.clear()
+        cached = _decks[path] = (mtime, PptxPresentation(path))
+    return cached[1]
+
+
+def _parse_pairs(path, start, stop, user_id, skip=()):
+    """
+    Pairs starting at slide indexes [start, stop) -> ([(first, second), …], {sha1: ext}).
+    Slides at an offset in `skip` (0 = first of the pair, 1 = second) come back as "".
+    """
+    slides = _deck(path).slides
+    images, pairs = {}, []
+    for i in range(start, stop, 2):
+        pair = []
+        for offset in (0, 1):
+            j = i + offset
+            pair.append("" if j >= len(slides) or offset in skip else slide_html(slides[j], user_id, images))
+        pairs.append(tuple(pair))
+    return pairs, images
+
+
+def _get_pool(processes):
+    global _pool
+    if _pool is None:
+        # spawn: safe under threaded servers and the same on Windows
+        _pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"))
+        atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+    return _pool
+
+
+def _drop_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def parse_deck(path, user_id, skip=(), processes=None):
+    """All slide pairs of a deck in order, plus {sha1: ext} of the pictures they use."""
+    n = len(_deck(path).slides)
+    processes = int(processes or _setting("PPTX_IMPORT_PROCESSES") or 1)
+    step = PAIRS_PER_TASK * 2
+    ranges = [(s, min(s + step, n)) for s in range(0, n, step)]
+
+    results = None
+    if processes > 1 and n // 2 >= _setting("PPTX_IMPORT_PARALLEL_PAIRS"):
+        try:
+            pool = _get_pool(processes)
+            futures = [pool.submit(_parse_pairs, path, s, e, user_id, tuple(skip)) for s, e in ranges]
+            results = [f.result() for f in futures]
+        except Exception as e:
+            # the pool couldn't start or a child died: parse here instead of failing the import
+            if has_app_context():
+                current_app.logger.warning(f"PPTX pool failed for {os.path.basename(path)}, parsing serially: {e}")
+            _drop_pool()
+    if results is None:
+        results = [_parse_pairs(path, s, e, user_id, skip) for s, e in ranges]
+
+    pairs, images = [], {}
+    for chunk_pairs, chunk_images in results:
+        pairs += chunk_pairs
+        images.update(chunk_images)
+    return pairs, images
+
+
+# ---------------- Writing ----------------
+def store_images(path, images, user_id):
+    """Write each distinct picture once (blob store + MediaFile row). Returns how many were new."""
+    wanted = {image_name(user_id, sha1, ext): sha1 for sha1, ext in images.items()}
+    if not wanted:
+        return 0
+    known = {name for (name,) in db.session.query(MediaFile.filename).filter(MediaFile.filename.in_(wanted))}
+    missing = {sha1: name for name, sha1 in wanted.items()
+               if name not in known and not os.path.exists(os.path.join(UPLOAD_MEDIA_DIR, name))}
+    if not missing:
+        return 0
+
+    rows = []
+    for part in _deck(path).part.package.iter_parts():
+        if isinstance(part, ImagePart) and part.sha1 in missing:
+            name = missing.pop(part.sha1)
+            rows.append(dict(filename=name, blob=blobstore.save_bytes(part.blob, name), user_id=user_id))
+    db.session.bulk_insert_mappings(MediaFile, rows)
+    return len(rows)
+
+
+def import_deck(path, pres_id, user_id, reverse=False, skip_notes=False, start_position=0, processes=None):
+    """
+    Add the deck's (client, notes) slide pairs to a presentation; `reverse` means
+    each pair is (notes, client) in the file. Caller commits. Returns the number
+    of slides added.
+    """
+    skip = ((0,) if reverse else (1,)) if skip_notes else ()
+    pairs, images = parse_deck(path, user_id, skip=skip, processes=processes)
+    if reverse:
+        pairs = [(notes, client) for client, notes in pairs]
+
+    store_images(path, images, user_id)
+    _decks.pop(path, None)
+    db.session.bulk_insert_mappings(Slide, [
+        dict(presentation_id=pres_id, position=start_position + idx, client_content=client, agent_notes=notes)
+        for idx, (client, notes) in enumerate(pairs)
+    ])
+    return len(pairs)
@@ -1,24 +1,22 @@
 import os
 import glob
-from flask import render_template, request, redirect, url_for, flash, jsonify, send_from_directory, session
+from flask import render_template, request, redirect, url_for, flash, jsonify, session, abort
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 from . import presentations_bp
 from .models import Presentation, Slide, MediaFile
 from ..extensions import db
-from pptx import Presentation as PptxPresentation
 import shutil
-import re
-from pptx.enum.shapes import MSO_SHAPE_TYPE
-from ..utils.thumbnails import auto_generate_thumbnail
+from ..utils import blobstore, jobs, events
+from ..utils.media import send_media, version_matches
+from ..utils.zipstream import zip_response
+from .tasks import queue_pdf_import, queue_ppt_import
+from . import live, bundle, backup, pptx_import
 
-import zipfile, json, shutil
-from flask import send_file
+import zipfile, json, shutil, uuid
 from ..teams.models import Team
 
-from pdf2image import convert_from_path
-from setup_poppler import ensure_poppler
-from flask import send_from_directory, current_app
+from flask import current_app
 
 
 
@@ -33,47 +31,18 @@ os.makedirs(UPLOAD_MEDIA_SLIDES_DIR, exist_ok=True)
 
 
 def import_pptx(file_path, pres_id):
-    ppt = PptxPresentation(file_path)
-    idx = 0
-    for i in range(0, len(ppt.slides), 2):
-        client_html = extract_slide_content(ppt.slides[i])
-
-        notes_html = ""
-        if i + 1 < len(ppt.slides):
-            notes_html = extract_slide_content(ppt.slides[i+1])
-
-        new_slide = Slide(
-            presentation_id=pres_id,
-            position=idx,
-            client_content=client_html,
-            agent_notes=notes_html
-        )
-        db.session.add(new_slide)
-        idx += 1
+    pptx_import.import_deck(file_path, pres_id, current_user.id)
     db.session.commit()
 
-def import_pdf_as_images(pdf_path, pres_id):
-    poppler_path = ensure_poppler()  # Windows returns path, Linux/mac just None
-    pages = convert_from_path(pdf_path, dpi=150, poppler_path=poppler_path)
-    for idx, page in enumerate(pages):
-        fname = f"slide_{pres_id}_{idx}.jpg"
-        fpath = os.path.join(UPLOAD_MEDIA_DIR, "slides", fname)
-        page.save(fpath, "JPEG")
-        media = MediaFile(filename="slides/"+fname, user_id=current_user.id)
-        db.session.add(media)
-        slide = Slide(presentation_id=pres_id, position=idx,
-                      client_content=f'<img src="{url_for("presentations.media_file", "slides", filename=fname)}">', agent_notes="")
-        db.session.add(slide)
-
-
-    db.session.commit()
-
-
 @presentations_bp.route("/")
 @login_required
 def index():
     pres = Presentation.query.all()
-    return render_template("presentations/index.html", presentations=pres)
+    summary = None
+    if current_user.role in ("ADMIN","SUPER_ADMIN"):
+        last = backup.last_backup()
+        summary = {"total": len(pres), "last_backup": last and f'{last["created_at"]} UTC ({last["kind"]})'}
+    return render_template("presentations/index.html", presentations=pres, summary=summary)
 
 @presentations_bp.route("/create", methods=["GET","POST"])
 @login_required
@@ -128,6 +97,7 @@ def edit(pres_id):
             ppt_file.save(fpath)
             import_pptx(fpath, pres.id)
         db.session.commit()
+        bundle.invalidate(pres.id)  # slides were rebuilt: players must refetch
         flash("Presentation updated","success")
         return redirect(url_for("presentations.index"))
     return render_template("presentations/edit.html", presentation=pres)
@@ -143,19 +113,50 @@ def run_client(pres_id):
     pres=Presentation.query.get_or_404(pres_id)
     return render_template("presentations/run_client.html", presentation=pres)
 
-current_slide={}
 @presentations_bp.route("/<int:pres_id>/goto/<int:slide_id>", methods=["POST"])
 @login_required
 def goto_slide(pres_id,slide_id):
-    current_slide[pres_id]=slide_id
-    return jsonify({"ok":True,"slide":slide_id})
+    slide = Slide.query.filter_by(id=slide_id, presentation_id=pres_id).first_or_404()
+    state = live.set_slide(pres_id, slide, current_user.id)
+    return jsonify({"ok":True, **live.public(state)})
 
 @presentations_bp.route("/<int:pres_id>/current")
 def current(pres_id):
-    sid=current_slide.get(pres_id)
-    if not sid: return jsonify({"slide":None})
-    slide=Slide.query.get(sid)
-    return jsonify({"id":slide.id,"client_content":slide.client_content,"agent_notes":slide.agent_notes})
+    state = live.get_state(pres_id)
+    slide = Slide.query.get(state["slide"]) if state else None
+    if not slide: return jsonify({"slide":None})
+    return jsonify({"id":slide.id,"client_content":slide.client_content,"agent_notes":slide.agent_notes,
+                    **live.public(state)})
+
+@presentations_bp.route("/<int:pres_id>/events")
+def live_events(pres_id):
+    """SSE: {slide, etag, version} every time the presenter moves."""
+    return events.response(live.stream(pres_id))
+
+@presentations_bp.route("/<int:pres_id>/bundle")
+def slide_bundle(pres_id):
+    """Every slide's HTML + media manifest in one versioned payload, for the player to preload."""
+    Presentation.query.get_or_404(pres_id)
+    notes = current_user.is_authenticated
+    body, version = bundle.get(pres_id, notes=notes)
+    rv = current_app.response_class(body, mimetype="application/json")
+    rv.set_etag(version + ("-a" if notes else ""))
+    rv.cache_control.private = True
+    rv.cache_control.no_cache = True
+    return rv.make_conditional(request)
+
+@presentations_bp.route("/<int:pres_id>/slides/<int:slide_id>")
+def slide_content(pres_id, slide_id):
+    """One slide's HTML; revalidates by ETag so viewers re-download only edited slides."""
+    slide = Slide.query.filter_by(id=slide_id, presentation_id=pres_id).first_or_404()
+    data = {"id": slide.id, "client_content": slide.client_content}
+    if current_user.is_authenticated:
+        data["agent_notes"] = slide.agent_notes
+    rv = jsonify(data)
+    rv.set_etag(live.slide_etag(slide) + ("-a" if current_user.is_authenticated else ""))
+    rv.cache_control.private = True
+    rv.cache_control.no_cache = True
+    return rv.make_conditional(request)
 
 @presentations_bp.route("/upload_media", methods=["POST"])
 @login_required
@@ -169,25 +170,31 @@ def upload_media():
         return redirect(url_for("presentations.media_manager"))
 
     fname = f"{current_user.id}_{secure_filename(file.filename)}"
-    save_dir = os.path.join("uploads", "media")
-    os.makedirs(save_dir, exist_ok=True)
-    file_path = os.path.join(save_dir, fname)
-    file.save(file_path)
-
-    # ✅ Auto-generate thumbnail (video, image, pdf)
-    thumb_name = auto_generate_thumbnail(file_path, file.mimetype, save_dir)
+    blob = blobstore.save(file, fname)
 
-    # Write DB record
-    media = MediaFile(filename=fname, user_id=current_user.id)
-    db.session.add(media)
+    # Same name already taken: same bytes -> reuse the record, different bytes -> don't overwrite it
+    existing = MediaFile.query.filter_by(filename=fname).first()
+    if existing and existing.blob == blob:
+        blobstore.release(blob)
+        media = existing
+    else:
+        if existing:
+            base, ext = os.path.splitext(fname)
+            fname = f"{base}_{blobstore.sha_of(blob)[:8]}{ext}"
+        media = MediaFile(filename=fname, blob=blob, user_id=current_user.id)
+        db.session.add(media)
     db.session.commit()
 
+    # ✅ Auto-generate thumbnail (video, image, pdf) — once per distinct file
+    thumb_name = blobstore.thumbnail(media.blob, file.mimetype)
+
     # If upload came from a form, redirect instead of JSON
     if request.form:
         flash("Media uploaded", "success")
         return redirect(url_for("presentations.media_manager"))
 
-    file_url = url_for("presentations.media_file", filename=fname, _external=True)
+    file_url = url_for("presentations.media_file", filename=media.filename,
+                       v=blobstore.sha_of(media.blob)[:12], _external=True)
     return jsonify({"location": file_url, "thumbnail": thumb_name})
 
 # Serve uploaded media
@@ -195,7 +202,22 @@ def upload_media():
 def media_file(filename):
     """Serve uploaded media files."""
     media_dir = os.path.join(os.getcwd(), "uploads", "media")
-    return send_from_directory(media_dir, filename)
+    key = os.path.basename(filename)
+    if blobstore.is_key(key):
+        # the blob store is shared with library files and test answers: only presentation
+        # media and thumbnails are public here, anything else never reaches a shared cache
+        if blobstore.is_thumbnail(key) or MediaFile.query.filter_by(blob=key).first():
+            return send_media(key, media_dir, immutable=True, private=False)
+        from ..tests.models import TestAnswer
+        if (filename.startswith("audio_answers/") and current_user.is_authenticated
+                and TestAnswer.query.filter_by(answer_audio=key).first()):
+            return send_media(key, media_dir, immutable=True, private=True)
+        abort(404)
+    media = MediaFile.query.filter_by(filename=filename).first()
+    if media and media.blob:
+        # upload_media hands out ?v=<hash> URLs; those can be cached for good
+        return send_media(media.blob, media_dir, immutable=version_matches(media.blob), private=False)
+    return send_media(filename, media_dir, private=False)
 
 @presentations_bp.route("/<int:pres_id>/duplicate", methods=["POST"])
 @login_required
@@ -244,22 +266,26 @@ def delete_media(filename):
         return jsonify({"ok":False,"error":"Unauthorized"}),403
 
     media_dir = os.path.join("uploads","media")
-    fpath = os.path.join(media_dir, filename)
+    from .models import MediaFile
+    media = MediaFile.query.filter_by(filename=filename).first()
 
-    # ✅ Delete physical file if present
-    if os.path.exists(fpath):
-        os.remove(fpath)
+    if media and media.blob:
+        # shared store: drop our reference, `flask blobs gc` removes the bytes once unused
+        blobstore.release(media.blob)
+    else:
+        fpath = os.path.join(media_dir, filename)
 
-    # ✅ Remove auto-generated thumbnail (_thumb.jpg)
-    base, _ = os.path.splitext(filename)
-    thumb = base + "_thumb.jpg"
-    thumb_path = os.path.join(media_dir, thumb)
-    if os.path.exists(thumb_path):
-        os.remove(thumb_path)
+        # ✅ Delete physical file if present
+        if os.path.exists(fpath):
+            os.remove(fpath)
+
+        # ✅ Remove auto-generated thumbnails (_thumb.jpg and the other sizes)
+        base, _ = os.path.splitext(filename)
+        for thumb in os.listdir(media_dir) if os.path.isdir(media_dir) else []:
+            if thumb.startswith(base + "_thumb"):
+                os.remove(os.path.join(media_dir, thumb))
 
     # ✅ ALSO delete DB record
-    from .models import MediaFile
-    media = MediaFile.query.filter_by(filename=filename).first()
     if media:
         db.session.delete(media)
         db.session.commit()
@@ -286,15 +312,12 @@ def import_ppt():
             return redirect(url_for("presentations.import_ppt"))
 
         fname = secure_filename(ppt_file.filename)
+        legacy = fname.endswith(".ppt")
+        if legacy:
+            fname = f"{uuid.uuid4().hex[:8]}_{fname}"  # converted in the background: keep uploads apart
         fpath = os.path.join(UPLOAD_PPT_DIR, fname)
         ppt_file.save(fpath)
 
-        # ✅ If old .ppt, convert to .pptx with LibreOffice
-        if fname.endswith(".ppt"):
-            converted = os.path.splitext(fpath)[0] + ".pptx"
-            os.system(f'libreoffice --headless --convert-to pptx "{fpath}" --outdir "{UPLOAD_PPT_DIR}"')
-            fpath = converted
-
         # Create new Presentation record
         pres = Presentation(
             title=title,
@@ -304,36 +327,27 @@ def import_ppt():
         db.session.add(pres)
         db.session.commit()
 
-        # Parse pptx
-        ppt = PptxPresentation(fpath)
-        slides = ppt.slides
-
-        slide_pairs = []
-        for i in range(0, len(slides), 2):
-            client_slide = slides[i]
-            notes_slide = slides[i+1] if i+1 < len(slides) else None
-            slide_pairs.append((client_slide, notes_slide))
-
-        if reverse_order:
-            slide_pairs = [(n, c) for c, n in slide_pairs]
-
-        for idx, (client, notes) in enumerate(slide_pairs):
-            client_html = extract_slide_content(client)
-            notes_html = "" if (skip_notes or not notes) else extract_slide_content(notes)
-
-            s = Slide(
-                presentation_id=pres.id,
-                position=idx,
-                client_content=client_html,
-                agent_notes=notes_html
-            )
-            db.session.add(s)
-
+        # ✅ Old .ppt: LibreOffice conversion + import run on the job queue
+        if legacy:
+            queue_ppt_import(pres, fpath, current_user.id, reverse=reverse_order, skip_notes=skip_notes)
+            if pres.import_status == "ready":  # ran inline (no worker / JOBS_EAGER)
+                flash("Presentation imported successfully","success")
+                return redirect(url_for("presentations.index"))
+            if pres.import_status == "failed":
+                flash("Could not convert the .ppt file","danger")
+            else:
+                flash("Conversion started — the slides will appear when it finishes","info")
+            return redirect(url_for("presentations.import_ppt", pres_id=pres.id))
+
+        # Parse pptx: pairs in a process pool, each picture written once, one bulk insert
+        pptx_import.import_deck(fpath, pres.id, current_user.id, reverse=reverse_order, skip_notes=skip_notes)
         db.session.commit()
         flash("Presentation imported successfully","success")
         return redirect(url_for("presentations.index"))
 
-    return render_template("presentations/import_ppt.html")
+    pres = Presentation.query.get(request.args.get("pres_id", type=int) or 0)
+    job = jobs.status(pres.import_job) if pres and pres.import_status == "failed" else None
+    return render_template("presentations/import_ppt.html", pres=pres, job=job)
 
 
 @presentations_bp.route("/confirm_import", methods=["POST"])
@@ -368,74 +382,6 @@ def confirm_import():
 
 
 
-def extract_slide_content(slide):
-    """
-    Extract text/media from pptx slide into semantic HTML.
-    Handles: titles, paragraphs, bullet/numbered lists, images, video, audio.
-    """
-
-    content = []
-
-    for shape in slide.shapes:
-        # --- Titles & subtitles ---
-        if shape.is_placeholder and shape.has_text_frame and shape.text.strip():
-            if shape.placeholder_format.type == 1:  # Title
-                content.append(f"<h1>{shape.text.strip()}</h1>")
-                continue
-            elif shape.placeholder_format.type == 3:  # Subtitle
-                content.append(f"<h2>{shape.text.strip()}</h2>")
-                continue
-
-        # --- Text frames (paragraphs, bullet lists) ---
-        if shape.has_text_frame:
-            for p in shape.text_frame.paragraphs:
-                txt = p.text.strip()
-                if not txt:
-                    continue
-
-                # Indented bullets
-                indent = f" style='margin-left:{p.level*2}em'" if p.level > 0 else ""
-
-                # Numbered lists (starts with "1.", "2.", etc.)
-                if txt[:1].isdigit() and "." in txt[:3]:
-                    parts = txt.split(".", 1)
-                    txt_clean = parts[1].strip() if len(parts) == 2 else txt
-                    content.append(f"<ol{indent}><li>{txt_clean}</li></ol>")
-                # Bullets (• or -)
-                elif txt.startswith("•") or txt.startswith("- "):
-                    txt_clean = txt.lstrip("•- ").strip()
-                    content.append(f"<ul{indent}><li>{txt_clean}</li></ul>")
-                else:
-                    content.append(f"<p{indent}>{txt}</p>")
-
-        # --- Images ---
-        if shape.shape_type == MSO_SHAPE_TYPE.PICTURE or hasattr(shape, "image"):
-            try:
-                image = shape.image
-                ext = image.ext  # usually 'png', 'jpeg'
-                img_name = f"{current_user.id}_{image.sha1}.{ext}"
-                fpath = os.path.join(UPLOAD_MEDIA_DIR, img_name)
-
-                if not os.path.exists(fpath):
-                    with open(fpath, "wb") as f:
-                        f.write(image.blob)
-
-                url = url_for("presentations.media_file", filename=img_name, _external=False)
-                content.append(f'<img src="{url}" class="slide-img" />')
-            except Exception as e:
-                print(f"Image extract error: {e}")
-
-        # --- Embedded media (audio/video placeholders) ---
-        if hasattr(shape, "media_type"):
-            if shape.media_type == "video":
-                content.append('<video controls class="slide-video"><source src="movie.mp4" type="video/mp4"></video>')
-            elif shape.media_type == "audio":
-                content.append('<audio controls class="slide-audio"><source src="audio.mp3" type="audio/mpeg"></audio>')
-
-    return "\n".join(content) if content else "<p>(empty slide)</p>"
-
-
-
 @presentations_bp.route("/<int:pres_id>/delete", methods=["POST"])
 @login_required
 def delete_presentation(pres_id):
@@ -448,6 +394,7 @@ def delete_presentation(pres_id):
     Slide.query.filter_by(presentation_id=pres.id).delete()
     db.session.delete(pres)
     db.session.commit()
+    bundle.invalidate(pres_id)
     flash("Presentation deleted", "success")
     return redirect(url_for("presentations.index"))
 
@@ -502,8 +449,7 @@ def import_zpb(zip_path):
                                  client_content=client_html, agent_notes=notes_html))
         db.session.commit()
 
-import tempfile
-
+# ---------------- ZPB backups (see backup.py) ----------------
 @presentations_bp.route("/<int:pres_id>/export_zpb")
 @login_required
 def export_zpb(pres_id):
@@ -512,56 +458,7 @@ def export_zpb(pres_id):
         flash("Access denied", "danger")
         return redirect(url_for("presentations.index"))
 
-    # Use system temp dir for portability
-    tmpdir = os.path.join(tempfile.gettempdir(), f"pres_{pres.id}")
-    if os.path.exists(tmpdir):
-        shutil.rmtree(tmpdir)
-    os.makedirs(os.path.join(tmpdir, "client"), exist_ok=True)
-    os.makedirs(os.path.join(tmpdir, "agent"), exist_ok=True)
-    os.makedirs(os.path.join(tmpdir, "media"), exist_ok=True)
-
-    # dump slides as html
-    for idx, s in enumerate(sorted(pres.slides, key=lambda x: x.position)):
-        with open(os.path.join(tmpdir, "client", f"slide{idx}.html"), "w", encoding="utf-8") as f:
-            f.write(s.client_content or "")
-        with open(os.path.join(tmpdir, "agent", f"notes{idx}.html"), "w", encoding="utf-8") as f:
-            f.write(s.agent_notes or "")
-
-    # details.json
-    details = {
-        "id": pres.id,
-        "title": pres.title,
-        "restricted_to_managers": pres.restricted_to_managers,
-        "teams": [ar.team_id for ar in pres.access_rules if ar.team_id],
-        "users": [ar.user_id for ar in pres.access_rules if ar.user_id],
-        "type": "html",
-    }
-    with open(os.path.join(tmpdir, "details.json"), "w", encoding="utf-8") as f:
-        json.dump(details, f)
-
-    # copy referenced media
-    upload_dir = os.path.join("uploads", "media")
-    for slide in pres.slides:
-        html = (slide.client_content or "") + (slide.agent_notes or "")
-        for fname in re.findall(r'/media/([^"\'\s>]+)', html):
-            # normalize to OS path
-            src = os.path.join(upload_dir, *fname.split("/"))
-            dest = os.path.join(tmpdir, "media", *fname.split("/"))
-            if os.path.exists(src):
-                os.makedirs(os.path.dirname(dest), exist_ok=True)
-                shutil.copy(src, dest)
-
-    # zip it
-    zpath = os.path.join(tempfile.gettempdir(), f"pres_{pres.id}.zpb")
-    if os.path.exists(zpath):
-        os.remove(zpath)
-    with zipfile.ZipFile(zpath, "w") as z:
-        for root, dirs, files in os.walk(tmpdir):
-            for file in files:
-                fpath = os.path.join(root, file)
-                z.write(fpath, os.path.relpath(fpath, tmpdir))
-
-    return send_file(zpath, as_attachment=True, download_name=f"{pres.title}.zpb")
+    return zip_response(backup.export_single(pres), f"{pres.title}.zpb")
 
 
 
@@ -603,91 +500,34 @@ def import_zpb():
     return render_template("presentations/import_zpb.html")
 
 
-@presentations_bp.route("/export_all_zpb")
+@presentations_bp.route("/export_all_zpb", methods=["GET","POST"])
 @login_required
 def export_all_zpb():
+    """Full backup, or only what changed since ?since=<backup id|latest> / an uploaded base manifest."""
     if current_user.role not in ("SUPER_ADMIN", "ADMIN"):
         flash("Only Admins/Super Admins can export full backups", "danger")
         return redirect(url_for("presentations.index"))
 
-    base_tmp = f"/tmp/presentations_all"
-    if os.path.exists(base_tmp):
-        shutil.rmtree(base_tmp)
-    os.makedirs(base_tmp, exist_ok=True)
-
-    all_pres = Presentation.query.all()
-    upload_dir = os.path.join("uploads", "media")
-
-    manifest = []  # 🔥 collect info for manifest.json
-
-    for pres in all_pres:
-        pres_dir = os.path.join(base_tmp, f"presentation_{pres.id}")
-        os.makedirs(os.path.join(pres_dir, "client"), exist_ok=True)
-        os.makedirs(os.path.join(pres_dir, "agent"), exist_ok=True)
-        os.makedirs(os.path.join(pres_dir, "media"), exist_ok=True)
-
-        def rewrite_and_copy(html):
-            if not html:
-                return ""
-            updated_html = html
-            for match in re.findall(r'src="[^"]+/(uploads/media|presentations/media)/([^"]+)"', html):
-                fname = match[1]
-                src = os.path.join(upload_dir,  *fname.split("/"))
-                dest = os.path.join(pres_dir, "media",  *fname.split("/"))
-                if os.path.exists(src):
-                    os.makedirs(os.path.dirname(dest), exist_ok=True)
-                    shutil.copy(src, dest)
-                    updated_html = updated_html.replace(f"/presentations/media/{fname}", f"media/{fname}")
-                    updated_html = updated_html.replace(f"/uploads/media/{fname}", f"media/{fname}")
-            return updated_html
-
-        for idx, s in enumerate(sorted(pres.slides, key=lambda x: x.position)):
-            with open(os.path.join(pres_dir, "client", f"slide{idx}.html"), "w") as f:
-                f.write(rewrite_and_copy(s.client_content or ""))
-            with open(os.path.join(pres_dir, "agent", f"notes{idx}.html"), "w") as f:
-                f.write(rewrite_and_copy(s.agent_notes or ""))
-
-        details = {
-            "id": pres.id,
-            "title": pres.title,
-            "restricted_to_managers": pres.restricted_to_managers,
-            "teams": [ar.team_id for ar in pres.access_rules if ar.team_id],
-            "users": [ar.user_id for ar in pres.access_rules if ar.user_id],
-            "type": "html"
-        }
-        with open(os.path.join(pres_dir, "details.json"), "w") as f:
-            json.dump(details, f)
-
-        # add entry to manifest
-        manifest.append({
-            "id": pres.id,
-            "title": pres.title,
-            "created_at": pres.created_at.strftime("%Y-%m-%d %H:%M"),
-            "restricted_to_managers": pres.restricted_to_managers,
-            "teams": details["teams"],
-            "users": details["users"],
-            "slide_count": len(pres.slides)
-        })
-
-    # write manifest.json at root
-    with open(os.path.join(base_tmp, "manifest.json"), "w") as f:
-        json.dump({"presentations": manifest}, f, indent=2)
-
-    zpath = "/tmp/all_presentations_backup.zip"
-    if os.path.exists(zpath):
-        os.remove(zpath)
-
-    with zipfile.ZipFile(zpath, "w") as z:
-        for root, dirs, files in os.walk(base_tmp):
-            for file in files:
-                fpath = os.path.join(root, file)
-                z.write(fpath, os.path.relpath(fpath, base_tmp))
-
-    return send_file(
-        zpath,
-        as_attachment=True,
-        download_name="all_presentations_backup.zip"
-    )
+    base = None
+    if request.method == "POST" and request.files.get("base"):
+        f = request.files["base"]
+        try:
+            base = backup.read_manifest(f.stream, f.filename)
+        except (ValueError, KeyError, zipfile.BadZipFile):
+            flash("That file isn't a backup or a manifest.json", "danger")
+            return redirect(url_for("presentations.index"))
+        if base.get("backup", {}).get("kind") == "partial":
+            flash("That's a backup of selected presentations — use a full or incremental backup as the base", "warning")
+            return redirect(url_for("presentations.index"))
+    elif request.args.get("since"):
+        base = backup.load_manifest(request.args["since"])
+        if not base:
+            flash("No earlier backup to compare against — take a full backup first", "warning")
+            return redirect(url_for("presentations.index"))
+
+    pres_ids = [pid for (pid,) in db.session.query(Presentation.id).order_by(Presentation.id)]
+    name = "incremental_presentations_backup.zip" if base else "all_presentations_backup.zip"
+    return zip_response(backup.export_many(pres_ids, base=base), name)
 
 
 @presentations_bp.route("/import_all_zpb", methods=["GET","POST"])
@@ -698,21 +538,31 @@ def import_all_zpb():
         return redirect(url_for("presentations.index"))
 
     if request.method == "POST":
-        file = request.files["file"]
-        savepath = f"/tmp/{secure_filename(file.filename)}"
-        file.save(savepath)
-
-        with zipfile.ZipFile(savepath, "r") as z:
-            manifest = {}
-            if "manifest.json" in z.namelist():
-                manifest = json.loads(z.read("manifest.json").decode())
-            presentations = manifest.get("presentations", [])
+        # a full backup, optionally followed by incremental ones; each upload gets its own folder
+        files = [f for f in request.files.getlist("file") if f and f.filename]
+        if not files:
+            flash("Select a backup file", "danger")
+            return redirect(url_for("presentations.import_all_zpb"))
+        upload_dir = os.path.join(backup.INCOMING_DIR, uuid.uuid4().hex)
+        os.makedirs(upload_dir, exist_ok=True)
+        paths = []
+        for i, f in enumerate(files):
+            paths.append(os.path.join(upload_dir, f"{i:02d}_{secure_filename(f.filename)}"))
+            f.save(paths[-1])
+
+        try:
+            with backup.Chain(paths) as chain:
+                presentations = [entry for entry, _ in chain.state().values()]
+        except (backup.BackupError, zipfile.BadZipFile, KeyError, ValueError) as e:
+            shutil.rmtree(upload_dir, ignore_errors=True)
+            flash(str(e) if isinstance(e, backup.BackupError) else "Not a presentations backup", "danger")
+            return redirect(url_for("presentations.import_all_zpb"))
 
         # Step 1: show preview selection of which to import
         return render_template("presentations/import_preview_select.html",
-                               file_path=savepath, presentations=presentations)
+                               file_paths=paths, presentations=presentations)
 
-    return render_template("presentations/import_all_zpb.html")
+    return render_template("presentations/import_all_zpb.html", last_backup=backup.last_backup())
 
 
 @presentations_bp.route("/import_selected_process", methods=["POST"])
@@ -722,74 +572,26 @@ def import_selected_process():
         flash("Unauthorized", "danger")
         return redirect(url_for("presentations.index"))
 
-    savepath = request.form["file_path"]
-    selected_ids = list(map(int, request.form.getlist("presentation_ids")))
-    print(selected_ids)
-
-    with zipfile.ZipFile(savepath, "r") as z:
-        pres_folders = set([name.split("/")[0] for name in z.namelist() if name.startswith("presentation_")])
-        upload_dir = os.path.join("uploads", "media")
-        os.makedirs(upload_dir, exist_ok=True)
-
-        restored = []
-        for folder in pres_folders:
-            details = json.loads(z.read(f"{folder}/details.json").decode())
-            if details.get("id") not in selected_ids and details["title"] not in selected_ids:
-                continue
-
-            pres = Presentation(
-                title=details["title"],
-                creator_id=current_user.id,
-                restricted_to_managers=details.get("restricted_to_managers", False)
-            )
-            db.session.add(pres); db.session.commit()
-
-            client_files = sorted([x for x in z.namelist() if x.startswith(f"{folder}/client/")])
-            agent_files = sorted([x for x in z.namelist() if x.startswith(f"{folder}/agent/")])
-
-            def restore_media_refs(html):
-                if not html: return ""
-                updated_html = html
-                for fname in re.findall(r'media/([^"^\']+)', html):
-                    if f"{folder}/media/{fname}" in z.namelist():
-                        dest = os.path.join(upload_dir, fname)
-                        with open(dest,"wb") as out: out.write(z.read(f"{folder}/media/{fname}"))
-                    updated_html = re.sub(
-                        rf'(?<!presentations/)media/{re.escape(fname)}',
-                        f'/presentations/media/{fname}',
-                        updated_html
-                    )
-                return updated_html
-
-
-
-
-
-
-
-            for idx, c in enumerate(client_files):
-                client_html = restore_media_refs(z.read(c).decode())
-                notes_html = restore_media_refs(z.read(agent_files[idx]).decode()) if idx < len(agent_files) else ""
-                db.session.add(Slide(presentation_id=pres.id, position=idx,
-                                     client_content=client_html, agent_notes=notes_html))
-            db.session.commit()
-
-            for tid in details.get("teams", []):
-                db.session.add(PresentationAccess(presentation_id=pres.id, team_id=tid))
-            for uid in details.get("users", []):
-                db.session.add(PresentationAccess(presentation_id=pres.id, user_id=uid))
-            db.session.commit()
-
-            restored.append(pres.title)
+    selected_ids = set(map(int, request.form.getlist("presentation_ids")))
+    try:
+        paths = backup.incoming_paths(request.form.getlist("file_path"))
+    except backup.BackupError as e:
+        flash(str(e), "danger")
+        return redirect(url_for("presentations.import_all_zpb"))
+
+    restored = []
+    with backup.Chain(paths) as chain:
+        media = {}  # shared across decks: each archived file is restored once
+        for pres_id, (entry, z) in sorted(chain.state().items()):
+            if pres_id in selected_ids:
+                restored.append(backup.restore_presentation(chain, entry, z, media).title)
+        db.session.commit()
 
+    shutil.rmtree(os.path.dirname(paths[0]), ignore_errors=True)
     flash(f"Imported {len(restored)} presentations: {', '.join(restored)}", "success")
     return redirect(url_for("presentations.index"))
 
 
-
-
-
-
 @presentations_bp.route("/export_select", methods=["GET","POST"])
 @login_required
 def export_select_zpb():
@@ -803,77 +605,8 @@ def export_select_zpb():
             flash("No presentations selected!", "warning")
             return redirect(url_for("presentations.export_select_zpb"))
 
-        # reuse export logic but only for selected presentations
-        import tempfile
-        base_tmp = base_tmp = tempfile.mkdtemp(prefix="export_selected_")
-        if os.path.exists(base_tmp):
-            shutil.rmtree(base_tmp)
-        os.makedirs(base_tmp, exist_ok=True)
-
-        selected = Presentation.query.filter(Presentation.id.in_(selected_ids)).all()
-        manifest = []
-        upload_dir = os.path.join("uploads", "media")
-
-        for pres in selected:
-            pres_dir = os.path.join(base_tmp, f"presentation_{pres.id}")
-            os.makedirs(os.path.join(pres_dir, "client"), exist_ok=True)
-            os.makedirs(os.path.join(pres_dir, "agent"), exist_ok=True)
-            os.makedirs(os.path.join(pres_dir, "media"), exist_ok=True)
-
-            def rewrite_and_copy(html):
-                if not html: return ""
-                updated_html = html
-                for match in re.findall(r'src="[^"]+/(uploads/media|presentations/media)/([^"]+)"', html):
-                    fname = match[1]
-                    src = os.path.join(upload_dir,  *fname.split("/"))
-                    dest = os.path.join(pres_dir, "media",  *fname.split("/"))
-                    if os.path.exists(src):
-                        os.makedirs(os.path.dirname(dest), exist_ok=True)
-                        shutil.copy(src, dest)
-                        updated_html = updated_html.replace(f"/presentations/media/{fname}", f"media/{fname}")
-                        updated_html = updated_html.replace(f"/uploads/media/{fname}", f"media/{fname}")
-                return updated_html
-
-            for idx, s in enumerate(sorted(pres.slides, key=lambda x: x.position)):
-                with open(os.path.join(pres_dir, "client", f"slide{idx}.html"), "w") as f:
-                    f.write(rewrite_and_copy(s.client_content or ""))
-                with open(os.path.join(pres_dir, "agent", f"notes{idx}.html"), "w") as f:
-                    f.write(rewrite_and_copy(s.agent_notes or ""))
-
-            details = {
-                "id": pres.id,
-                "title": pres.title,
-                "restricted_to_managers": pres.restricted_to_managers,
-                "teams": [ar.team_id for ar in pres.access_rules if ar.team_id],
-                "users": [ar.user_id for ar in pres.access_rules if ar.user_id],
-                "type": "html"
-            }
-            with open(os.path.join(pres_dir, "details.json"), "w") as f:
-                json.dump(details, f)
-
-            manifest.append({
-                "id": pres.id,
-                "title": pres.title,
-                "created_at": pres.created_at.strftime("%Y-%m-%d %H:%M"),
-                "restricted_to_managers": pres.restricted_to_managers,
-                "teams": details["teams"],
-                "users": details["users"],
-                "slide_count": len(pres.slides)
-            })
-
-        with open(os.path.join(base_tmp, "manifest.json"), "w") as f:
-            json.dump({"presentations": manifest}, f, indent=2)
-
-        zpath = "/tmp/export_selected_backup.zip"
-        if os.path.exists(zpath): os.remove(zpath)
-
-        with zipfile.ZipFile(zpath, "w") as z:
-            for root, dirs, files in os.walk(base_tmp):
-                for file in files:
-                    fpath = os.path.join(root, file)
-                    z.write(fpath, os.path.relpath(fpath, base_tmp))
-
-        return send_file(zpath, as_attachment=True, download_name="selected_presentations_backup.zip")
+        pres_ids = sorted({int(i) for i in selected_ids})
+        return zip_response(backup.export_many(pres_ids, partial=True), "selected_presentations_backup.zip")
 
     # GET: show export selection page
     all_pres = Presentation.query.all()
@@ -897,7 +630,8 @@ def import_pdf():
             flash("Please upload a valid PDF file","danger")
             return redirect(url_for("presentations.import_pdf"))
 
-        fname = secure_filename(pdf_file.filename)
+        # rendered in the background and deleted afterwards: keep uploads apart
+        fname = f"{uuid.uuid4().hex[:8]}_{secure_filename(pdf_file.filename)}"
         fpath = os.path.join(UPLOAD_MEDIA_DIR, fname)
         pdf_file.save(fpath)
 
@@ -910,35 +644,29 @@ def import_pdf():
         db.session.add(pres)
         db.session.commit()
 
-        # ✅ Convert pages into images
-        poppler_path = ensure_poppler()  # Windows returns path, Linux/mac just None
-        pages = convert_from_path(fpath, dpi=150, poppler_path=poppler_path)
-        if reverse:
-            pages = list(reversed(pages))
-
-        for idx, page in enumerate(pages):
-            slide_img = f"slide_{pres.id}_{idx}.jpg"
-            slide_path = os.path.join(UPLOAD_MEDIA_DIR, "slides", slide_img)
-            page.save(slide_path, "JPEG")
+        # ✅ Render pages into slides in the background, a chunk at a time
+        queue_pdf_import(pres, fpath, current_user.id, reverse=reverse, skip_notes=skip_notes)
+        if pres.import_status == "ready":  # ran inline (no worker / JOBS_EAGER)
+            flash("PDF imported successfully","success")
+            return redirect(url_for("presentations.index"))
+        flash("PDF import started — slides are being rendered","info")
+        return redirect(url_for("presentations.import_pdf", pres_id=pres.id))
 
+    pres = Presentation.query.get(request.args.get("pres_id", type=int) or 0)
+    return render_template("presentations/import_pdf.html", pres=pres)
 
-            media = MediaFile(filename="slides/"+slide_img, user_id=current_user.id)
-            db.session.add(media)
 
-
-            client_content = f'<img src="/presentations/media/slides/{slide_img}">'
-            agent_notes = "" if skip_notes else "(add notes here)"
-
-            db.session.add(Slide(
-                presentation_id=pres.id,
-                position=idx,
-                client_content=client_content,
-                agent_notes=agent_notes
-            ))
-
-        db.session.commit()
-        flash("PDF imported successfully","success")
-        return redirect(url_for("presentations.index"))
-
-    return render_template("presentations/import_pdf.html")
+@presentations_bp.route("/<int:pres_id>/import_status")
+@login_required
+def import_status(pres_id):
+    pres = Presentation.query.get_or_404(pres_id)
+    job = jobs.status(pres.import_job) if pres.import_status != "ready" else None
+    return jsonify({
+        "status": pres.import_status or "ready",
+        "slides": Slide.query.filter_by(presentation_id=pres.id).count(),
+        "done": int(job.get("done") or 0) if job else None,
+        "total": int(job.get("total") or 0) if job else None,
+        "stage": job.get("stage") if job else None,
+        "job": {k: job.get(k) for k in ("status", "attempts", "error")} if job else None,
+    })
 
@@ -0,0 +1,171 @@
+"""
+Background jobs for presentations.
+
+PPT import converts a legacy .ppt with LibreOffice (app/utils/convert.py: a
+limited number at once across all workers, each timed out) and then runs the
+normal PPTX import engine on the result.
+
+PDF import renders the deck a chunk of pages at a time: pdftoppm writes the
+JPEGs straight to disk (paths_only, nothing is decoded in Python), each chunk is
+split over `thread_count` pdftoppm processes, and the chunk's MediaFile and Slide
+rows go in with one bulk insert each. Memory stays at one chunk however long the
+PDF is, and a retried job carries on after the last committed chunk.
+
+Config (all optional):
+  PDF_IMPORT_DPI          render resolution, default 150
+  PDF_IMPORT_CHUNK_PAGES  pages per pdftoppm call / commit, default 10
+  PDF_IMPORT_THREADS      pdftoppm processes per chunk, default min(4, cpu count)
+"""
+import os
+import shutil
+import tempfile
+
+from flask import current_app
+from pdf2image import convert_from_path
+from PyPDF2 import PdfReader
+from setup_poppler import ensure_poppler
+
+from ..extensions import db
+from ..utils import convert
+from ..utils.jobs import job, enqueue, progress
+from .models import Presentation, Slide, MediaFile
+from . import bundle, pptx_import
+
+SLIDES_DIR = os.path.join(os.getcwd(), "uploads", "media", "slides")
+DEFAULTS = {
+    "PDF_IMPORT_DPI": 150,
+    "PDF_IMPORT_CHUNK_PAGES": 10,
+    "PDF_IMPORT_THREADS": min(4, os.cpu_count() or 1),
+}
+
+
+def _setting(name):
+    return current_app.config.get(name, DEFAULTS[name])
+
+
+def render_pages(pdf_path, first_page, last_page, out_dir, dpi=None, thread_count=None, poppler_path=None):
+    """Render pages [first_page, last_page] (1-based) as JPEG files in out_dir; paths in page order."""
+    paths = convert_from_path(
+        pdf_path, dpi=dpi or _setting("PDF_IMPORT_DPI"), first_page=first_page, last_page=last_page,
+        thread_count=thread_count or _setting("PDF_IMPORT_THREADS"), fmt="jpeg",
+        jpegopt={"quality": 85, "optimize": True, "progressive": True},
+        output_folder=out_dir, output_file="page", paths_only=True, poppler_path=poppler_path,
+    )
+    # one file per page, named <thread #>-<page #>: sorted order is page order
+    paths = sorted(paths)
+    if len(paths) != last_page - first_page + 1:
+        raise RuntimeError(f"pdftoppm rendered {len(paths)} of pages {first_page}-{last_page}")
+    return paths
+
+
+def import_pdf_as_images(pdf_path, pres_id, user_id=None, reverse=False, agent_notes=""):
+    """Append one image slide per PDF page, chunk by chunk. Returns the number of pages imported."""
+    total = len(PdfReader(pdf_path).pages)
+    chunk = max(1, int(_setting("PDF_IMPORT_CHUNK_PAGES")))
+    poppler_path = ensure_poppler()  # Windows returns path, Linux/mac just None
+    os.makedirs(SLIDES_DIR, exist_ok=True)
+
+    # chunks are committed whole and in page order, so the slide count is where to resume
+    done = Slide.query.filter_by(presentation_id=pres_id).count()
+    progress(done, total)
+
+    tmp_dir = tempfile.mkdtemp(prefix=f"pdf_{pres_id}_", dir=SLIDES_DIR)  # same disk: moves are renames
+    try:
+        for first in range(done + 1, total + 1, chunk):
+            last = min(first + chunk - 1, total)
+            media_rows, slide_rows = [], []
+            for page, src in zip(range(first, last + 1), render_pages(pdf_path, first, last, tmp_dir, poppler_path=poppler_path)):
+                position = total - page if reverse else page - 1
+                slide_img = f"slide_{pres_id}_{position}.jpg"
+                os.replace(src, os.path.join(SLIDES_DIR, slide_img))
+                media_rows.append(dict(filename="slides/" + slide_img, user_id=user_id))
+                slide_rows.append(dict(
+                    presentation_id=pres_id, position=position,
+                    client_content=f'<img src="/presentations/media/slides/{slide_img}">',
+                    agent_notes=agent_notes,
+                ))
+            db.session.bulk_insert_mappings(MediaFile, media_rows)
+            db.session.bulk_insert_mappings(Slide, slide_rows)
+            db.session.commit()
+            bundle.invalidate(pres_id)
+            progress(last, total)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return total
+
+
+def _mark_failed(error, pres_id, **kwargs):
+    pres = Presentation.query.get(pres_id)
+    if pres:
+        pres.import_status = "failed"
+
+
+def _remove_upload(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _pdf_failed(error, pres_id, pdf_path, **kwargs):
+    _mark_failed(error, pres_id)
+    _remove_upload(pdf_path)  # out of retries: nothing will read it again
+
+
+@job("presentations.import_pdf", retries=2, on_failure=_pdf_failed)
+def import_pdf(pres_id, pdf_path, user_id=None, reverse=False, skip_notes=False):
+    if not Presentation.query.get(pres_id):
+        _remove_upload(pdf_path)
+        return  # deleted while queued
+    import_pdf_as_images(pdf_path, pres_id, user_id=user_id, reverse=reverse,
+                         agent_notes="" if skip_notes else "(add notes here)")
+    Presentation.query.filter_by(id=pres_id).update({Presentation.import_status: "ready"})
+    db.session.commit()
+    _remove_upload(pdf_path)
+
+
+def _ppt_failed(error, pres_id, ppt_path, **kwargs):
+    _mark_failed(error, pres_id)
+    _remove_upload(ppt_path)
+
+
+@job("presentations.import_ppt", retries=1, on_failure=_ppt_failed)
+def import_ppt(pres_id, ppt_path, user_id=None, reverse=False, skip_notes=False):
+    if not Presentation.query.get(pres_id):
+        _remove_upload(ppt_path)
+        return  # deleted while queued
+    progress(0, 2, stage="converting")
+    pptx_path = convert.convert(ppt_path, "pptx", os.path.dirname(ppt_path))
+    progress(1, 2, stage="importing")
+    try:
+        Slide.query.filter_by(presentation_id=pres_id).delete()  # a retry starts over
+        pptx_import.import_deck(pptx_path, pres_id, user_id, reverse=reverse, skip_notes=skip_notes)
+    finally:
+        os.remove(pptx_path)
+    Presentation.query.filter_by(id=pres_id).update({Presentation.import_status: "ready"})
+    db.session.commit()
+    _remove_upload(ppt_path)
+    bundle.invalidate(pres_id)
+    progress(2, 2, stage="done")
+
+
+def _queue_import(pres, name, **kwargs):
+    pres.import_status = "processing"
+    db.session.commit()
+    pres_id = pres.id
+    job_id = enqueue(name, pres_id=pres_id, **kwargs)
+    Presentation.query.filter_by(id=pres_id).update({Presentation.import_job: job_id})
+    db.session.commit()
+    return job_id
+
+
+def queue_ppt_import(pres, ppt_path, user_id, reverse=False, skip_notes=False):
+    """Convert and import a saved .ppt into `pres` in the background; returns the job id."""
+    return _queue_import(pres, "presentations.import_ppt", ppt_path=ppt_path,
+                         user_id=user_id, reverse=reverse, skip_notes=skip_notes)
+
+
+def queue_pdf_import(pres, pdf_path, user_id, reverse=False, skip_notes=False):
+    """Start importing a saved PDF into `pres`. Commits first so the worker can see the row; returns the job id."""
+    return _queue_import(pres, "presentations.import_pdf", pdf_path=pdf_path,
+                         user_id=user_id, reverse=reverse, skip_notes=skip_notes)
@@ -0,0 +1,64 @@
+// Presentation player shared by run_client.html and run_agent.html.
+//
+// Loads the compiled bundle (every slide + media manifest) once, warms the
+// browser cache with the media a few files at a time, then follows the
+// presenter's SSE feed. A pushed {slide, etag} is rendered straight from the
+// bundle; only a slide edited since the bundle was loaded costs a request.
+function SlidePlayer(opts) {
+  const slides = {};        // id -> {etag, client_content, agent_notes?}
+  let pending = null;       // last state received before the bundle arrived
+  let refreshing = false;
+
+  const slideUrl = id => opts.slideUrl.replace(/\/0$/, "/" + id);
+
+  function prefetch(urls) {
+    const queue = urls.slice();
+    const next = () => {
+      const url = queue.shift();
+      if (!url) return;
+      if (/\.(mp4|webm|ogg|mp3|wav)(\?|$)/i.test(url)) {
+        const link = document.createElement("link");
+        link.rel = "prefetch"; link.href = url;
+        document.head.appendChild(link);
+        next();
+      } else {
+        const img = new Image();
+        img.onload = img.onerror = next;
+        img.src = url;
+      }
+    };
+    for (let i = 0; i < (opts.prefetchConcurrency || 3); i++) next();
+  }
+
+  function loadBundle() {
+    refreshing = true;
+    return fetch(opts.bundleUrl)
+      .then(r => r.json())
+      .then(b => {
+        b.slides.forEach(s => { slides[s.id] = s; });
+        prefetch(b.media);
+      })
+      .finally(() => { refreshing = false; });
+  }
+
+  function show(state) {
+    if (!state || !state.slide) return;
+    const cached = slides[state.slide];
+    if (cached && cached.etag === state.etag) return opts.render(cached);
+    fetch(slideUrl(state.slide))
+      .then(r => r.json())
+      .then(d => { d.etag = state.etag; slides[d.id] = d; opts.render(d); });
+    if (!refreshing) loadBundle();  // the deck changed since we loaded it
+  }
+
+  loadBundle().then(() => { if (pending) show(pending); }, () => { if (pending) show(pending); });
+
+  const live = new EventSource(opts.eventsUrl);
+  live.addEventListener("slide", e => {
+    const state = JSON.parse(e.data);
+    if (refreshing && !slides[state.slide]) pending = state;
+    else show(state);
+  });
+
+  return { show: show };
+}
@@ -0,0 +1,197 @@
+"""
+Team presence, shared by everyone looking at the same team.
+
+  team:<id>:roster           members as JSON [{id, username}], filled from SQL on a miss
+  user:<id>:teams            the team ids a user belongs to
+  team:<id>:presence         the last snapshot: {"version", "prev", "members", "changes"}
+  team:<id>:presence:fresh   exists while that snapshot is younger than PRESENCE_SNAPSHOT_SECONDS
+
+The first viewer to find a team's snapshot stale claims the fresh key (SET NX)
+and rebuilds it from the cached roster plus one presence.last_seen() lookup;
+every other viewer in that interval reads the stored copy, so a team costs one
+overlay per interval however many pages are polling it. The version only moves
+when some member's status actually changed, and `changes` holds just those
+members, so a client that passes the version it has gets back nothing, or the
+delta from the previous version, or (if it is further behind) the full list.
+
+Rosters and team lists are dropped when TeamMember rows change (ORM events,
+like library/access.py); bulk deletes call invalidate() themselves. Without
+Redis everything is computed per call and always returned in full.
+
+Config (all optional):
+  PRESENCE_SNAPSHOT_SECONDS   how long a team's snapshot is shared, default 5
+"""
+import json
+import time
+
+import redis
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from ..extensions import db
+from ..models import User
+from ..utils import presence as user_presence
+from .models import TeamMember
+
+DEFAULTS = {"PRESENCE_SNAPSHOT_SECONDS": 5}
+ROSTER_TTL = 600  # also bounds how long a renamed user keeps their old name here
+SNAPSHOT_TTL = 24 * 3600
+
+
+def _setting(name):
+    if has_app_context():
+        return current_app.config.get(name, DEFAULTS[name])
+    return DEFAULTS[name]
+
+
+def _redis():
+    return getattr(current_app, "redis", None) if has_app_context() else None
+
+
+def roster_key(team_id):
+    return f"team:{team_id}:roster"
+
+
+def teams_key(user_id):
+    return f"user:{user_id}:teams"
+
+
+def snapshot_key(team_id):
+    return f"team:{team_id}:presence"
+
+
+def _cached(key, load):
+    """JSON value at `key`, or load() (then cached for ROSTER_TTL) on a miss."""
+    r = _redis()
+    if r:
+        try:
+            hit = r.get(key)
+            if hit is not None:
+                return json.loads(hit)
+        except redis.RedisError:
+            r = None
+    value = load()
+    if r:
+        try:
+            r.set(key, json.dumps(value), ex=ROSTER_TTL)
+        except redis.RedisError:
+            pass
+    return value
+
+
+def roster(team_id):
+    """[{"id", "username"}, …] for the team's members."""
+    def load():
+        rows = (db.session.query(User.id, User.username)
+                .join(TeamMember, TeamMember.user_id == User.id)
+                .filter(TeamMember.team_id == team_id).order_by(User.username))
+        return [{"id": uid, "username": name} for uid, name in rows]
+    return _cached(roster_key(team_id), load)
+
+
+def team_ids(user_id):
+    def load():
+        return [tid for (tid,) in db.session.query(TeamMember.team_id).filter(TeamMember.user_id == user_id)]
+    return _cached(teams_key(user_id), load)
+
+
+def teammates(user_id):
+    """Everyone sharing a team with user_id (themselves included), each once."""
+    mates = {}
+    for tid in team_ids(user_id):
+        for member in roster(tid):
+            mates.setdefault(member["id"], member)
+    return sorted(mates.values(), key=lambda m: m["username"] or "")
+
+
+def invalidate(team_ids=(), user_ids=()):
+    """Forget cached rosters and team lists; the next snapshot is rebuilt straight away."""
+    keys = [roster_key(t) for t in team_ids] + [snapshot_key(t) + ":fresh" for t in team_ids]
+    keys += [teams_key(u) for u in user_ids]
+    r = _redis()
+    if r and keys:
+        try:
+            r.delete(*keys)
+        except redis.RedisError:
+            pass
+
+
+def _overlay(team_id, now):
+    members = roster(team_id)
+    seen = user_presence.last_seen([m["id"] for m in members])
+    return {str(m["id"]): list(user_presence.describe(seen[m["id"]], now)) for m in members}
+
+
+def snapshot(team_id, now=None):
+    """The team's current snapshot, rebuilt at most once per PRESENCE_SNAPSHOT_SECONDS across all viewers."""
+    now = int(now or time.time())
+    r = _redis()
+    if not r:
+        return {"version": now, "prev": None, "members": _overlay(team_id, now), "changes": {}}
+
+    key = snapshot_key(team_id)
+    try:
+        stored = r.get(key)
+        old = json.loads(stored) if stored else None
+        if old and not r.set(key + ":fresh", 1, nx=True, ex=_setting("PRESENCE_SNAPSHOT_SECONDS")):
+            return old  # fresh, or another viewer is rebuilding it right now
+    except redis.RedisError:
+        return {"version": now, "prev": None, "members": _overlay(team_id, now), "changes": {}}
+
+    members = _overlay(team_id, now)
+    if old and members == old["members"]:
+        return old
+    previous = old["members"] if old else {}
+    changes = {uid: state for uid, state in members.items() if previous.get(uid) != state}
+    changes.update({uid: None for uid in previous if uid not in members})  # left the team
+    snap = {
+        "version": max(int(time.time() * 1000), old["version"] + 1 if old else 0),
+        "prev": old["version"] if old else None,
+        "members": members,
+        "changes": changes,
+    }
+    try:
+        pipe = r.pipeline()
+        pipe.set(key, json.dumps(snap), ex=SNAPSHOT_TTL)
+        if not old:
+            pipe.set(key + ":fresh", 1, ex=_setting("PRESENCE_SNAPSHOT_SECONDS"))
+        pipe.execute()
+    except redis.RedisError:
+        pass
+    return snap
+
+
+def since(team_id, version=None):
+    """
+    What a client holding `version` of the team needs:
+    {"version", "full", "members": {user_id: [status, last_seen] or None}}.
+    """
+    snap = snapshot(team_id)
+    if version is not None and version == snap["version"]:
+        return {"version": snap["version"], "full": False, "members": {}}
+    if version is not None and version == snap["prev"]:
+        return {"version": snap["version"], "full": False, "members": snap["changes"]}
+    return {"version": snap["version"], "full": True, "members": snap["members"]}
+
+
+# ---------------- Automatic invalidation ----------------
+@event.listens_for(Session, "after_flush")
+def _track_membership_changes(session, flush_context):
+    changed = [o for o in list(session.new) + list(session.dirty) + list(session.deleted)
+               if isinstance(o, TeamMember)]
+    if changed:
+        pending = session.info.setdefault("team_roster_dirty", set())
+        pending.update((o.team_id, o.user_id) for o in changed)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    pending = session.info.pop("team_roster_dirty", None)
+    if pending:
+        invalidate({t for t, _ in pending}, {u for _, u in pending})
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_on_rollback(session):
+    session.info.pop("team_roster_dirty", None)
@@ -7,6 +7,7 @@ from ..notifications.utils import create_notification
 from ..utils.rbac import role_required
 from ..models import User
 from ..messaging.models import ChatRoom, ChatParticipant
+from . import presence as team_presence
 
 @teams_bp.route("/")
 @login_required
@@ -87,9 +88,13 @@ def delete_team(team_id):
     team = Team.query.get_or_404(team_id)
 
     # Remove members first
+    member_ids = [uid for (uid,) in db.session.query(TeamMember.user_id).filter_by(team_id=team.id)]
     TeamMember.query.filter_by(team_id=team.id).delete()
     db.session.delete(team)
     db.session.commit()
+    from ..library.access import invalidate
+    invalidate()   # bulk delete skips the ORM events that normally do this
+    team_presence.invalidate([team.id], member_ids)
 
     flash("Team deleted", "success")
     return redirect(url_for("teams.index"))
@@ -5,6 +5,8 @@ from ..extensions import db
 from .models import Test, TestQuestion, TestOption, TestSubmission, TestAnswer, TestPrerequisite
 from datetime import datetime
 from werkzeug.utils import secure_filename
+from ..utils import blobstore
+from ..utils.media import send_media
 import os, json
 
 # up_dir = os.path.join(current_app.root_path, "..", "uploads", "audio_answers")
@@ -94,16 +96,11 @@ def take(test_id):
         db.session.flush()
 
         # --- handle audio blobs in hidden fields ---
+        recorded = {}
         for key, val in request.form.items():
             if key.startswith("recorded_audio_") and val:
-                import base64, uuid
-                fname = f"{uuid.uuid4().hex}.webm"
-                dest_dir = os.path.join(
-                    current_app.root_path, "..", "uploads", "media", "audio_answers"
-                )
-                os.makedirs(dest_dir, exist_ok=True)
-                with open(os.path.join(dest_dir, fname), "wb") as f:
-                    f.write(base64.b64decode(val))
+                import base64
+                recorded[key[len("recorded_audio_"):]] = blobstore.save_bytes(base64.b64decode(val), "answer.webm")
 
         # --- iterate questions and save answers ---
         for q in test.questions:
@@ -131,14 +128,12 @@ def take(test_id):
                 )
             elif q.type == "audio":
                 uploaded = request.files.get(f"q{q.id}")
-                fname = None
+                # blob key, served as presentations.media_file("audio_answers/<key>")
+                fname = recorded.pop(qid, None)
                 if uploaded and uploaded.filename:
-                    fname = secure_filename(uploaded.filename)
-                    target = os.path.join(
-                        current_app.root_path, "..", "uploads", "media", "audio_answers"
-                    )
-                    os.makedirs(target, exist_ok=True)
-                    uploaded.save(os.path.join(target, fname))
+                    if fname:
+                        blobstore.release(fname)
+                    fname = blobstore.save(uploaded, secure_filename(uploaded.filename))
                 db.session.add(
                     TestAnswer(
                         submission_id=submission.id,
@@ -148,6 +143,9 @@ def take(test_id):
                     )
                 )
 
+        for key in recorded.values():  # recordings for questions that don't take audio
+            blobstore.release(key)
+
         # --- auto‑grade MCQs ---
         total_score = 0.0
         for ans in submission.answers:
@@ -424,14 +422,13 @@ def restore_test(test_id):
 
 
 
-from flask import send_from_directory
 
 @tests_bp.route("/media/<path:filename>")
 @login_required
 def question_media(filename):
     """Serve uploaded question media (images/videos/audio)."""
     media_dir = os.path.join(current_app.root_path, "..", "uploads", "question_media")
-    return send_from_directory(media_dir, filename)
+    return send_media(filename, media_dir)
 
 
 @tests_bp.route("/<int:test_id>/question/<int:index>")
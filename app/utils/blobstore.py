@@ -0,0 +1,211 @@
+"""
+Content-addressed upload store.
+
+Every uploaded file is saved once, under its SHA-256, in sharded folders:
+
+    uploads/blobs/ab/cd/abcd…ef                  the bytes
+    uploads/blobs/ab/cd/abcd…ef_thumb.jpg        default thumbnail, shared by every copy
+    uploads/blobs/ab/cd/abcd…ef_thumb_640.webp   other sizes/formats (see utils/thumbnails.py)
+
+Callers keep a *key* — "<sha256><.ext>" — in their own column (LibraryItem.blob,
+MediaFile.blob, TestAnswer.answer_audio…). The extension only tells us which
+mimetype to serve; the same bytes under two names are still one file.
+
+A Blob row counts the references. save() adds one, release() drops one, and
+`flask blobs gc` removes files nobody points at any more (never inside a
+request, so a rolled-back upload can't lose a file someone else still uses).
+
+Names that aren't keys are pre-blob uploads; resolve() (and media.send_media)
+fall back to the old flat folder for those.
+"""
+import hashlib
+import io
+import os
+import re
+import tempfile
+import time
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy.exc import IntegrityError
+
+from ..extensions import db
+
+CHUNK = 1024 * 1024
+THUMB_SUFFIX = "_thumb.jpg"
+KEY_RE = re.compile(r"^([0-9a-f]{64})(_thumb(?:_\d{2,4})?\.(?:jpg|webp)|\.[a-z0-9]{1,10})?$")
+
+
+def root():
+    return current_app.config.get("BLOB_ROOT") or os.path.join(current_app.root_path, "..", "uploads", "blobs")
+
+
+def is_key(name):
+    return bool(name) and KEY_RE.match(name) is not None
+
+def is_thumbnail(name):
+    return is_key(name) and (KEY_RE.match(name).group(2) or "").startswith("_thumb")
+
+def sha_of(key):
+    return KEY_RE.match(key).group(1)
+
+
+def _shard(sha):
+    return os.path.join(root(), sha[:2], sha[2:4])
+
+def path(key):
+    """Absolute path of a key's bytes (or of a thumbnail file for *_thumb* keys)."""
+    sha, suffix = KEY_RE.match(key).groups()
+    return os.path.join(_shard(sha), sha + (suffix if is_thumbnail(key) else ""))
+
+
+def resolve(name, legacy_dir):
+    """Path for a stored name: blob keys live in the store, anything else in the old flat folder."""
+    return path(name) if is_key(name) else os.path.join(legacy_dir, name)
+
+
+def _ext(filename):
+    ext = os.path.splitext(filename or "")[1].lower()
+    return ext if re.fullmatch(r"\.[a-z0-9]{1,10}", ext) else ""
+
+
+# ---------------- Reference counting ----------------
+def _add_ref(sha, size, n=1):
+    """Same upsert as library stats: UPDATE first, INSERT in a savepoint when the row is new."""
+    from ..models import Blob
+    if Blob.query.filter_by(sha256=sha).update({Blob.refcount: Blob.refcount + n}, synchronize_session=False):
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(Blob(sha256=sha, size=size, refcount=n))
+    except IntegrityError:
+        Blob.query.filter_by(sha256=sha).update({Blob.refcount: Blob.refcount + n}, synchronize_session=False)
+
+
+def acquire(key):
+    """Another row now points at `key` (e.g. a copied record)."""
+    if is_key(key) and not is_thumbnail(key):
+        _add_ref(sha_of(key), os.path.getsize(path(key)))
+
+
+def release(key):
+    """A row stopped pointing at `key`. Legacy names and thumbnails are ignored."""
+    from ..models import Blob
+    if is_key(key) and not is_thumbnail(key):
+        Blob.query.filter_by(sha256=sha_of(key)).update({Blob.refcount: Blob.refcount - 1}, synchronize_session=False)
+
+
+# ---------------- Writing ----------------
+def save(fileobj, filename=None):
+    """
+    Store an uploaded file (FileStorage or any binary file object) and return its key.
+    The hash is computed while the bytes stream to a temp file in the store, so a
+    duplicate costs one pass over the bytes and nothing extra on disk. Counts one
+    reference; commit together with the row that holds the key.
+    """
+    stream = getattr(fileobj, "stream", fileobj)
+    filename = filename or getattr(fileobj, "filename", None)
+    tmp_dir = os.path.join(root(), "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    digest, size = hashlib.sha256(), 0
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = stream.read(CHUNK)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+
+        sha = digest.hexdigest()
+        final = os.path.join(_shard(sha), sha)
+        if os.path.exists(final):
+            os.remove(tmp_path)
+        else:
+            os.makedirs(_shard(sha), exist_ok=True)
+            os.replace(tmp_path, final)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    _add_ref(sha, size)
+    return sha + _ext(filename)
+
+
+def save_bytes(data, filename=None):
+    return save(io.BytesIO(data), filename)
+
+
+def thumbnail(key, mimetype):
+    """Default thumbnail key for a blob, all sizes generated on first use and shared by all duplicates."""
+    from .thumbnails import build_thumbnails
+    sha = sha_of(key)
+    if os.path.exists(path(sha + THUMB_SUFFIX)):
+        return sha + THUMB_SUFFIX
+    return build_thumbnails(path(key), mimetype, _shard(sha), sha)
+
+
+def thumbnail_variant(key, size, fmt="jpg"):
+    """Key of another size/format of a thumbnail (or of any blob used as a cover), if it has been rendered."""
+    from .thumbnails import thumb_name
+    if not is_key(key):
+        return None
+    variant = thumb_name(sha_of(key), size, fmt)
+    return variant if os.path.exists(path(variant)) else None
+
+
+# ---------------- Maintenance ----------------
+def gc():
+    """Delete unreferenced blobs (and their thumbnails) plus stray temp files. Returns (files, bytes)."""
+    from ..models import Blob
+    removed, freed = 0, 0
+    for (sha,) in db.session.query(Blob.sha256).filter(Blob.refcount <= 0).all():
+        # a save() may have taken a new reference since the scan: only the row's own DELETE decides
+        gone = Blob.query.filter(Blob.sha256 == sha, Blob.refcount <= 0).delete(synchronize_session=False)
+        db.session.commit()
+        if not gone:
+            continue
+        shard = _shard(sha)
+        sidecars = [n for n in os.listdir(shard) if n.startswith(sha + "_thumb")] if os.path.isdir(shard) else []
+        for p in [os.path.join(shard, sha)] + [os.path.join(shard, n) for n in sidecars]:
+            if os.path.exists(p):
+                freed += os.path.getsize(p)
+                os.remove(p)
+        removed += 1
+
+    tmp_dir = os.path.join(root(), "tmp")
+    if os.path.isdir(tmp_dir):
+        for name in os.listdir(tmp_dir):
+            p = os.path.join(tmp_dir, name)
+            if time.time() - os.path.getmtime(p) > 3600:
+                freed += os.path.getsize(p)
+                os.remove(p)
+    return removed, freed
+
+
+blobs_cli = AppGroup("blobs", help="Content-addressed upload store.")
+
+
+@blobs_cli.command("gc")
+def gc_command():
+    """Remove blobs that no record references any more."""
+    removed, freed = gc()
+    click.echo(f"✅ Removed {removed} blobs, freed {freed / 1024 / 1024:.1f} MB")
+
+
+@blobs_cli.command("stats")
+def stats_command():
+    """Show how much the store holds and how much deduplication saves."""
+    from sqlalchemy import func
+    from ..models import Blob
+    count, stored, logical = db.session.query(
+        func.count(Blob.sha256), func.coalesce(func.sum(Blob.size), 0),
+        func.coalesce(func.sum(Blob.size * Blob.refcount), 0),
+    ).filter(Blob.refcount > 0).one()
+    click.echo(f"{count} blobs, {stored / 1024 / 1024:.1f} MB on disk, "
+               f"{logical / 1024 / 1024:.1f} MB referenced ({(logical - stored) / 1024 / 1024:.1f} MB saved)")
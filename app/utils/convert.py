@@ -0,0 +1,207 @@
+"""
+Legacy Office -> OOXML conversion (.ppt -> .pptx) through headless LibreOffice.
+
+Conversions run from the job queue, never inside a request, and each one
+starts its own soffice process. What is bounded is how many run at once:
+OFFICE_CONVERT_SLOTS slots shared by every worker through Redis (one SET NX
+key per slot, expiring after the timeout so a dead worker can't keep one),
+or per process when Redis is unavailable. A slot also owns a user profile
+that is kept between runs, which skips LibreOffice's first-start profile
+setup and means two conversions never fight over the same profile lock (what
+made simultaneous `libreoffice --convert-to` calls fail). Waiting for a slot
+and the conversion itself are both capped; a conversion that overruns is
+killed along with its child processes.
+
+    pptx_path = convert("uploads/ppts/deck.ppt", "pptx", out_dir)
+
+Config (all optional):
+  OFFICE_CONVERTER          "auto" (soffice if installed, else stub), "soffice" or "stub"
+  LIBREOFFICE_BIN           soffice binary, default: found on PATH
+  OFFICE_CONVERT_SLOTS      concurrent conversions across all workers, default 2
+  OFFICE_CONVERT_TIMEOUT    seconds per conversion before it is killed, default 120
+  OFFICE_CONVERT_WAIT       seconds to wait for a free slot, default 300
+
+The stub converter is for dev boxes and tests without LibreOffice: it accepts
+files that are already OOXML (e.g. a .pptx saved as .ppt) and fails cleanly
+on real legacy files.
+"""
+import os
+import queue
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+
+import click
+import redis
+from flask import current_app, has_app_context
+from flask.cli import AppGroup
+
+DEFAULTS = {
+    "OFFICE_CONVERTER": "auto",
+    "LIBREOFFICE_BIN": None,
+    "OFFICE_CONVERT_SLOTS": 2,
+    "OFFICE_CONVERT_TIMEOUT": 120,
+    "OFFICE_CONVERT_WAIT": 300,
+}
+PROFILE_ROOT = os.path.join(tempfile.gettempdir(), "crm-soffice")
+SLOT_KEY = "convert:slot:{}"
+SLOT_POLL_SECONDS = 0.5
+
+_slots = None
+_slots_lock = threading.Lock()
+
+
+class ConversionError(Exception):
+    def __init__(self, message, retry=True):
+        super().__init__(message)
+        self.retry = retry  # False when trying again can't help (see utils/jobs.py)
+
+
+def _setting(name):
+    if has_app_context():
+        return current_app.config.get(name, DEFAULTS[name])
+    return DEFAULTS[name]
+
+
+def soffice_bin():
+    return _setting("LIBREOFFICE_BIN") or shutil.which("soffice") or shutil.which("libreoffice")
+
+
+def backend():
+    """Name of the converter that convert() will use."""
+    name = _setting("OFFICE_CONVERTER")
+    if name == "auto":
+        return "soffice" if soffice_bin() else "stub"
+    return name
+
+
+# ---------------- Slots ----------------
+def _redis():
+    return getattr(current_app, "redis", None) if has_app_context() else None
+
+
+def _slot_queue():
+    global _slots
+    with _slots_lock:
+        if _slots is None:
+            _slots = queue.Queue()
+            for slot in range(max(1, int(_setting("OFFICE_CONVERT_SLOTS")))):
+                _slots.put(slot)
+    return _slots
+
+
+def _acquire(wait, hold):
+    """A free slot number and a function that gives it back. Shared through Redis when we can."""
+    r = _redis()
+    if r:
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + wait
+        try:
+            while True:
+                for slot in range(max(1, int(_setting("OFFICE_CONVERT_SLOTS")))):
+                    if r.set(SLOT_KEY.format(slot), token, nx=True, ex=int(hold) + 30):
+                        return slot, lambda: _release(r, slot, token)
+                if time.monotonic() >= deadline:
+                    raise ConversionError("All conversion slots are busy")
+                time.sleep(SLOT_POLL_SECONDS)
+        except redis.RedisError:
+            pass  # fall through to this process's own slots
+    slots = _slot_queue()
+    try:
+        slot = slots.get(timeout=wait)
+    except queue.Empty:
+        raise ConversionError("All conversion slots are busy")
+    return slot, lambda: slots.put(slot)
+
+
+def _release(r, slot, token):
+    key = SLOT_KEY.format(slot)
+    try:
+        if r.get(key) == token.encode():  # not if it expired and someone else holds it now
+            r.delete(key)
+    except redis.RedisError:
+        pass  # expires on its own
+
+
+def _profile_uri(slot):
+    # one profile per slot: kept between runs and never used by two conversions at once
+    path = os.path.join(PROFILE_ROOT, f"slot-{slot}")
+    os.makedirs(path, exist_ok=True)
+    return "file://" + path.replace(os.sep, "/")
+
+
+# ---------------- Backends ----------------
+def _soffice(src, fmt, out_dir, slot, timeout):
+    binary = soffice_bin()
+    if not binary:
+        raise ConversionError("LibreOffice is not installed", retry=False)
+    cmd = [
+        binary, "--headless", "--invisible", "--nologo", "--norestore", "--nodefault", "--nolockcheck",
+        f"-env:UserInstallation={_profile_uri(slot)}",
+        "--convert-to", fmt, "--outdir", out_dir, src,
+    ]
+    posix = os.name == "posix"
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=posix)
+    try:
+        _, err = proc.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        # soffice.bin is a child of the soffice wrapper: take the whole tree down
+        if posix:
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(proc.pid)], capture_output=True)
+            proc.kill()
+        proc.communicate()
+        raise ConversionError(f"LibreOffice timed out after {timeout}s")
+    if proc.returncode:
+        raise ConversionError(f"LibreOffice exited with {proc.returncode}: {err.decode(errors='replace')[-500:]}")
+
+
+def _stub(src, fmt, out_dir, slot, timeout):
+    if not zipfile.is_zipfile(src):
+        raise ConversionError("LibreOffice is not installed; only files that are already OOXML can be imported", retry=False)
+    shutil.copyfile(src, os.path.join(out_dir, os.path.splitext(os.path.basename(src))[0] + "." + fmt))
+
+
+BACKENDS = {"soffice": _soffice, "stub": _stub}
+
+
+def convert(src, fmt, out_dir):
+    """Convert `src` to `fmt` (e.g. "pptx") and return the path of the new file in out_dir."""
+    run = BACKENDS.get(backend())
+    if run is None:
+        raise ConversionError(f"Unknown converter {backend()!r}", retry=False)
+    timeout = float(_setting("OFFICE_CONVERT_TIMEOUT"))
+    slot, release = _acquire(float(_setting("OFFICE_CONVERT_WAIT")), timeout)
+    # a private output dir per run: concurrent conversions of same-named files can't clash
+    work_dir = tempfile.mkdtemp(prefix="convert_", dir=out_dir)
+    try:
+        run(os.path.abspath(src), fmt, work_dir, slot, timeout)
+        produced = os.path.join(work_dir, os.path.splitext(os.path.basename(src))[0] + "." + fmt)
+        if not os.path.exists(produced):
+            raise ConversionError("LibreOffice did not produce an output file")
+        dest = os.path.join(out_dir, os.path.basename(produced))
+        os.replace(produced, dest)
+        return dest
+    finally:
+        release()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+# ---------------- CLI: flask convert ... ----------------
+convert_cli = AppGroup("convert", help="Office document conversion.")
+
+
+@convert_cli.command("check")
+def check_command():
+    """Show which converter is in use (and convert nothing)."""
+    name = backend()
+    click.echo(f"converter: {name}")
+    if name == "soffice":
+        click.echo(f"binary: {soffice_bin()}")
+    click.echo(f"slots: {_setting('OFFICE_CONVERT_SLOTS')}  timeout: {_setting('OFFICE_CONVERT_TIMEOUT')}s")
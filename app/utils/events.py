@@ -0,0 +1,135 @@
+"""
+Server-Sent Events fanned out over Redis pub/sub.
+
+Any worker can publish(); every worker holding an open EventSource for that
+channel gets the message, so state changes reach all gunicorn workers (and
+hosts) without anyone polling the database.
+
+    events.publish("pres:4:live", {"slide": 12, "etag": "…"}, event="slide")
+    return events.response(events.stream("pres:4:live", initial=lambda: [("slide", state, None)]))
+
+Published messages are {"event": …, "data": …, "id": …} JSON. `initial` is
+computed after subscribing, so nothing published in between is lost. Without
+Redis the stream sends the initial events and closes with a retry hint; the
+browser reconnects, which degrades to polling rather than to nothing.
+
+Streams give their DB connection back once the initial events are sent
+(release_session), so open tabs don't starve the connection pool. They still
+hold a worker each: run them under gevent/eventlet or a threaded worker
+class, and keep EVENTS_MAX_SECONDS short enough that clients reconnect (and
+rebalance) now and then.
+"""
+import json
+import time
+
+import redis
+from flask import Response, current_app, has_app_context, stream_with_context
+
+HEARTBEAT_SECONDS = 15
+MAX_SECONDS = 300
+RETRY_MS = 3000
+
+
+def _redis():
+    return getattr(current_app, "redis", None) if has_app_context() else None
+
+
+def publish(channel, data, event=None, id=None):
+    """Send one event to every subscriber of `channel`. False when Redis is unavailable."""
+    r = _redis()
+    if not r:
+        return False
+    try:
+        r.publish(channel, json.dumps({"event": event, "data": data, "id": id}))
+        return True
+    except redis.RedisError:
+        return False
+
+
+def format_event(data, event=None, id=None):
+    lines = []
+    if id is not None:
+        lines.append(f"id: {id}")
+    if event:
+        lines.append(f"event: {event}")
+    payload = data if isinstance(data, str) else json.dumps(data)
+    lines += [f"data: {line}" for line in payload.split("\n")]
+    return "\n".join(lines) + "\n\n"
+
+
+def release_session():
+    """
+    Hand the request's DB connection back to the pool. stream_with_context keeps
+    the app context (and with it the session) alive for the whole stream, so
+    without this every open tab would hold a pooled connection for up to
+    EVENTS_MAX_SECONDS. Nothing after initial() may touch the database.
+    """
+    if has_app_context():
+        from ..extensions import db
+        db.session.remove()
+
+
+def stream(channels, initial=None, heartbeat=HEARTBEAT_SECONDS, max_seconds=None, select=None, retry_ms=RETRY_MS):
+    """
+    Generator of SSE text for one client. `channels` is a name or list of names;
+    `initial()` returns [(event, data, id), …] to send first (current state).
+    `select(event, data)` returns the data to send this client, or None to skip
+    the message (for channels shared by many clients). `retry_ms` is how soon
+    the browser reconnects, which is also the poll interval without Redis.
+    """
+    channels = [channels] if isinstance(channels, str) else list(channels)
+    max_seconds = max_seconds or (current_app.config.get("EVENTS_MAX_SECONDS", MAX_SECONDS) if has_app_context() else MAX_SECONDS)
+    r = _redis()
+    pubsub = None
+    if r:
+        try:
+            pubsub = r.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(*channels)
+        except redis.RedisError:
+            pubsub = None
+
+    try:
+        yield f"retry: {retry_ms}\n\n"
+        for event, data, id in (initial() if initial else []):
+            yield format_event(data, event=event, id=id)
+        release_session()
+        if pubsub is None:
+            return  # no fan-out: let the browser reconnect in RETRY_MS
+
+        deadline = time.monotonic() + max_seconds
+        quiet_since = time.monotonic()
+        while time.monotonic() < deadline:
+            if time.monotonic() - quiet_since >= heartbeat:
+                # also when a shared channel is busy with other clients' messages
+                yield ": keep-alive\n\n"
+                quiet_since = time.monotonic()
+            try:
+                message = pubsub.get_message(timeout=heartbeat)
+            except redis.RedisError:
+                return
+            if message is None:
+                continue
+            try:
+                body = json.loads(message["data"])
+            except (TypeError, ValueError):
+                continue
+            data = body.get("data")
+            if select is not None:
+                data = select(body.get("event"), data)
+                if data is None:
+                    continue
+            yield format_event(data, event=body.get("event"), id=body.get("id"))
+            quiet_since = time.monotonic()
+    finally:
+        if pubsub is not None:
+            try:
+                pubsub.close()
+            except redis.RedisError:
+                pass
+
+
+def response(generator):
+    return Response(stream_with_context(generator), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # nginx: flush each event
+    })
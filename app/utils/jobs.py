@@ -0,0 +1,400 @@
+"""
+Small Redis-backed job queue for work that shouldn't run inside a request
+(thumbnails, text extraction, conversions...).
+
+    @job("library.process_item", retries=3)
+    def process_item(item_id): ...
+
+    job_id = enqueue("library.process_item", item_id=item.id)
+    status(job_id)  -> {"status": "queued|running|retrying|done|failed", "attempts": ..., ...}
+
+Workers are plain local processes started with `flask jobs worker -p 2`. Each one
+builds its own app and runs handlers inside an app context. Failed jobs are retried
+with exponential backoff; after the last attempt the handler's on_failure hook runs.
+An exception with `retry = False` (say, a missing converter) skips the retries.
+Stopping a worker (Ctrl+C, SIGTERM) puts the job it was running back on the queue.
+The run scripts start one next to `flask run`.
+
+Keys:
+  jobs:queue       list of job ids waiting to run (LPUSH / BLMOVE from the right, so FIFO)
+  jobs:processing  list of job ids a worker has taken and not finished yet
+  jobs:delayed     sorted set of job ids waiting for a retry, scored by when they are due
+  job:<id>         hash with name, kwargs, status, attempts, error, progress
+  job:<id>:lease   exists while a live worker runs the job (refreshed by a heartbeat thread)
+
+A worker moves each job id atomically from the queue to jobs:processing and
+holds its lease while it runs. If the worker dies (OOM, SIGKILL), the lease
+expires, and the next reap_stale() by any worker puts the job back on the
+queue. If the job has used up its retries, it is failed and on_failure runs,
+so nothing is left "processing" forever.
+
+When Redis is unreachable (or JOBS_EAGER is set) enqueue() runs the job inline,
+so uploads keep working on a dev box without a worker.
+"""
+import json
+import os
+import signal
+import threading
+import time
+import traceback
+import uuid
+
+import click
+import redis
+from flask import current_app, has_app_context
+from flask.cli import AppGroup
+
+QUEUE_KEY = "jobs:queue"
+PROCESSING_KEY = "jobs:processing"
+DELAYED_KEY = "jobs:delayed"
+JOB_TTL = 7 * 24 * 3600
+POLL_SECONDS = 1
+LEASE_SECONDS = 60   # a job whose worker stopped heartbeating this long ago is put back
+REAP_SECONDS = 30    # how often each worker looks for such jobs
+
+_registry = {}
+_local = threading.local()
+_running = {}  # worker process: {"id": job id} while a job runs, for the heartbeat thread
+
+
+class Job:
+    def __init__(self, name, fn, retries, backoff, on_failure):
+        self.name = name
+        self.fn = fn
+        self.retries = retries
+        self.backoff = backoff
+        self.on_failure = on_failure
+
+    def delay(self, **kwargs):
+        return enqueue(self.name, **kwargs)
+
+    def __call__(self, **kwargs):
+        return self.fn(**kwargs)
+
+
+def job(name, retries=3, backoff=5, on_failure=None):
+    """Register a handler. on_failure(error, **kwargs) runs once the last retry has failed."""
+    def decorator(fn):
+        _registry[name] = Job(name, fn, retries, backoff, on_failure)
+        return _registry[name]
+    return decorator
+
+
+def _redis():
+    return getattr(current_app, "redis", None) if has_app_context() else None
+
+def _key(job_id):
+    return f"job:{job_id}"
+
+def _lease_key(job_id):
+    return f"job:{job_id}:lease"
+
+
+def enqueue(name, **kwargs):
+    """Queue a registered job and return its id. Keyword arguments must be JSON-serialisable."""
+    if name not in _registry:
+        raise KeyError(f"Unknown job {name!r}")
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    record = {
+        "name": name, "kwargs": json.dumps(kwargs), "status": "queued",
+        "attempts": 0, "error": "", "created": now, "updated": now,
+    }
+
+    r = _redis()
+    if r and not current_app.config.get("JOBS_EAGER"):
+        try:
+            pipe = r.pipeline()
+            pipe.hset(_key(job_id), mapping=record)
+            pipe.expire(_key(job_id), JOB_TTL)
+            pipe.lpush(QUEUE_KEY, job_id)
+            pipe.execute()
+            return job_id
+        except redis.RedisError:
+            current_app.logger.warning(f"Job queue unavailable, running {name} inline")
+
+    _local.eager = {job_id: record}
+    try:
+        _execute(job_id, record, r=None, cleanup=False)
+    finally:
+        _local.eager = None
+    return job_id
+
+
+def status(job_id):
+    """The job's record as a dict (kwargs decoded), or None if unknown/expired."""
+    if not job_id:
+        return None
+    eager = getattr(_local, "eager", None)
+    if eager and job_id in eager:
+        return dict(eager[job_id])
+    r = _redis()
+    if not r:
+        return None
+    try:
+        raw = r.hgetall(_key(job_id))
+    except redis.RedisError:
+        return None
+    if not raw:
+        return None
+    data = {k.decode(): v.decode() for k, v in raw.items()}
+    data["kwargs"] = json.loads(data.get("kwargs") or "{}")
+    data["attempts"] = int(data.get("attempts") or 0)
+    data["id"] = job_id
+    return data
+
+
+def progress(done, total=None, **extra):
+    """Report progress from inside a running handler (no-op outside a job)."""
+    job_id = getattr(_local, "job_id", None)
+    if not job_id:
+        return
+    fields = {"done": done, "updated": time.time(), **extra}
+    if total is not None:
+        fields["total"] = total
+    eager = getattr(_local, "eager", None)
+    if eager and job_id in eager:
+        eager[job_id].update(fields)
+        return
+    r = _redis()
+    if r:
+        try:
+            r.hset(_key(job_id), mapping={
+                k: v if isinstance(v, (int, float)) and not isinstance(v, bool) else str(v) for k, v in fields.items()
+            })
+        except redis.RedisError:
+            pass
+
+
+def _update(r, job_id, record, **fields):
+    fields["updated"] = time.time()
+    record.update(fields)
+    if r:
+        r.hset(_key(job_id), mapping=fields)
+
+
+def _execute(job_id, record, r, cleanup=True):
+    """
+    Run one attempt. Returns True on success; schedules a retry or gives up otherwise.
+    Inline (eager) runs share the request's session, so callers commit before enqueue().
+    """
+    from ..extensions import db
+
+    spec = _registry.get(record["name"])
+    kwargs = json.loads(record["kwargs"] or "{}")
+    attempts = int(record.get("attempts") or 0) + 1
+    if spec is None:
+        _update(r, job_id, record, status="failed", attempts=attempts, error=f"unknown job {record['name']}")
+        return False
+
+    _update(r, job_id, record, status="running", attempts=attempts)
+    _local.job_id = job_id
+    try:
+        spec.fn(**kwargs)
+        db.session.commit()
+        _update(r, job_id, record, status="done", error="")
+        return True
+    except Exception as e:
+        db.session.rollback()
+        error = f"{type(e).__name__}: {e}"
+        current_app.logger.warning(f"Job {record['name']} {job_id} attempt {attempts} failed: {error}")
+
+        if r and attempts <= spec.retries and getattr(e, "retry", True):
+            _update(r, job_id, record, status="retrying", error=error)
+            r.zadd(DELAYED_KEY, {job_id: time.time() + spec.backoff * 2 ** (attempts - 1)})
+            return False
+
+        _update(r, job_id, record, status="failed", error=error, traceback=traceback.format_exc()[-4000:])
+        if spec.on_failure:
+            try:
+                spec.on_failure(error, **kwargs)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                current_app.logger.exception(f"on_failure hook for {record['name']} failed")
+        return False
+    finally:
+        _local.job_id = None
+        if cleanup:
+            db.session.remove()
+
+
+def _promote_due(r):
+    """Move retries whose backoff has elapsed back onto the queue."""
+    for job_id in r.zrangebyscore(DELAYED_KEY, "-inf", time.time()):
+        if r.zrem(DELAYED_KEY, job_id):  # only one worker wins each id
+            r.lpush(QUEUE_KEY, job_id)
+
+
+def reap_stale(r):
+    """
+    Requeue jobs left in jobs:processing by a worker that died, or fail them
+    (running on_failure) once out of retries. Returns how many were handled.
+    """
+    handled = 0
+    for raw_id in r.lrange(PROCESSING_KEY, 0, -1):
+        job_id = raw_id.decode()
+        if r.exists(_lease_key(job_id)):
+            continue
+        record = {k.decode(): v.decode() for k, v in r.hgetall(_key(job_id)).items()}
+        # just taken, lease not written yet
+        if record and time.time() - float(record.get("updated") or 0) < LEASE_SECONDS:
+            continue
+        if not r.lrem(PROCESSING_KEY, 1, raw_id):  # another worker reaped it first
+            continue
+        handled += 1
+        if not record:
+            continue
+        spec = _registry.get(record["name"])
+        attempts = int(record.get("attempts") or 0)
+        error = "worker died while running the job"
+        current_app.logger.warning(f"Job {record['name']} {job_id} lost its worker (attempt {attempts})")
+        if spec and attempts <= spec.retries:
+            _update(r, job_id, record, status="queued", error=error)
+            r.lpush(QUEUE_KEY, job_id)
+            continue
+        _update(r, job_id, record, status="failed", error=error)
+        if spec and spec.on_failure:
+            from ..extensions import db
+            try:
+                spec.on_failure(error, **json.loads(record["kwargs"] or "{}"))
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                current_app.logger.exception(f"on_failure hook for {record['name']} failed")
+    return handled
+
+
+def _take(r):
+    """Atomically move the next job id from the queue to jobs:processing (None after POLL_SECONDS)."""
+    try:
+        return r.blmove(QUEUE_KEY, PROCESSING_KEY, POLL_SECONDS, src="RIGHT", dest="LEFT")
+    except redis.ResponseError:  # BLMOVE needs Redis 6.2
+        return r.brpoplpush(QUEUE_KEY, PROCESSING_KEY, timeout=POLL_SECONDS)
+
+
+def _heartbeat(r, stop):
+    while not stop.wait(LEASE_SECONDS / 3):
+        job_id = _running.get("id")
+        if job_id:
+            try:
+                r.set(_lease_key(job_id), os.getpid(), ex=LEASE_SECONDS)
+            except redis.RedisError:
+                pass
+
+
+def work(app, burst=False):
+    """Process jobs until interrupted (or, with burst=True, until the queue is empty)."""
+    r = app.redis
+    stop = threading.Event()
+    threading.Thread(target=_heartbeat, args=(r, stop), daemon=True).start()
+    next_reap = 0
+    try:
+        with app.app_context():
+            while True:
+                _promote_due(r)
+                if time.monotonic() >= next_reap:
+                    reap_stale(r)
+                    next_reap = time.monotonic() + REAP_SECONDS
+                raw_id = _take(r)
+                if not raw_id:
+                    if burst and not r.zcard(DELAYED_KEY):
+                        return
+                    continue
+                job_id = raw_id.decode()
+                r.set(_lease_key(job_id), os.getpid(), ex=LEASE_SECONDS)
+                _running["id"] = job_id
+                finished = False
+                try:
+                    raw = r.hgetall(_key(job_id))
+                    if raw:
+                        record = {k.decode(): v.decode() for k, v in raw.items()}
+                        _execute(job_id, record, r)
+                    finished = True
+                finally:
+                    _running.pop("id", None)
+                    pipe = r.pipeline()
+                    pipe.lrem(PROCESSING_KEY, 1, raw_id)
+                    if not finished:  # stopped mid-job (Ctrl+C, SIGTERM): hand it to the next worker
+                        pipe.hset(_key(job_id), "status", "queued")
+                        pipe.rpush(QUEUE_KEY, raw_id)
+                    pipe.delete(_lease_key(job_id))
+                    pipe.execute()
+    finally:
+        stop.set()
+
+
+def _interrupt(signum, frame):
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)  # once is enough; don't cut the cleanup short
+    raise KeyboardInterrupt
+
+
+def _worker_main(config_class, burst):
+    from .. import create_app
+    # the parent stops us with terminate() on Ctrl+C; SIGTERM unwinds normally, so a job that
+    # was running goes back on the queue and this worker's own pools are shut down too
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, _interrupt)
+    app = create_app(config_class)
+    app.logger.info(f"Job worker {os.getpid()} started")
+    try:
+        work(app, burst=burst)
+    except KeyboardInterrupt:
+        pass
+
+
+# ---------------- CLI: flask jobs ... ----------------
+jobs_cli = AppGroup("jobs", help="Background job queue.")
+
+
+@jobs_cli.command("worker")
+@click.option("-p", "--processes", default=1, show_default=True, help="Number of worker processes.")
+@click.option("--burst", is_flag=True, help="Exit once the queue is empty.")
+def worker_command(processes, burst):
+    """Run job workers in the foreground."""
+    import multiprocessing
+
+    config_class = current_app.config_class
+    signal.signal(signal.SIGTERM, _interrupt)
+    if processes <= 1:
+        click.echo("▶️ Job worker running (Ctrl+C to stop)")
+        try:
+            work(current_app._get_current_object(), burst=burst)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    # spawn so it works the same on Windows; every child builds its own app/engine/redis pool.
+    # Not daemonic: a worker has to be able to start the text extraction / pptx parsing pools,
+    # so they are stopped here explicitly instead.
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=_worker_main, args=(config_class, burst)) for _ in range(processes)]
+    for p in procs:
+        p.start()
+    click.echo(f"▶️ {processes} job workers running (Ctrl+C to stop)")
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.join()
+
+
+@jobs_cli.command("reap")
+def reap_command():
+    """Requeue (or fail) jobs whose worker died mid-run. Workers also do this every REAP_SECONDS."""
+    click.echo(f"✅ Handled {reap_stale(current_app.redis)} stale jobs")
+
+
+@jobs_cli.command("status")
+@click.argument("job_id")
+def status_command(job_id):
+    """Show a job's record."""
+    data = status(job_id)
+    if not data:
+        click.echo("Unknown or expired job")
+        return
+    for k in sorted(data):
+        click.echo(f"{k}: {data[k]}")
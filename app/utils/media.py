@@ -0,0 +1,104 @@
+"""
+One way to serve uploaded files (library downloads, attachments, slide media, test media).
+
+  * Strong ETags: the SHA-256 for blob-store files, size/mtime for older flat-folder files.
+  * Conditional requests (If-None-Match / If-Modified-Since -> 304) and byte ranges
+    (206, so videos can seek) via werkzeug's send_file.
+  * Cache-Control: content-addressed URLs get `max-age=1y, immutable`; everything
+    else `no-cache`, i.e. always revalidate but usually get a cheap 304.
+  * Optional hand-off so the web server streams the bytes instead of a Python worker:
+
+      MEDIA_SENDFILE = "x-accel"     nginx:  location /_uploads/ { internal; alias /srv/crm/uploads/; }
+      MEDIA_SENDFILE = "x-sendfile"  Apache mod_xsendfile / lighttpd
+
+    MEDIA_ACCEL_ROOT (default: the uploads folder) and MEDIA_ACCEL_PREFIX
+    (default "/_uploads/") map file paths to the internal nginx location.
+"""
+import mimetypes
+import os
+from urllib.parse import quote
+
+from flask import current_app, request, abort
+from werkzeug.security import safe_join
+from werkzeug.utils import send_file
+
+from . import blobstore
+
+ONE_YEAR = 365 * 24 * 3600
+
+
+def _uploads_root():
+    return current_app.config.get("MEDIA_ACCEL_ROOT") or os.path.join(current_app.root_path, "..", "uploads")
+
+
+def _accel_uri(path):
+    """Internal nginx URI for `path`, or None when it lives outside MEDIA_ACCEL_ROOT."""
+    root = os.path.realpath(_uploads_root())
+    real = os.path.realpath(path)
+    if os.path.commonpath([root, real]) != root:
+        return None
+    prefix = current_app.config.get("MEDIA_ACCEL_PREFIX", "/_uploads/").rstrip("/") + "/"
+    return prefix + quote(os.path.relpath(real, root).replace(os.sep, "/"))
+
+
+def _accel_response(path, uri, mimetype, download_name, etag):
+    rv = current_app.response_class(mimetype=mimetype)
+    rv.headers["X-Accel-Redirect"] = uri
+    if download_name:
+        rv.headers["Content-Disposition"] = f"inline; filename*=UTF-8''{quote(download_name)}"
+    stat = os.stat(path)
+    rv.last_modified = int(stat.st_mtime)
+    rv.set_etag(etag or f"{int(stat.st_mtime)}-{stat.st_size}")
+    # nginx does ranges itself; we only answer the revalidation
+    return rv.make_conditional(request)
+
+
+def send_media(name, directory, mimetype=None, download_name=None, immutable=False, private=True):
+    """
+    Serve `name` — a blob key or a path relative to `directory` for older uploads.
+    Pass immutable=True only when the URL itself changes with the content
+    (a blob-backed name, or a ?v=<hash> that matched).
+    """
+    if blobstore.is_key(name):
+        path = blobstore.path(name)
+        # thumbnails: one per size/format, so the tag names the variant
+        etag = name.replace(".", "-") if blobstore.is_thumbnail(name) else blobstore.sha_of(name)
+    else:
+        path = safe_join(directory, name)
+        etag = None
+        immutable = False
+    if not path or not os.path.isfile(path):
+        abort(404)
+
+    if not mimetype:
+        mimetype = mimetypes.guess_type("x" + os.path.splitext(name)[1])[0] or "application/octet-stream"
+
+    mode = current_app.config.get("MEDIA_SENDFILE")
+    uri = _accel_uri(path) if mode == "x-accel" else None
+    if uri:
+        rv = _accel_response(path, uri, mimetype, download_name, etag)
+    else:
+        rv = send_file(
+            path, request.environ, mimetype=mimetype, download_name=download_name,
+            conditional=True, etag=etag or True, use_x_sendfile=(mode == "x-sendfile"),
+            response_class=current_app.response_class, _root_path=current_app.root_path,
+        )
+        rv.accept_ranges = "bytes"
+
+    if private:
+        rv.cache_control.private = True
+    else:
+        rv.cache_control.public = True
+    if immutable:
+        rv.cache_control.no_cache = None
+        rv.cache_control.max_age = ONE_YEAR
+        rv.cache_control.immutable = True
+    else:
+        rv.cache_control.no_cache = True
+    return rv
+
+
+def version_matches(key):
+    """True when the request's ?v= pins the current content of a blob-backed file."""
+    v = request.args.get("v")
+    return bool(v) and len(v) >= 8 and blobstore.is_key(key) and blobstore.sha_of(key).startswith(v)
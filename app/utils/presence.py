@@ -0,0 +1,92 @@
+"""
+Who is online.
+
+Every authenticated request calls touch(), but a process writes a user's
+timestamp at most once per PRESENCE_WRITE_INTERVAL seconds (tracked in a local
+dict), and a write is a single ZADD into one sorted set:
+
+  presence:last_seen   member = user id, score = unix time of the last request
+
+A user is online while their score is less than ONLINE_SECONDS old; the score
+doubles as "last seen". Looking up a whole team is one ZMSCORE (a pipeline of
+ZSCOREs on Redis < 6.2), whatever its size. Redis errors never fail a request:
+presence just reads as offline.
+
+Config (all optional):
+  PRESENCE_WRITE_INTERVAL   seconds between writes for the same user per process, default 15
+"""
+import threading
+import time
+
+import redis
+from flask import current_app, has_app_context
+
+KEY = "presence:last_seen"
+ONLINE_SECONDS = 60
+DEFAULTS = {"PRESENCE_WRITE_INTERVAL": 15}
+
+_written = {}  # user id -> time of this process's last write
+_lock = threading.Lock()
+
+
+def _setting(name):
+    if has_app_context():
+        return current_app.config.get(name, DEFAULTS[name])
+    return DEFAULTS[name]
+
+
+def _redis():
+    return getattr(current_app, "redis", None) if has_app_context() else None
+
+
+def touch(user_id, now=None):
+    """Record activity for user_id, unless this process did so recently. True if it wrote."""
+    now = now or time.time()
+    interval = _setting("PRESENCE_WRITE_INTERVAL")
+    with _lock:
+        if now - _written.get(user_id, 0) < interval:
+            return False
+        _written[user_id] = now
+    r = _redis()
+    if not r:
+        return False
+    try:
+        r.zadd(KEY, {user_id: int(now)})
+        return True
+    except redis.RedisError:
+        with _lock:
+            _written.pop(user_id, None)  # try again on the next request
+        return False
+
+
+def last_seen(user_ids):
+    """{user_id: unix time or None} for all ids in one round trip."""
+    user_ids = list(user_ids)
+    r = _redis()
+    if not r or not user_ids:
+        return dict.fromkeys(user_ids)
+    try:
+        try:
+            scores = r.zmscore(KEY, user_ids)
+        except redis.ResponseError:  # ZMSCORE needs Redis 6.2
+            pipe = r.pipeline()
+            for uid in user_ids:
+                pipe.zscore(KEY, uid)
+            scores = pipe.execute()
+    except redis.RedisError:
+        return dict.fromkeys(user_ids)
+    return {uid: int(s) if s is not None else None for uid, s in zip(user_ids, scores)}
+
+
+def describe(ts, now=None):
+    """(status, last_seen text) for a last-seen timestamp."""
+    now = now or int(time.time())
+    if ts is None:
+        return "offline", None
+    delta = now - ts
+    if delta < ONLINE_SECONDS:
+        return "online", None
+    if delta < 3600:
+        return "offline", f"{delta // 60} min ago"
+    return "offline", f"{delta // 3600} hr ago"
+
@@ -1,67 +1,267 @@
-import os, subprocess
-from PIL import Image
+"""
+Thumbnails for library items and presentation media.
+
+One decode per source, then every size/format is cut from it:
+
+  * images: Pillow draft mode, so a 24 MP JPEG is decoded at 1/2..1/8 scale
+  * PDFs:   page 1 rendered at the lowest DPI that still gives the largest size
+  * videos: a single ffmpeg run that pipes one pre-scaled frame back as PNG
+
+build_thumbnails() writes <stem>_thumb_<size>.<webp|jpg> for SIZES, plus the
+classic <stem>_thumb.jpg (DEFAULT_SIZE JPEG) that older code and templates use.
+For blob-store files the stem is the SHA-256 and the files sit next to the blob,
+so the cache is keyed by source hash + size and shared by every duplicate.
+
+`flask thumbnails regenerate` rebuilds them for existing LibraryItem and
+MediaFile rows in a process pool.
+"""
+import hashlib
+import io
+import math
+import mimetypes
+import os
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from PIL import Image, ImageOps, features
 from pdf2image import convert_from_path
 
-def generate_video_thumbnail(video_path, thumbnail_path):
-    """Use ffmpeg to capture a frame from a video."""
+SIZES = (160, 320, 640)
+DEFAULT_SIZE = 320
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+PDF_MIN_DPI, PDF_MAX_DPI = 12, 300
+FFMPEG_TIMEOUT = 60
+
+
+def formats():
+    return ("webp", "jpg") if features.check("webp") else ("jpg",)
+
+
+def thumb_name(stem, size=DEFAULT_SIZE, fmt="jpg"):
+    if size == DEFAULT_SIZE and fmt == "jpg":
+        return f"{stem}_thumb.jpg"
+    return f"{stem}_thumb_{size}.{fmt}"
+
+
+# ---------------- Decoding ----------------
+def _open_image(path, size):
+    img = Image.open(path)
+    img.draft("RGB", (size, size))  # JPEG only: decode straight at a reduced scale
+    img = ImageOps.exif_transpose(img)
+    if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if "transparency" in img.info or img.mode in ("LA", "P") else "RGB")
+    return img
+
+
+def pdf_dpi(path, size):
+    """Smallest DPI at which page 1's long edge is at least `size` pixels."""
+    from PyPDF2 import PdfReader
+    box = PdfReader(path).pages[0].mediabox
+    long_edge_pt = max(float(box.width), float(box.height)) or 842.0
+    return max(PDF_MIN_DPI, min(PDF_MAX_DPI, math.ceil(size * 72 / long_edge_pt)))
+
+
+def _open_pdf(path, size):
     try:
-        cmd = [
-            "ffmpeg",
-            "-ss", "00:00:01",    # grab frame @ 1s
-            "-i", video_path,
-            "-frames:v", "1",
-            "-vf", "scale=320:-1",  # resize width 320, keep aspect
-            "-y", thumbnail_path
-        ]
-        subprocess.run(cmd, check=True,
-                       stdout=subprocess.DEVNULL,
-                       stderr=subprocess.DEVNULL)
-        return True
+        dpi = pdf_dpi(path, size)
+    except Exception:
+        dpi = 100
+    pages = convert_from_path(path, dpi=dpi, first_page=1, last_page=1)
+    return pages[0] if pages else None
+
+
+def _open_video(path, size):
+    cmd = [
+        "ffmpeg", "-v", "error",
+        "-ss", "00:00:01",       # grab frame @ 1s
+        "-i", path,
+        "-frames:v", "1",
+        "-vf", f"scale='min({size},iw)':-2",
+        "-f", "image2pipe", "-vcodec", "png", "-",
+    ]
+    out = subprocess.run(cmd, check=True, capture_output=True, timeout=FFMPEG_TIMEOUT).stdout
+    if not out:
+        return None
+    return Image.open(io.BytesIO(out))
+
+
+def render(path, mimetype, size=max(SIZES)):
+    """Decode `path` once, no larger than needed for `size`. None for unsupported types."""
+    mimetype = mimetype or ""
+    if "video" in mimetype:
+        return _open_video(path, size)
+    if "image" in mimetype:
+        return _open_image(path, size)
+    if "pdf" in mimetype:
+        return _open_pdf(path, size)
+    return None
+
+
+def _save(img, dest, fmt):
+    tmp = dest + ".part"
+    if fmt == "webp":
+        img.save(tmp, "WEBP", quality=WEBP_QUALITY, method=4)
+    else:
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        img.save(tmp, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    os.replace(tmp, dest)
+
+
+def build_thumbnails(src_path, mimetype, dest_dir, stem, sizes=SIZES, force=False):
+    """
+    Write every size/format for one source. Returns the default thumbnail's filename,
+    or None when the type isn't supported / decoding failed. Existing files are kept
+    unless force=True.
+    """
+    wanted = [(s, f) for s in sorted(sizes, reverse=True) for f in formats()]
+    if DEFAULT_SIZE not in sizes:
+        wanted.append((DEFAULT_SIZE, "jpg"))
+    if not force and all(os.path.exists(os.path.join(dest_dir, thumb_name(stem, s, f))) for s, f in wanted):
+        return thumb_name(stem)
+
+    try:
+        img = render(src_path, mimetype, max(s for s, _ in wanted))
     except Exception as e:
-        print("Video thumbnail generation failed:", e)
-        return False
+        print("Thumbnail generation failed:", e)
+        return None
+    if img is None:
+        return None
 
+    os.makedirs(dest_dir, exist_ok=True)
+    with img:
+        current = img
+        for size, fmt in wanted:  # largest first, each size cut from the previous one
+            if max(current.size) > size:
+                current = current.copy()
+                current.thumbnail((size, size), Image.LANCZOS, reducing_gap=3.0)
+            _save(current, os.path.join(dest_dir, thumb_name(stem, size, fmt)), fmt)
+    return thumb_name(stem)
 
-def generate_image_thumbnail(image_path, thumbnail_path):
-    """Scale down an image to max 320px for preview."""
+
+# ---------------- Single-file helpers (pre-blob callers) ----------------
+def _single(src, thumbnail_path, mimetype):
     try:
-        with Image.open(image_path) as img:
-            img.thumbnail((320, 320))
-            img.save(thumbnail_path, "JPEG")
+        img = render(src, mimetype, DEFAULT_SIZE)
+        if img is None:
+            return False
+        with img:
+            img.thumbnail((DEFAULT_SIZE, DEFAULT_SIZE), Image.LANCZOS, reducing_gap=3.0)
+            _save(img, thumbnail_path, "jpg")
         return True
     except Exception as e:
-        print("Image thumbnail generation failed:", e)
+        print("Thumbnail generation failed:", e)
         return False
 
 
+def generate_video_thumbnail(video_path, thumbnail_path):
+    """Capture a frame from a video."""
+    return _single(video_path, thumbnail_path, "video/*")
+
+
+def generate_image_thumbnail(image_path, thumbnail_path):
+    """Scale down an image to max 320px for preview."""
+    return _single(image_path, thumbnail_path, "image/*")
+
+
 def generate_pdf_thumbnail(pdf_path, thumbnail_path):
     """Render first page of a PDF as thumbnail."""
-    try:
-        pages = convert_from_path(pdf_path, dpi=100, first_page=1, last_page=1)
-        if pages:
-            img = pages[0]
-            img.thumbnail((320, 320))
-            img.save(thumbnail_path, "JPEG")
-            return True
-        return False
-    except Exception as e:
-        print("PDF thumbnail generation failed:", e)
-        return False
-
+    return _single(pdf_path, thumbnail_path, "application/pdf")
 
 
 def auto_generate_thumbnail(filepath, mimetype, upload_dir):
     """Return thumbnail filename if generated successfully, else None"""
-    thumb_base = os.path.splitext(os.path.basename(filepath))[0] + "_thumb.jpg"
-    thumb_path = os.path.join(upload_dir, thumb_base)
+    stem = os.path.splitext(os.path.basename(filepath))[0]
+    return build_thumbnails(filepath, mimetype, upload_dir, stem)
 
-    if "video" in mimetype:
-        if generate_video_thumbnail(filepath, thumb_path):
-            return thumb_base
-    elif "image" in mimetype:
-        if generate_image_thumbnail(filepath, thumb_path):
-            return thumb_base
-    elif "pdf" in mimetype:
-        if generate_pdf_thumbnail(filepath, thumb_path):
-            return thumb_base
-    return None
\ No newline at end of file
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# ---------------- Batch regeneration ----------------
+def _regenerate_one(task):
+    """Pool worker: (row kind, row id, source path, mimetype, sha or None, blob root, force) -> (kind, id, key|None)."""
+    kind, row_id, src, mimetype, sha, blob_root, force = task
+    if not os.path.exists(src):
+        return kind, row_id, None
+    sha = sha or file_sha256(src)
+    dest = os.path.join(blob_root, sha[:2], sha[2:4])
+    return kind, row_id, build_thumbnails(src, mimetype, dest, sha, force=force)
+
+
+def _library_tasks(blob_root, force):
+    from . import blobstore
+    from ..library.models import LibraryItem
+    upload_dir = os.path.join(current_app.root_path, "..", "uploads", "library")
+    for item in LibraryItem.query.all():
+        custom = item.thumbnail and not blobstore.is_thumbnail(item.thumbnail) and not item.thumbnail.endswith("_thumb.jpg")
+        if custom:  # an uploaded cover image: resize that instead of the document
+            name, mimetype = item.thumbnail, mimetypes.guess_type(item.thumbnail)[0]
+        else:
+            name, mimetype = item.blob or item.filename, item.mime
+        if not name:
+            continue
+        sha = blobstore.sha_of(name) if blobstore.is_key(name) else None
+        # a cover keeps its own key in LibraryItem.thumbnail: its sizes are found by hash
+        kind = "cover" if custom else "library"
+        yield (kind, item.id, blobstore.resolve(name, upload_dir), mimetype, sha, blob_root, force)
+
+
+def _media_tasks(blob_root, force):
+    from . import blobstore
+    from ..presentations.models import MediaFile
+    media_dir = os.path.join(os.getcwd(), "uploads", "media")
+    for media in MediaFile.query.all():
+        name = media.blob or media.filename
+        sha = blobstore.sha_of(name) if blobstore.is_key(name) else None
+        yield ("media", media.id, blobstore.resolve(name, media_dir), mimetypes.guess_type(media.filename)[0], sha, blob_root, force)
+
+
+thumbnails_cli = AppGroup("thumbnails", help="Thumbnail service.")
+
+
+@thumbnails_cli.command("regenerate")
+@click.option("--library/--no-library", default=True, help="Library items.")
+@click.option("--media/--no-media", default=True, help="Presentation media files.")
+@click.option("-p", "--processes", default=os.cpu_count() or 1, show_default=True)
+@click.option("--force", is_flag=True, help="Re-render even if the cached sizes exist.")
+def regenerate_command(library, media, processes, force):
+    """(Re)build every size/format for existing rows, in parallel."""
+    from . import blobstore
+    from ..extensions import db
+    from ..library.models import LibraryItem
+
+    blob_root = os.path.abspath(blobstore.root())
+    tasks = []
+    if library:
+        tasks += list(_library_tasks(blob_root, force))
+    if media:
+        tasks += list(_media_tasks(blob_root, force))
+
+    done = failed = 0
+    updates = {}
+    with ProcessPoolExecutor(max_workers=max(1, processes), mp_context=multiprocessing.get_context("spawn")) as pool:
+        for fut in as_completed([pool.submit(_regenerate_one, t) for t in tasks]):
+            kind, row_id, key = fut.result()
+            if key:
+                done += 1
+                if kind == "library":
+                    updates[row_id] = key
+            else:
+                failed += 1
+
+    # library rows point at the (possibly new) default thumbnail; covers and media thumbnails are found by hash
+    for item_id, key in updates.items():
+        LibraryItem.query.filter_by(id=item_id).update({LibraryItem.thumbnail: key}, synchronize_session=False)
+    db.session.commit()
+    click.echo(f"✅ Thumbnails ready for {done} files ({failed} skipped: unsupported type, missing or unreadable)")
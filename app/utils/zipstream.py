@@ -0,0 +1,119 @@
+"""
+Write a ZIP archive straight into a streamed HTTP response.
+
+zipfile can write to a non-seekable stream (it then puts sizes and CRCs in data
+descriptors after each member), so ZipStream hands it a sink that just collects
+bytes and gives them back to the caller's generator after every chunk. Nothing
+is staged on disk, memory stays at about one CHUNK, and concurrent exports
+can't collide on a shared temp path.
+
+    def generate():
+        z = ZipStream()
+        yield from z.writestr("details.json", json.dumps(details))
+        yield from z.write_file(path, "media/photo.jpg")
+        yield from z.close()
+
+    return zip_response(generate(), "backup.zip")
+
+Already-compressed media (JPEG, PNG, MP4, …) is stored as is; text is deflated.
+"""
+import io
+import os
+import time
+import zipfile
+from urllib.parse import quote
+
+from flask import Response, stream_with_context
+
+CHUNK = 256 * 1024
+STORED_EXTENSIONS = {
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".mp4", ".m4v", ".mov", ".webm", ".mkv",
+    ".mp3", ".m4a", ".ogg", ".aac", ".zip", ".zpb", ".gz", ".pdf", ".pptx", ".docx", ".xlsx",
+}
+
+
+def compress_type(name):
+    return zipfile.ZIP_STORED if os.path.splitext(name)[1].lower() in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+
+class _Sink(io.RawIOBase):
+    """Write-only, non-seekable buffer; drain() returns what has been written since the last call."""
+
+    def __init__(self):
+        self._parts = []
+        self._offset = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def seekable(self):
+        return False
+
+    def seek(self, *args):
+        raise io.UnsupportedOperation("seek")
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+class ZipStream:
+    def __init__(self):
+        self._sink = _Sink()
+        self._zip = zipfile.ZipFile(self._sink, "w", zipfile.ZIP_DEFLATED, allowZip64=True)
+        self.names = set()
+
+    def _info(self, arcname, size, mtime=None):
+        info = zipfile.ZipInfo(arcname, time.localtime(mtime or time.time())[:6])
+        info.compress_type = compress_type(arcname)
+        info.file_size = size
+        info.external_attr = 0o644 << 16
+        return info
+
+    def _flush(self):
+        data = self._sink.drain()
+        if data:
+            yield data
+
+    def writestr(self, arcname, data):
+        """Add an in-memory member (str is UTF-8 encoded)."""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.names.add(arcname)
+        self._zip.writestr(self._info(arcname, len(data)), data)
+        yield from self._flush()
+
+    def write_file(self, path, arcname):
+        """Copy a file into the archive CHUNK bytes at a time."""
+        stat = os.stat(path)
+        self.names.add(arcname)
+        info = self._info(arcname, stat.st_size, stat.st_mtime)
+        with open(path, "rb") as src, self._zip.open(info, "w", force_zip64=stat.st_size > zipfile.ZIP64_LIMIT // 2) as dest:
+            while True:
+                chunk = src.read(CHUNK)
+                if not chunk:
+                    break
+                dest.write(chunk)
+                yield from self._flush()
+        yield from self._flush()
+
+    def close(self):
+        """Write the central directory."""
+        self._zip.close()
+        yield from self._flush()
+
+
+def zip_response(generator, download_name):
+    return Response(stream_with_context(generator), mimetype="application/zip", headers={
+        "Content-Disposition": f"attachment; filename*=UTF-8''{quote(download_name)}",
+        "X-Accel-Buffering": "no",
+    })
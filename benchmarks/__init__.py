@@ -0,0 +1,71 @@
+"""
+Small helpers shared by the benchmark scripts in this folder.
+
+Run them from the project root, e.g.:
+
+    python -m benchmarks.recommend --sizes 100 1000 5000
+
+Each script builds a throwaway SQLite database (or uses BENCH_DATABASE_URL)
+so it never touches app.db.
+"""
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from config import Config
+
+
+def make_app(db_url=None):
+    from app import create_app, db
+
+    if not db_url:
+        db_url = os.environ.get("BENCH_DATABASE_URL")
+    if not db_url:
+        fd, path = tempfile.mkstemp(prefix="crm_bench_", suffix=".db")
+        os.close(fd)
+        db_url = f"sqlite:///{path}"
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = db_url
+        TESTING = True
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    return app
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args, **kwargs):
+        self.count += 1
+
+
+@contextmanager
+def measure(engine):
+    """Yields a dict that ends up holding `queries` and `ms` for the block."""
+    counter = QueryCounter()
+    result = {}
+    event.listen(engine, "before_cursor_execute", counter)
+    start = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result["ms"] = (time.perf_counter() - start) * 1000
+        event.remove(engine, "before_cursor_execute", counter)
+        result["queries"] = counter.count
+
+
+def print_table(headers, rows):
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) for i, h in enumerate(headers)]
+    line = "  ".join(str(h).rjust(w) for h, w in zip(headers, widths))
+    print(line)
+    print("-" * len(line))
+    for r in rows:
+        print("  ".join(str(c).rjust(w) for c, w in zip(r, widths)))
@@ -0,0 +1,116 @@
+"""
+Library text extraction: the old all-pages-in-one-string PyPDF2 loop vs the
+streaming, page-parallel extractor (with and without the byte cap).
+
+    python -m benchmarks.extract --pages 100 500 --processes 4
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from . import print_table
+
+WORDS = ("agent billing campaign customer escalation follow invoice lead margin onboarding "
+         "pipeline pricing prospect quota renewal retention script support territory upsell").split()
+
+
+def write_pdf(path, n_pages, lines_per_page=45, seed=1):
+    """Minimal text-only PDF (one Helvetica content stream per page) so we don't need a PDF writer."""
+    rnd = random.Random(seed)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for _ in range(n_pages):
+        lines = [" ".join(rnd.choices(WORDS, k=12)) for _ in range(lines_per_page)]
+        body = "BT /F1 9 Tf 40 800 Td 11 TL " + " ".join(f"({l}) '" for l in lines) + " ET"
+        stream = body.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id)
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % k for k in kids), len(kids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % o for o in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def legacy_extract(path):
+    from PyPDF2 import PdfReader
+    pdf = PdfReader(path)
+    return "\n".join([page.extract_text() or "" for page in pdf.pages])
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def peak_mb(fn):
+    # separate run: tracemalloc slows PyPDF2 down a lot, and it only sees this process
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, nargs="+", default=[50, 200, 500])
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--max-kb", type=int, default=256, help="byte cap for the capped run")
+    args = parser.parse_args()
+
+    from app.library import utils
+
+    utils.DEFAULTS.update(LIBRARY_TEXT_PROCESSES=args.processes, LIBRARY_TEXT_PARALLEL_PAGES=1,
+                          LIBRARY_TEXT_MAX_PAGES=10 ** 6, LIBRARY_TEXT_MAX_BYTES=10 ** 9)
+    # start the pool (and import the app in each child) up front so it isn't counted against the first file
+    list(utils._get_pool(args.processes).map(utils.text_kind, ["text/plain"] * args.processes * 4))
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.pages:
+            path = os.path.join(tmp, f"bench_{n}.pdf")
+            write_pdf(path, n)
+
+            extract = lambda **kw: utils.extract_text_with_metrics(path, "application/pdf", **kw)
+            old, old_ms = timed(lambda: legacy_extract(path))
+
+            utils.DEFAULTS["LIBRARY_TEXT_PROCESSES"] = 1
+            (serial, _), serial_ms = timed(extract)
+            serial_mb = peak_mb(extract)
+            utils.DEFAULTS["LIBRARY_TEXT_PROCESSES"] = args.processes
+            (par, _), par_ms = timed(extract)
+            assert old == serial == par, "extracted text differs"
+
+            (_, capped), cap_ms = timed(lambda: extract(max_bytes=args.max_kb * 1024))
+            utils.DEFAULTS["LIBRARY_TEXT_PROCESSES"] = 1
+            cap_mb = peak_mb(lambda: extract(max_bytes=args.max_kb * 1024))
+            old_mb = peak_mb(lambda: legacy_extract(path))
+
+            rows.append((n, f"{len(old) / 1024:.0f}",
+                         f"{old_ms:.0f}", f"{old_mb:.1f}",
+                         f"{serial_ms:.0f}", f"{serial_mb:.1f}", f"{par_ms:.0f}", f"{old_ms / par_ms:.1f}x",
+                         f"{cap_ms:.0f} ({capped['pages']} pages)", f"{cap_mb:.1f}"))
+
+    # peak MB is Python allocations in this process for a serial run
+    print_table(("pages", "text KB", "old ms", "old peak MB", "stream ms", "stream peak MB", f"pool x{args.processes} ms",
+                 "speedup", f"capped {args.max_kb}KB ms", "capped peak MB"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Chat history: the old load-everything room_messages (plus a lazy sender load
+per message) vs keyset pages on the (room_id, id) index, with and without that
+index.
+
+    python -m benchmarks.messages --sizes 10000 100000 1000000 --legacy-max 100000
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from . import make_app, measure, print_table
+
+INDEX = "ix_message_room_id_id"
+
+
+def legacy_room_messages(room_id):
+    """The original room_messages body, kept here only for comparison."""
+    from app.messaging.models import Message
+    messages = Message.query.filter_by(room_id=room_id).order_by(Message.created_at.asc()).all()
+    return [{
+        "id": m.id,
+        "sender": m.sender.username,
+        "content": m.content,
+        "time": m.created_at.strftime("%H:%M")
+    } for m in messages]
+
+
+def seed(db, n_messages, n_senders=40, noise=0.25):
+    """
+    One busy room with n_messages, interleaved with `noise` as many spread over
+    20 other rooms, plus a quiet room whose 100 messages are the oldest rows.
+    """
+    from app.models import User
+    from app.messaging.models import ChatRoom, Message
+
+    rnd = random.Random(7)
+    users = [User(email=f"u{i}@bench", username=f"user{i}", password="x", role="AGENT", approved=True)
+             for i in range(n_senders)]
+    rooms = [ChatRoom(name=f"room {i}", type="team") for i in range(22)]
+    db.session.add_all(users + rooms)
+    db.session.commit()
+    busy, quiet, others = rooms[0].id, rooms[1].id, [r.id for r in rooms[2:]]
+
+    start = datetime(2024, 1, 1)
+    total = int(n_messages * (1 + noise))
+    batch, in_busy = [], 0
+    for i in range(total):
+        if i < 100:
+            room_id = quiet
+        else:
+            room_id = busy if in_busy < n_messages and rnd.random() < 1 / (1 + noise) else rnd.choice(others)
+        in_busy += room_id == busy
+        batch.append({
+            "room_id": room_id, "sender_id": rnd.choice(users).id, "requires_read_receipt": False,
+            "content": " ".join(rnd.choices(["ok", "call me", "lead", "closed it", "thanks", "on it"], k=4)),
+            "created_at": start + timedelta(seconds=i),
+        })
+        if len(batch) == 20000:
+            db.session.execute(Message.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(Message.__table__.insert(), batch)
+    db.session.commit()
+    return busy, quiet, in_busy
+
+
+def run(db, fn, repeat):
+    times, queries = [], 0
+    for _ in range(repeat):
+        db.session.expunge_all()  # no identity-map help between runs
+        with measure(db.engine) as m:
+            result = fn()
+        times.append(m["ms"])
+        queries = m["queries"]
+    return result, statistics.median(times), queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--legacy-max", type=int, default=100000, help="skip the load-everything path above this size")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    from app.extensions import db
+    from app.messaging import live
+    from app.messaging.models import Message
+
+    rows = []
+    for n in args.sizes:
+        app = make_app()
+        with app.app_context():
+            start = time.perf_counter()
+            room_id, quiet, count = seed(db, n)
+            seed_s = time.perf_counter() - start
+            ids = [i for (i,) in db.session.query(Message.id).filter_by(room_id=room_id).order_by(Message.id)]
+            deep = ids[len(ids) // 10]  # "load older" ~90% of the way back
+            tail = ids[-20]             # a reconnect that missed 19 messages
+
+            paths = [
+                ("first page", lambda: live.history(room_id)),
+                ("older page (90% back)", lambda: live.history(room_id, before_id=deep)),
+                ("catch-up after_id", lambda: live.messages_after(room_id, tail)),
+                ("quiet room first page", lambda: live.history(quiet)),
+            ]
+            for label, fn in paths:
+                page, ms, queries = run(db, fn, args.repeat)
+                rows.append((count, label, len(page), f"{ms:.2f}", queries))
+
+            db.session.execute(text(f"DROP INDEX {INDEX}"))
+            db.session.commit()
+            for label, fn in paths[:2] + paths[3:]:
+                page, ms, queries = run(db, fn, args.repeat)
+                rows.append((count, label + ", no index", len(page), f"{ms:.2f}", queries))
+
+            if count <= args.legacy_max:
+                page, ms, queries = run(db, lambda: legacy_room_messages(room_id), 1)
+                rows.append((count, "old: full history", len(page), f"{ms:.0f}", queries))
+            print(f"seeded {count} + noise in {seed_s:.0f}s")
+
+    print_table(("room messages", "path", "rows", "ms (median)", "queries"), rows)
+
+
+if __name__ == "__main__":
+    main()
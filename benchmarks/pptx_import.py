@@ -0,0 +1,161 @@
+"""
+PPTX import: the old route loop (serial parse, per-slide INSERT, one file write
+per picture reference) vs the import engine (deck-wide picture dedupe, one bulk
+insert), serial and with a process pool.
+
+    python -m benchmarks.pptx_import --slides 300 --images 12 --processes 4
+"""
+import argparse
+import io
+import os
+import random
+import tempfile
+
+from . import make_app, measure, print_table
+
+WORDS = ("agent billing campaign customer escalation follow invoice lead margin onboarding "
+         "pipeline pricing prospect quota renewal retention script support territory upsell").split()
+
+
+def write_deck(path, n_slides, n_images, seed=1):
+    """Synthetic deck: title + bullets on every slide, a picture (from n_images distinct ones) on every other."""
+    from PIL import Image
+    from pptx import Presentation
+    from pptx.util import Inches
+
+    rnd = random.Random(seed)
+    pictures = []
+    for i in range(n_images):
+        buf = io.BytesIO()
+        Image.new("RGB", (640, 480), (rnd.randrange(256), rnd.randrange(256), i % 256)).save(buf, "PNG")
+        pictures.append(buf.getvalue())
+
+    deck = Presentation()
+    layout = deck.slide_layouts[1]  # title and content
+    for n in range(n_slides):
+        slide = deck.slides.add_slide(layout)
+        slide.shapes.title.text = " ".join(rnd.choices(WORDS, k=4)).title()
+        body = slide.placeholders[1].text_frame
+        body.text = " ".join(rnd.choices(WORDS, k=10))
+        for level in (0, 1, 1, 0):
+            p = body.add_paragraph()
+            p.text = ("- " if level else "") + " ".join(rnd.choices(WORDS, k=8))
+            p.level = level
+        if n % 2 == 0:
+            slide.shapes.add_picture(io.BytesIO(rnd.choice(pictures)), Inches(6), Inches(5), width=Inches(3))
+    deck.save(path)
+
+
+def legacy_import(path, pres_id, user_id, media_dir):
+    """The original import_pptx/extract_slide_content, kept here only for comparison."""
+    from pptx import Presentation as PptxPresentation
+    from pptx.enum.shapes import MSO_SHAPE_TYPE
+    from app.extensions import db
+    from app.presentations.models import Slide
+
+    def extract(slide):
+        content = []
+        for shape in slide.shapes:
+            if shape.is_placeholder and shape.has_text_frame and shape.text.strip():
+                if shape.placeholder_format.type == 1:
+                    content.append(f"<h1>{shape.text.strip()}</h1>")
+                    continue
+                elif shape.placeholder_format.type == 3:
+                    content.append(f"<h2>{shape.text.strip()}</h2>")
+                    continue
+            if shape.has_text_frame:
+                for p in shape.text_frame.paragraphs:
+                    txt = p.text.strip()
+                    if not txt:
+                        continue
+                    indent = f" style='margin-left:{p.level*2}em'" if p.level > 0 else ""
+                    if txt[:1].isdigit() and "." in txt[:3]:
+                        parts = txt.split(".", 1)
+                        content.append(f"<ol{indent}><li>{parts[1].strip() if len(parts) == 2 else txt}</li></ol>")
+                    elif txt.startswith("•") or txt.startswith("- "):
+                        content.append(f"<ul{indent}><li>{txt.lstrip('•- ').strip()}</li></ul>")
+                    else:
+                        content.append(f"<p{indent}>{txt}</p>")
+            if shape.shape_type == MSO_SHAPE_TYPE.PICTURE or hasattr(shape, "image"):
+                image = shape.image
+                img_name = f"{user_id}_{image.sha1}.{image.ext}"
+                fpath = os.path.join(media_dir, img_name)
+                if not os.path.exists(fpath):
+                    with open(fpath, "wb") as f:
+                        f.write(image.blob)
+                content.append(f'<img src="/presentations/media/{img_name}" class="slide-img" />')
+        return "\n".join(content) if content else "<p>(empty slide)</p>"
+
+    ppt = PptxPresentation(path)
+    for idx, i in enumerate(range(0, len(ppt.slides), 2)):
+        notes = extract(ppt.slides[i + 1]) if i + 1 < len(ppt.slides) else ""
+        db.session.add(Slide(presentation_id=pres_id, position=idx, client_content=extract(ppt.slides[i]), agent_notes=notes))
+    db.session.commit()
+
+
+def count_files(root):
+    return sum(len(files) for _, _, files in os.walk(root))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--slides", type=int, nargs="+", default=[300])
+    parser.add_argument("--images", type=int, default=12, help="distinct pictures per deck")
+    parser.add_argument("--processes", type=int, default=4)
+    args = parser.parse_args()
+
+    from app.extensions import db
+    from app.models import Blob
+    from app.presentations import pptx_import
+    from app.presentations.models import Presentation, Slide, MediaFile
+
+    pptx_import.DEFAULTS.update(PPTX_IMPORT_PARALLEL_PAIRS=1)
+    # start the pool (and import the app in each child) up front so it isn't counted against the first deck
+    pool = pptx_import._get_pool(args.processes)
+    list(pool.map(pptx_import.image_name, [1] * args.processes, ["0"] * args.processes, ["png"] * args.processes))
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app()
+        app.config.update(PPTX_IMPORT_PROCESSES=args.processes, BLOB_ROOT=os.path.join(tmp, "warmup"))
+        # one small import first so SQLAlchemy's statement caches are warm for every measured path
+        write_deck(os.path.join(tmp, "warmup.pptx"), 4, 1)
+        pptx_import.UPLOAD_MEDIA_DIR = tmp
+        with app.app_context():
+            pptx_import.import_deck(os.path.join(tmp, "warmup.pptx"), 0, 1, processes=1)
+            db.session.rollback()
+        for n in args.slides:
+            path = os.path.join(tmp, f"bench_{n}.pptx")
+            write_deck(path, n, args.images)
+            results = {}
+            for label, processes in (("old", None), ("serial", 1), (f"pool x{args.processes}", args.processes)):
+                media_dir = tempfile.mkdtemp(dir=tmp)
+                app.config["BLOB_ROOT"] = blob_dir = tempfile.mkdtemp(dir=tmp)
+                pptx_import.UPLOAD_MEDIA_DIR = media_dir
+                with app.app_context():
+                    db.session.query(MediaFile).delete()
+                    db.session.query(Blob).delete()
+                    pres = Presentation(title=label, creator_id=1)
+                    db.session.add(pres)
+                    db.session.commit()
+                    pptx_import._decks.clear()  # every run opens the deck from scratch
+                    with measure(db.engine) as m:
+                        if processes is None:
+                            legacy_import(path, pres.id, 1, media_dir)
+                        else:
+                            pptx_import.import_deck(path, pres.id, 1, processes=processes)
+                            db.session.commit()
+                    slides = [(s.client_content, s.agent_notes) for s in
+                              Slide.query.filter_by(presentation_id=pres.id).order_by(Slide.position)]
+                results[label] = (m, count_files(media_dir) + count_files(blob_dir), slides)
+
+            old = results["old"]
+            assert all(r[2] == old[2] for r in results.values()), "slide HTML differs"
+            for label, (m, files, slides) in results.items():
+                rows.append((n, label, len(slides), f"{m['ms']:.0f}", m["queries"], files, f"{old[0]['ms'] / m['ms']:.1f}x"))
+
+    print_table(("slides", "path", "pairs", "ms", "queries", "files written", "speedup"), rows)
+
+
+if __name__ == "__main__":
+    main()
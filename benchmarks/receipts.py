@@ -0,0 +1,113 @@
+"""
+Read state: the old one-receipt-per-call mark_read (existence check + commit
+per message) vs one range mark_read, and unread counts for a user's rooms
+counted room by room vs the single grouped query behind the rooms list.
+
+    python -m benchmarks.receipts --rooms 50 --messages 2000 --notices 200
+"""
+import argparse
+import random
+import statistics
+
+from . import make_app, measure, print_table
+
+
+def legacy_mark_read(db, user_id, message_ids):
+    """The original mark_read body, once per message as the page would have called it."""
+    from app.messaging.models import MessageReceipt
+    for msg_id in message_ids:
+        existing = MessageReceipt.query.filter_by(message_id=msg_id, user_id=user_id).first()
+        if not existing:
+            db.session.add(MessageReceipt(message_id=msg_id, user_id=user_id))
+            db.session.commit()
+
+
+def per_room_unread(db, user_id):
+    """What counting without the grouped query looks like: one COUNT per room."""
+    from app.messaging.models import ChatParticipant, Message
+    counts = {}
+    for p in ChatParticipant.query.filter_by(user_id=user_id):
+        counts[p.room_id] = Message.query.filter(Message.room_id == p.room_id, Message.id > p.last_read_id).count()
+    return counts
+
+
+def seed(db, n_rooms, n_messages, n_notices):
+    from app.models import User
+    from app.messaging.models import ChatRoom, ChatParticipant, Message
+
+    rnd = random.Random(3)
+    users = [User(email=f"u{i}@bench", username=f"user{i}", password="x", role="AGENT", approved=True)
+             for i in range(20)]
+    rooms = [ChatRoom(name=f"room {i}", type="team") for i in range(n_rooms)]
+    notice = ChatRoom(name="notices", type="notice")
+    db.session.add_all(users + rooms + [notice])
+    db.session.commit()
+    reader = users[0].id
+    db.session.execute(ChatParticipant.__table__.insert(), [
+        {"user_id": u.id, "room_id": r.id, "last_read_id": 0} for u in users for r in rooms + [notice]
+    ])
+    rows = [{"room_id": rnd.choice(rooms).id, "sender_id": rnd.choice(users[1:]).id, "content": "hello",
+             "requires_read_receipt": False} for _ in range(n_rooms * n_messages)]
+    rows += [{"room_id": notice.id, "sender_id": users[1].id, "content": "please read",
+              "requires_read_receipt": True} for _ in range(n_notices)]
+    db.session.execute(Message.__table__.insert(), rows)
+    db.session.commit()
+    return reader, notice.id
+
+
+def run(db, fn, repeat, reset=None):
+    times, queries = [], 0
+    for _ in range(repeat):
+        if reset:
+            reset()
+        db.session.expunge_all()
+        with measure(db.engine) as m:
+            result = fn()
+        times.append(m["ms"])
+        queries = m["queries"]
+    return result, statistics.median(times), queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rooms", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=2000, help="messages per room")
+    parser.add_argument("--notices", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    from app.extensions import db
+    from app.messaging import receipts
+    from app.messaging.models import ChatParticipant, Message, MessageReceipt
+
+    app = make_app()
+    rows = []
+    with app.app_context():
+        reader, notice_room = seed(db, args.rooms, args.messages, args.notices)
+        notice_ids = [i for (i,) in db.session.query(Message.id).filter_by(room_id=notice_room).order_by(Message.id)]
+
+        def reset():
+            MessageReceipt.query.delete()
+            ChatParticipant.query.update({ChatParticipant.last_read_id: 0})
+            db.session.commit()
+
+        _, ms, queries = run(db, lambda: legacy_mark_read(db, reader, notice_ids), args.repeat, reset)
+        rows.append((f"mark {len(notice_ids)} notices read", "old: one call per message", f"{ms:.1f}", queries))
+        _, ms, queries = run(db, lambda: receipts.mark_read(reader, notice_room, notice_ids[0], notice_ids[-1]),
+                             args.repeat, reset)
+        rows.append((f"mark {len(notice_ids)} notices read", "one range", f"{ms:.1f}", queries))
+
+        # half of every room read, so the counts have something to skip
+        for room_id, newest in (db.session.query(Message.room_id, db.func.max(Message.id))
+                                .group_by(Message.room_id)):
+            receipts.mark_read(reader, room_id, 0, newest - args.messages // 2)
+        _, ms, queries = run(db, lambda: per_room_unread(db, reader), args.repeat)
+        rows.append((f"unread, {args.rooms + 1} rooms", "count room by room", f"{ms:.1f}", queries))
+        _, ms, queries = run(db, lambda: receipts.rooms_with_unread(reader), args.repeat)
+        rows.append((f"unread, {args.rooms + 1} rooms", "one grouped query", f"{ms:.1f}", queries))
+
+    print_table(("workload", "path", "ms (median)", "queries"), rows)
+
+
+if __name__ == "__main__":
+    main()
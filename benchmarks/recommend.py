@@ -0,0 +1,116 @@
+"""
+Library recommendations: per-item scoring over raw events (old path) vs
+precomputed item stats + grouped bias + heap.
+
+    python -m benchmarks.recommend --sizes 100 500 2000 5000
+"""
+import argparse
+import random
+
+from sqlalchemy import func
+
+from . import make_app, measure, print_table
+
+
+def legacy_recommendations(user):
+    """The original 5N+2 implementation, kept here only for comparison."""
+    from app.extensions import db
+    from app.library.models import LibraryItem, LibraryBias, LibraryView, LibraryRating, QuizAttempt
+    from app.library.recommend import score_from_stats
+    from app.teams.models import TeamMember
+
+    def compute_score(item_id):
+        views = db.session.query(func.count(LibraryView.id)).filter(LibraryView.item_id == item_id).scalar() or 0
+        avg_rating = db.session.query(func.avg(LibraryRating.overall)).filter(LibraryRating.item_id == item_id).scalar() or 0
+        quiz = db.session.query(func.avg(QuizAttempt.score)).filter(QuizAttempt.item_id == item_id).scalar() or 0
+        return score_from_stats(views, avg_rating, quiz)
+
+    ranked = []
+    team_ids = [tm.team_id for tm in TeamMember.query.filter_by(user_id=user.id).all()]
+    for i in LibraryItem.query.all():
+        tbias = db.session.query(func.sum(LibraryBias.weight)).filter(LibraryBias.item_id == i.id, LibraryBias.team_id.in_(team_ids)).scalar() or 0
+        ubias = db.session.query(func.sum(LibraryBias.weight)).filter(LibraryBias.item_id == i.id, LibraryBias.user_id == user.id).scalar() or 0
+        ranked.append((i, compute_score(i.id) + (i.bias_weight or 0) + tbias + ubias))
+    ranked.sort(key=lambda x: x[1], reverse=True)
+    return ranked
+
+
+def seed(db, n_items, n_users=20):
+    from app.models import User
+    from app.teams.models import Team, TeamMember
+    from app.library.models import LibraryItem, LibraryView, LibraryRating, QuizAttempt, LibraryBias
+    from app.library.stats import rebuild_stats
+
+    rnd = random.Random(n_items)
+    users = [User(email=f"u{i}@bench", username=f"u{i}", password="x", role="AGENT", approved=True) for i in range(n_users)]
+    team = Team(name="Bench")
+    db.session.add_all(users + [team])
+    db.session.flush()
+    db.session.add_all([TeamMember(team_id=team.id, user_id=u.id, role="AGENT") for u in users])
+
+    db.session.bulk_insert_mappings(LibraryItem, [
+        {"title": f"Item {i}", "creator_id": users[0].id, "bias_weight": rnd.choice([0, 0, 0, 1.5])}
+        for i in range(n_items)
+    ])
+    ids = [i for (i,) in db.session.query(LibraryItem.id)]
+    db.session.bulk_insert_mappings(LibraryView, [
+        {"item_id": rnd.choice(ids), "user_id": rnd.choice(users).id} for _ in range(n_items * 5)
+    ])
+    db.session.bulk_insert_mappings(LibraryRating, [
+        {"item_id": rnd.choice(ids), "user_id": rnd.choice(users).id, "easy": 3, "complete": 3, "overall": rnd.randint(1, 5)}
+        for _ in range(n_items)
+    ])
+    db.session.bulk_insert_mappings(QuizAttempt, [
+        {"item_id": rnd.choice(ids), "user_id": rnd.choice(users).id, "score": rnd.randint(0, 10)} for _ in range(n_items)
+    ])
+    db.session.bulk_insert_mappings(LibraryBias, [
+        {"item_id": rnd.choice(ids), "team_id": team.id, "weight": 2.0} for _ in range(max(1, n_items // 20))
+    ] + [
+        {"item_id": rnd.choice(ids), "user_id": users[0].id, "weight": 3.0} for _ in range(max(1, n_items // 20))
+    ])
+    db.session.commit()
+    rebuild_stats()
+    return users[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 500, 2000])
+    parser.add_argument("--top", type=int, default=5)
+    parser.add_argument("--skip-legacy-above", type=int, default=5000,
+                        help="don't run the per-item path for larger libraries (it gets very slow)")
+    args = parser.parse_args()
+
+    from app.extensions import db
+    from app.library.recommend import get_recommendations
+
+    rows = []
+    for n in args.sizes:
+        app = make_app()
+        with app.app_context():
+            user = seed(db, n)
+            db.session.expire_all()
+
+            legacy = {"queries": "-", "ms": None}
+            if n <= args.skip_legacy_above:
+                with measure(db.engine) as legacy:
+                    old = legacy_recommendations(user)[:args.top]
+                db.session.expire_all()
+
+            with measure(db.engine) as new:
+                top = get_recommendations(user, limit=args.top)
+
+            if legacy["ms"] is not None:
+                assert [round(s, 6) for _, s in old] == [round(s, 6) for _, s in top], "rankings differ"
+
+            rows.append((
+                n,
+                legacy["queries"], "-" if legacy["ms"] is None else f"{legacy['ms']:.1f}",
+                new["queries"], f"{new['ms']:.1f}",
+            ))
+
+    print_table(("items", "old queries", "old ms", "new queries", "new ms"), rows)
+
+
+if __name__ == "__main__":
+    main()
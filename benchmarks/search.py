@@ -0,0 +1,119 @@
+"""
+Library search: five-column ILIKE scan vs the full-text index (FTS5 on SQLite,
+GIN/tsvector on Postgres via BENCH_DATABASE_URL).
+
+    python -m benchmarks.search --docs 10000 --doc-kb 8
+"""
+import argparse
+import random
+import statistics
+import time
+
+from . import make_app, measure, print_table
+
+WORDS = (
+    "account agent billing call campaign churn client close coaching compliance contract customer "
+    "deal demo discount escalation follow forecast handoff invoice lead margin meeting objection "
+    "onboarding pipeline playbook pricing product prospect quota referral renewal retention script "
+    "segment support territory upsell voicemail warranty webinar workflow"
+).split()
+
+QUERIES = ["pricing", "renewal objection", "onbo", "warranty escalation script", "zzzznotfound"]
+
+
+def vocabulary(rnd, size=20000):
+    """Synthetic Zipf-ish vocabulary with the domain words spread from common to rare."""
+    syllables = ["ka", "lo", "mi", "ter", "san", "vo", "ri", "del", "pa", "nu", "zen", "qua", "bri", "tol"]
+    words = sorted({"".join(rnd.choices(syllables, k=rnd.randint(2, 4))) for _ in range(size * 2)})
+    rnd.shuffle(words)
+    words = words[:size]
+    for i, w in enumerate(WORDS):
+        words.insert(int(len(words) * (i / len(WORDS)) ** 2), w)
+    weights = [1.0 / (rank + 1) for rank in range(len(words))]
+    return words, weights
+
+
+def seed(db, n_docs, doc_kb):
+    from app.models import User
+    from app.library.models import LibraryItem
+
+    rnd = random.Random(42)
+    vocab, weights = vocabulary(rnd)
+    text = lambda k: " ".join(rnd.choices(vocab, weights=weights, k=k))
+    user = User(email="bench@bench", username="bench", password="x", role="ADMIN", approved=True)
+    db.session.add(user)
+    db.session.flush()
+
+    words_per_doc = doc_kb * 1024 // 8
+    batch = []
+    for i in range(n_docs):
+        batch.append({
+            "title": text(4).title(),
+            "description": text(20),
+            "keywords": ",".join(rnd.choices(WORDS, k=3)),
+            "filename": f"doc_{i}.pdf",
+            "text_content": text(words_per_doc),
+            "creator_id": user.id,
+            "archived": False,
+        })
+        if len(batch) == 1000:
+            db.session.bulk_insert_mappings(LibraryItem, batch)
+            batch = []
+    if batch:
+        db.session.bulk_insert_mappings(LibraryItem, batch)
+    db.session.commit()
+
+
+def run(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return result, statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=10000)
+    parser.add_argument("--doc-kb", type=int, default=8, help="approximate size of each extracted text body")
+    parser.add_argument("--per-page", type=int, default=12)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    from app.extensions import db
+    from app.library.models import LibraryItem
+    from app.library import search
+
+    app = make_app()
+    with app.app_context():
+        print(f"Seeding {args.docs} documents (~{args.doc_kb} KB text each) on {db.engine.dialect.name}...")
+        seed(db, args.docs, args.doc_kb)
+
+        with measure(db.engine) as build:
+            indexed = search.rebuild_search_index()
+        print(f"Index build: {indexed} items in {build['ms']:.0f} ms\n")
+
+        base = lambda: LibraryItem.query.filter_by(archived=False)
+        rows = []
+        for q in QUERIES:
+            ilike_q = search.ilike_filter(base(), q).order_by(LibraryItem.created_at.desc())
+            (ilike_hits, ilike_ms) = run(lambda: (ilike_q.count(), ilike_q.limit(args.per_page).all()), args.repeat)
+
+            fts_q, _ = search.search(base(), q)
+            fts_q = fts_q.order_by(LibraryItem.created_at.desc())
+
+            def fts_page():
+                page = fts_q.limit(args.per_page).all()
+                return fts_q.count(), page, search.snippets([i.id for i in page], q)
+            (fts_hits, _, _), fts_ms = run(fts_page, args.repeat)
+
+            rows.append((q, ilike_hits[0], f"{ilike_ms:.1f}", fts_hits, f"{fts_ms:.1f}",
+                         f"{ilike_ms / fts_ms:.1f}x" if fts_ms else "-"))
+
+    # ILIKE is substring matching and FTS matches stemmed words/prefixes, so hit counts can differ
+    print_table(("query", "ilike hits", "ilike ms", "fts hits", "fts ms (+snippets)", "speedup"), rows)
+
+
+if __name__ == "__main__":
+    main()
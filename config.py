@@ -8,6 +8,45 @@ class Config:
     SESSION_PERMANENT = False
     REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
 
+    # Background jobs (flask jobs worker, started by the run scripts). Eager runs them inline in the request instead.
+    JOBS_EAGER = os.environ.get("JOBS_EAGER", "").lower() in ("1", "true", "yes")
+
+    # Library text extraction caps (see app/library/utils.py)
+    LIBRARY_TEXT_MAX_BYTES = int(os.environ.get("LIBRARY_TEXT_MAX_BYTES", 2 * 1024 * 1024))
+    LIBRARY_TEXT_MAX_PAGES = int(os.environ.get("LIBRARY_TEXT_MAX_PAGES", 1000))
+
+    # PDF -> slides import (see app/presentations/tasks.py)
+    PDF_IMPORT_DPI = int(os.environ.get("PDF_IMPORT_DPI", 150))
+    PDF_IMPORT_CHUNK_PAGES = int(os.environ.get("PDF_IMPORT_CHUNK_PAGES", 10))
+
+    # PPTX -> slides import: parse pool size, and the smallest deck (in slide pairs) worth a pool (see app/presentations/pptx_import.py)
+    PPTX_IMPORT_PROCESSES = int(os.environ.get("PPTX_IMPORT_PROCESSES", min(4, os.cpu_count() or 1)))
+    PPTX_IMPORT_PARALLEL_PAIRS = int(os.environ.get("PPTX_IMPORT_PARALLEL_PAIRS", 40))
+
+    # Legacy .ppt -> .pptx via headless LibreOffice on the job queue; "stub" when it isn't installed (see app/utils/convert.py)
+    OFFICE_CONVERTER = os.environ.get("OFFICE_CONVERTER", "auto")
+    OFFICE_CONVERT_SLOTS = int(os.environ.get("OFFICE_CONVERT_SLOTS", 2))
+    OFFICE_CONVERT_TIMEOUT = int(os.environ.get("OFFICE_CONVERT_TIMEOUT", 120))
+
+    # Notification fan-outs to more users than this run on the job queue (see app/notifications/utils.py)
+    NOTIFY_FANOUT_INLINE_MAX = int(os.environ.get("NOTIFY_FANOUT_INLINE_MAX", 500))
+
+    # Seen notifications older than this are moved to the archive table by `flask notifications compact` (see app/notifications/retention.py)
+    NOTIFICATION_RETENTION_DAYS = int(os.environ.get("NOTIFICATION_RETENTION_DAYS", 90))
+    NOTIFICATION_COMPACT_BATCH = int(os.environ.get("NOTIFICATION_COMPACT_BATCH", 1000))
+
+    # A process records a user's activity at most this often, in seconds (see app/utils/presence.py)
+    PRESENCE_WRITE_INTERVAL = int(os.environ.get("PRESENCE_WRITE_INTERVAL", 15))
+    # Team presence is recomputed at most this often and shared by all viewers (see app/teams/presence.py)
+    PRESENCE_SNAPSHOT_SECONDS = int(os.environ.get("PRESENCE_SNAPSHOT_SECONDS", 5))
+
+    # Server-Sent Event streams close after this long and the browser reconnects (see app/utils/events.py)
+    EVENTS_MAX_SECONDS = int(os.environ.get("EVENTS_MAX_SECONDS", 300))
+
+    # Let the web server stream uploads: "x-accel" (nginx) or "x-sendfile" (see app/utils/media.py)
+    MEDIA_SENDFILE = os.environ.get("MEDIA_SENDFILE") or None
+    MEDIA_ACCEL_PREFIX = os.environ.get("MEDIA_ACCEL_PREFIX", "/_uploads/")
+
     # Security/Lockout settings
     LOG_UNAUTHORIZED = True
     MAX_FAILED_LOGINS = 5
@@ -52,6 +52,9 @@ flask db migrate -m "Add TestCourseRequirement"
 flask db migrate -m "Add TestPrerequisite model"
 flask db upgrade
 
+echo === Starting job worker ===
+start "Job worker" cmd /k flask jobs worker -p 2
+
 echo === Starting Flask server ===
 flask run --reload --host=127.0.0.1
 
@@ -55,6 +55,9 @@ flask db migrate -m "Add manager_only and LibraryAccess"
 flask db migrate -m "add theme to user"
 flask db upgrade
 
+echo === Starting job worker ===
+start "Job worker" cmd /k flask jobs worker -p 2
+
 echo === Starting Flask server ===
 flask run --reload
 pause
@@ -56,5 +56,10 @@ flask db init || echo "(migrations already initialized)"
 flask db migrate -m "update schema"
 flask db upgrade
 
+echo "=== Starting job worker ==="
+flask jobs worker -p 2 &
+WORKER_PID=$!
+trap 'kill $WORKER_PID 2>/dev/null' EXIT
+
 echo "=== Starting Flask server ==="
 flask run --reload
\ No newline at end of file